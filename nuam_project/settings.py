@@ -65,6 +65,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'nuapp.cache_vistas.cache_plantillas',
             ],
         },
     },
@@ -81,6 +82,13 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # WAL: las lecturas no se bloquean mientras una carga masiva
+            # escribe, y las escrituras esperan el lock en vez de fallar.
+            'init_command': 'PRAGMA journal_mode=WAL;',
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
     }
 }
 
@@ -132,3 +140,94 @@ STATICFILES_DIRS = [
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGIN_URL = '/login/'
+
+# Carga masiva CSV
+# Filas por sentencia INSERT ... ON CONFLICT en las cargas por lotes.
+NUAM_CARGA_BATCH_SIZE = 1000
+
+# Filas rechazadas cuyo detalle se guarda en cada trabajo de carga
+NUAM_CARGA_MAX_RECHAZOS = 50
+
+# Hilos del proceso web que ejecutan los trabajos de carga. Con 0 los
+# trabajos quedan pendientes para `python manage.py procesar_cargas`.
+NUAM_CARGA_HILOS = 1
+
+# Archivos subidos (CSV de carga masiva en espera de procesarse)
+MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_URL = "/media/"
+
+# Listados paginados por cursor: filas por página (?por_pagina= hasta el
+# máximo) y si se muestra el total, que se cuenta una vez por versión de
+# los datos y filtros.
+NUAM_LISTADO_POR_PAGINA = 50
+NUAM_LISTADO_MAX_POR_PAGINA = 500
+NUAM_LISTADO_CONTAR = True
+
+# Exportaciones
+# Filas que se leen de la base de datos y se envían al cliente por bloque.
+NUAM_EXPORT_CHUNK_SIZE = 2000
+
+# Nivel de compresión de las descargas .gz (?gzip=1) y del ZIP por
+# mercado, de 1 a 9
+NUAM_EXPORT_GZIP_NIVEL = 6
+
+# Procesos que generan en paralelo los CSV del ZIP por mercado (uno por
+# modelo y mercado como máximo). None = uno por núcleo; 1 = sin procesos.
+NUAM_EXPORT_ZIP_PROCESOS = None
+
+# Caché en disco de las exportaciones. Cada archivo corresponde a unos
+# filtros y a una versión de los datos; la versión sube con cualquier
+# cambio en instrumentos o calificaciones (ver nuapp/versionado.py).
+NUAM_EXPORT_CACHE = True
+NUAM_EXPORT_CACHE_DIR = BASE_DIR / "var" / "exportaciones"
+NUAM_VERSION_DATOS = BASE_DIR / "var" / "version_datos"
+# Versión que solo sube con cambios en instrumentos (índice de sugerencias)
+NUAM_VERSION_INSTRUMENTOS = BASE_DIR / "var" / "version_instrumentos"
+
+# API JSON (/api/v1/): códigos que acepta una búsqueda por ?codigos=.
+# Las páginas usan NUAM_LISTADO_POR_PAGINA y NUAM_LISTADO_MAX_POR_PAGINA.
+NUAM_API_MAX_CODIGOS = 500
+
+# Sugerencias de instrumentos del formulario de calificación: cuántas se
+# devuelven por búsqueda.
+NUAM_SUGERENCIAS_LIMITE = 10
+
+# Conteos por mercado del dashboard: se recalculan al cambiar la versión
+# de los datos o, a lo sumo, cada tantos segundos.
+NUAM_DASHBOARD_CACHE_SEGUNDOS = 60
+
+# Tendencias de calificaciones (reportes/tendencias/ y /api/v1/tendencias/):
+# días que admite una serie diaria.
+NUAM_TENDENCIAS_MAX_DIAS = 731
+
+# Caché de Django: "locmem" (en memoria, una por proceso) o "archivo" (en
+# var/cache, compartida por todos los procesos del servidor). Sus claves
+# incluyen la versión de los datos, así que no hace falta vaciarla.
+NUAM_CACHE = "locmem"
+NUAM_CACHE_MAX_ENTRADAS = 3000
+
+if NUAM_CACHE == "archivo":
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": BASE_DIR / "var" / "cache",
+            "OPTIONS": {"MAX_ENTRIES": NUAM_CACHE_MAX_ENTRADAS},
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+            "LOCATION": "nuam",
+            "OPTIONS": {"MAX_ENTRIES": NUAM_CACHE_MAX_ENTRADAS},
+        }
+    }
+
+# La sesión se lee de la caché (y se escribe también en la base de datos),
+# para que una página en caché no tenga que consultar la tabla de sesiones.
+SESSION_ENGINE = "django.contrib.sessions.backends.cached_db"
+
+# Contexto de las páginas de consulta y fragmentos {% cache %} de sus
+# plantillas (ver nuapp/cache_vistas.py): segundos que se guardan.
+NUAM_CACHE_VISTAS = True
+NUAM_CACHE_VISTAS_SEGUNDOS = 300
@@ -1,7 +1,8 @@
 from django.contrib import admin
-from .models import Persona, Colaborador, Instrumento, Calificacion
+from .models import Persona, Colaborador, Instrumento, Calificacion, TrabajoCarga
 
 admin.site.register(Persona)
 admin.site.register(Colaborador)
 admin.site.register(Instrumento)
 admin.site.register(Calificacion)
+admin.site.register(TrabajoCarga)
@@ -0,0 +1,101 @@
+from django.conf import settings
+
+from .paginacion import paginar
+
+
+# =========================================================
+#   API JSON DE SOLO LECTURA (v1)
+# =========================================================
+# Los listados se leen con values_list() y cada fila se arma como dict
+# directamente desde la tupla, sin instanciar modelos ni renderizar
+# plantillas. Filtros y cursores son los mismos de los listados HTML.
+VERSION_API = "v1"
+
+# Nombre en el JSON -> campo para values_list()
+CAMPOS_INSTRUMENTOS = {
+    "id": "id",
+    "codigo": "codigo",
+    "nombre": "nombre",
+    "tipo": "tipo",
+    "mercado": "mercado",
+    "estado": "estado",
+    "fecha_emision": "fecha_emision",
+    "fecha_vencimiento": "fecha_vencimiento",
+    "creado_en": "creado_en",
+}
+
+CAMPOS_CALIFICACIONES = {
+    "id": "id",
+    "instrumento": "instrumento__codigo",
+    "tipo": "tipo",
+    "estado": "estado",
+    "fecha": "fecha",
+    "monto": "monto",
+    "creado_en": "creado_en",
+}
+
+
+def campos_pedidos(params, campos):
+    """
+    Nombres de ?fields=codigo,nombre en el orden pedido, o todos si no se
+    indica. Lanza ValueError si alguno no existe.
+    """
+    pedido = [n.strip() for n in params.get("fields", "").split(",") if n.strip()]
+    if not pedido:
+        return list(campos)
+
+    desconocidos = [n for n in pedido if n not in campos]
+    if desconocidos:
+        raise ValueError(
+            f"Campos desconocidos: {', '.join(desconocidos)}. "
+            f"Disponibles: {', '.join(campos)}."
+        )
+    return list(dict.fromkeys(pedido))
+
+
+def codigos_pedidos(params):
+    """Códigos de ?codigos=A,B (o ?codigos=A&codigos=B), sin repetir."""
+    codigos = [
+        c.strip()
+        for valor in params.getlist("codigos")
+        for c in valor.split(",")
+        if c.strip()
+    ]
+    codigos = list(dict.fromkeys(codigos))
+
+    maximo = getattr(settings, "NUAM_API_MAX_CODIGOS", 500)
+    if len(codigos) > maximo:
+        raise ValueError(f"Se pueden pedir hasta {maximo} códigos por consulta.")
+    return codigos
+
+
+def pagina_json(request, queryset, orden, campos):
+    """
+    Cuerpo de la respuesta: la página de ``queryset`` según ?cursor= y
+    ?por_pagina=, con los campos de ?fields= (de ``campos``). Lanza
+    ValueError si el cursor no es válido.
+    """
+    nombres = campos_pedidos(request.GET, campos)
+    columnas = [campos[n] for n in nombres]
+
+    # Los campos del orden se leen siempre, aunque no se hayan pedido,
+    # para armar los cursores; quedan al final y no salen en el JSON.
+    columnas += [c for c, _ in orden if c not in columnas]
+    posiciones = [columnas.index(c) for c, _ in orden]
+
+    pagina = paginar(
+        queryset.values_list(*columnas),
+        orden,
+        request.GET,
+        clave=lambda fila: [fila[i] for i in posiciones],
+        estricto=True,
+    )
+
+    return {
+        "version": VERSION_API,
+        "resultados": [dict(zip(nombres, fila)) for fila in pagina],
+        "cursor_anterior": pagina.cursor_anterior,
+        "cursor_siguiente": pagina.cursor_siguiente,
+        "url_anterior": request.path + pagina.url_anterior if pagina.url_anterior else None,
+        "url_siguiente": request.path + pagina.url_siguiente if pagina.url_siguiente else None,
+    }
@@ -0,0 +1,203 @@
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+import django
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import RequestFactory, override_settings
+from django.utils import timezone
+
+from . import views
+from .carga_lote import clasificar_archivo
+from .cargas import cargar_instrumentos_csv, cargar_calificaciones_csv
+from .datos_sinteticos import escribir_archivos
+from .models import Instrumento, Calificacion
+
+
+# (vista, modelo exportado, query string)
+EXPORTADORES = [
+    ("exportar_instrumentos_csv", Instrumento, ""),
+    ("exportar_calificaciones_csv", Calificacion, ""),
+    ("exportar_instrumentos_pdf", Instrumento, ""),
+    ("exportar_calificaciones_pdf", Calificacion, ""),
+    ("exportar_calificaciones_csv", Calificacion, "gzip=1"),
+]
+
+
+# =========================================================
+#   MEDICIÓN
+# =========================================================
+class _ContadorConsultas:
+    """execute_wrapper que solo cuenta, sin guardar el SQL."""
+
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def medir(nombre, funcion, memoria=True):
+    """
+    Ejecuta ``funcion`` (que devuelve el n.º de filas procesadas) y
+    registra tiempo, filas/s, consultas y memoria pico. La memoria se
+    mide con tracemalloc, que hace más lento el código medido; con
+    ``memoria=False`` los tiempos son más fieles.
+    """
+    contador = _ContadorConsultas()
+    if memoria:
+        tracemalloc.start()
+
+    inicio = time.perf_counter()
+    with connection.execute_wrapper(contador):
+        filas = funcion()
+    segundos = time.perf_counter() - inicio
+
+    pico = None
+    if memoria:
+        pico = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {
+        "nombre": nombre,
+        "filas": filas,
+        "segundos": round(segundos, 4),
+        "filas_por_segundo": round(filas / segundos) if segundos else None,
+        "consultas": contador.total,
+        "memoria_pico_kb": pico // 1024 if pico is not None else None,
+    }
+
+
+@contextmanager
+def base_de_datos_temporal():
+    """Crea una base de datos de prueba en un archivo temporal y la borra al salir."""
+    with tempfile.TemporaryDirectory(prefix="nuam-bench-") as tmp:
+        connection.settings_dict["TEST"]["NAME"] = os.path.join(tmp, "benchmark.sqlite3")
+        nombre_original = connection.settings_dict["NAME"]
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            yield tmp
+        finally:
+            connection.creation.destroy_test_db(nombre_original, verbosity=0)
+
+
+# =========================================================
+#   PASOS
+# =========================================================
+def _paso_carga(ruta):
+    tipo, mercado = clasificar_archivo(ruta)
+    ultimo = {}
+
+    def cargar():
+        with open(ruta, "rb") as archivo:
+            if tipo == "INSTRUMENTOS":
+                ok, msg = cargar_instrumentos_csv(archivo, mercado, progreso=ultimo.update)
+            else:
+                ok, msg = cargar_calificaciones_csv(archivo, progreso=ultimo.update)
+        if not ok:
+            raise RuntimeError(msg)
+        return ultimo.get("procesadas", 0)
+
+    if tipo == "INSTRUMENTOS":
+        return f"cargar_instrumentos_csv[{mercado}]", cargar
+    return "cargar_calificaciones_csv", cargar
+
+
+def _paso_exportacion(nombre_vista, modelo, query_string, usuario):
+    vista = getattr(views, nombre_vista)
+    filas = modelo.objects.count()
+
+    def exportar():
+        request = RequestFactory().get("/", QUERY_STRING=query_string)
+        request.user = usuario
+        response = vista(request)
+        contenido = response.streaming_content if response.streaming else [response.content]
+        for _ in contenido:
+            pass
+        response.close()
+        return filas
+
+    nombre = f"{nombre_vista}?{query_string}" if query_string else nombre_vista
+    return nombre, exportar
+
+
+def _commit_actual():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+# =========================================================
+#   EJECUCIÓN
+# =========================================================
+def ejecutar_benchmark(n_instrumentos, n_calificaciones, semilla=42, memoria=True, al_medir=None):
+    """
+    Genera datos sintéticos, los carga en una base de datos temporal y
+    mide cada cargador y cada exportador. Devuelve el informe como dict.
+    """
+    resultados = []
+
+    with override_settings(DEBUG=False), base_de_datos_temporal() as tmp, override_settings(
+        NUAM_VERSION_DATOS=os.path.join(tmp, "version_datos"),
+        NUAM_VERSION_INSTRUMENTOS=os.path.join(tmp, "version_instrumentos"),
+        NUAM_EXPORT_CACHE_DIR=os.path.join(tmp, "exportaciones"),
+    ):
+        rutas = escribir_archivos(
+            os.path.join(tmp, "csv"), n_instrumentos, n_calificaciones, semilla
+        )
+
+        pasos = [_paso_carga(ruta) for ruta in rutas]
+        for nombre, funcion in pasos:
+            resultados.append(medir(nombre, funcion, memoria))
+            if al_medir:
+                al_medir(resultados[-1])
+
+        usuario = User.objects.create_user("benchmark")
+        # La segunda vuelta se sirve desde la caché de exportaciones
+        for vuelta in ("", " (caché)"):
+            for exportador in EXPORTADORES:
+                nombre, funcion = _paso_exportacion(*exportador, usuario)
+                resultados.append(medir(nombre + vuelta, funcion, memoria))
+                if al_medir:
+                    al_medir(resultados[-1])
+
+    return {
+        "commit": _commit_actual(),
+        "fecha": timezone.now().isoformat(),
+        "python": platform.python_version(),
+        "django": django.get_version(),
+        "instrumentos": n_instrumentos,
+        "calificaciones": n_calificaciones,
+        "memoria_medida": memoria,
+        "resultados": resultados,
+    }
+
+
+def comparar(anterior, actual):
+    """Devuelve (nombre, filas/s antes, filas/s ahora, variación %) por paso común."""
+    previos = {r["nombre"]: r for r in anterior["resultados"]}
+    filas = []
+    for r in actual["resultados"]:
+        previo = previos.get(r["nombre"])
+        if not previo or not previo["filas_por_segundo"] or not r["filas_por_segundo"]:
+            continue
+        variacion = (r["filas_por_segundo"] / previo["filas_por_segundo"] - 1) * 100
+        filas.append((r["nombre"], previo["filas_por_segundo"], r["filas_por_segundo"], variacion))
+    return filas
+
+
+def guardar(informe, ruta):
+    os.makedirs(os.path.dirname(ruta) or ".", exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as f:
+        json.dump(informe, f, indent=2, ensure_ascii=False)
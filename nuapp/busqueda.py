@@ -0,0 +1,51 @@
+from django.db import connection
+from django.db.models import Case, IntegerField, Q, When
+from django.db.models.expressions import RawSQL
+
+
+# =========================================================
+#   BÚSQUEDA DE INSTRUMENTOS (FTS5 TRIGRAM)
+# =========================================================
+# En SQLite, código y nombre se indexan en una tabla FTS5 con tokenizador
+# trigram (migración 0006), que responde búsquedas por subcadena sin
+# recorrer la tabla. Los triggers de esa migración la mantienen al día
+# con save(), delete() y las cargas masivas (bulk_create).
+TABLA_BUSQUEDA = "nuapp_instrumento_busqueda"
+
+# El trigram necesita al menos 3 caracteres para usar el índice
+MIN_CARACTERES_INDICE = 3
+
+
+def _usa_indice(q):
+    return connection.vendor == "sqlite" and len(q) >= MIN_CARACTERES_INDICE
+
+
+def _frase(q):
+    """El texto como una sola frase FTS5 (sin operadores del usuario)."""
+    return '"' + q.replace('"', '""') + '"'
+
+
+def filtrar_por_texto(queryset, q):
+    """Instrumentos cuyo código o nombre contiene ``q`` (sin distinguir mayúsculas)."""
+    if not _usa_indice(q):
+        return queryset.filter(Q(codigo__icontains=q) | Q(nombre__icontains=q))
+
+    return queryset.filter(id__in=RawSQL(
+        f"SELECT rowid FROM {TABLA_BUSQUEDA} WHERE {TABLA_BUSQUEDA} MATCH %s",
+        [_frase(q)],
+    ))
+
+
+def anotar_relevancia(queryset, q):
+    """
+    Agrega ``relevancia`` (menor es mejor): 0 código exacto, 1 código que
+    empieza por ``q``, 2 nombre que empieza por ``q``, 3 cualquier otra
+    coincidencia. Se calcula solo sobre las filas ya filtradas.
+    """
+    return queryset.annotate(relevancia=Case(
+        When(codigo__iexact=q, then=0),
+        When(codigo__istartswith=q, then=1),
+        When(nombre__istartswith=q, then=2),
+        default=3,
+        output_field=IntegerField(),
+    ))
@@ -0,0 +1,118 @@
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+
+from django.conf import settings
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+from .exportaciones import gzip_en_bloques
+from .versionado import version_datos
+
+
+# =========================================================
+#   CACHÉ DE EXPORTACIONES EN DISCO
+# =========================================================
+# Cada archivo se guarda como <versión>-<clave>.<ext>, donde la clave
+# resume (exportación, filtros, versión). Mientras la versión de los
+# datos no cambie, las descargas repetidas se sirven desde el disco, o
+# con un 304 si el navegador ya tiene el archivo, sin consultar la BD.
+def _directorio():
+    return Path(getattr(
+        settings, "NUAM_EXPORT_CACHE_DIR", settings.BASE_DIR / "var" / "exportaciones"
+    ))
+
+
+def clave_exportacion(nombre, params, parametros, version):
+    """Clave estable: los filtros vacíos y el orden de la query string no cuentan."""
+    partes = [nombre, version]
+    for parametro in sorted(parametros):
+        valor = params.get(parametro, "")
+        if valor:
+            partes.append(f"{parametro}={valor}")
+    return hashlib.sha256("\n".join(partes).encode("utf-8")).hexdigest()[:32]
+
+
+def _limpiar(directorio, version):
+    """Borra los archivos de versiones anteriores."""
+    for ruta in directorio.iterdir():
+        if ruta.suffix == ".tmp" or ruta.name.startswith(f"{version}-"):
+            continue
+        try:
+            ruta.unlink()
+        except FileNotFoundError:
+            pass
+
+
+def _guardar_mientras_se_envia(contenido, ruta):
+    """
+    Envía los bloques al cliente y a la vez los escribe en un temporal,
+    que pasa a ser el archivo en caché solo si se generó completo.
+    """
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    fd, temporal = tempfile.mkstemp(dir=ruta.parent, suffix=".tmp")
+    completo = False
+    try:
+        with os.fdopen(fd, "wb") as archivo:
+            for bloque in contenido:
+                if isinstance(bloque, str):
+                    bloque = bloque.encode(settings.DEFAULT_CHARSET)
+                archivo.write(bloque)
+                yield bloque
+        os.replace(temporal, ruta)
+        completo = True
+        # Si los datos cambiaron durante la exportación, este archivo
+        # ya quedó viejo y se borra junto con los demás.
+        _limpiar(ruta.parent, version_datos())
+    finally:
+        if not completo:
+            try:
+                os.unlink(temporal)
+            except FileNotFoundError:
+                pass
+
+
+def respuesta_exportacion(request, nombre, content_type, contenido, parametros):
+    """
+    Respuesta para la exportación ``nombre`` (también el nombre del archivo
+    descargado). ``contenido`` es el generador que produce el archivo; solo
+    se recorre si no hay copia en caché para los filtros ``parametros`` de
+    la query string y la versión actual de los datos.
+
+    Con ``?gzip=1`` se descarga ``nombre``.gz comprimido al vuelo.
+    """
+    if request.GET.get("gzip") == "1":
+        nombre = f"{nombre}.gz"
+        content_type = "application/gzip"
+        contenido = gzip_en_bloques(contenido)
+
+    if not getattr(settings, "NUAM_EXPORT_CACHE", True):
+        response = StreamingHttpResponse(contenido, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+        return response
+
+    version = version_datos()
+    clave = clave_exportacion(nombre, request.GET, parametros, version)
+    etag = f'"{clave}"'
+
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        contenido.close()
+    else:
+        ruta = _directorio() / f"{version}-{clave}{''.join(Path(nombre).suffixes)}"
+        try:
+            archivo = open(ruta, "rb")
+        except FileNotFoundError:
+            response = StreamingHttpResponse(
+                _guardar_mientras_se_envia(contenido, ruta),
+                content_type=content_type,
+            )
+        else:
+            contenido.close()
+            response = FileResponse(archivo, content_type=content_type)
+        response["Content-Disposition"] = f'attachment; filename="{nombre}"'
+
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
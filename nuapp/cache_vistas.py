@@ -0,0 +1,82 @@
+import hashlib
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.template.response import TemplateResponse
+
+from .versionado import version_datos
+
+
+# =========================================================
+#   CACHÉ DE VISTAS Y FRAGMENTOS
+# =========================================================
+# Las páginas de consulta guardan en la caché de Django su contexto (lo
+# que cuesta consultas) por vista, rol del usuario, query string y
+# versión de los datos; con un acierto la vista no toca la base de datos.
+# La plantilla se sigue renderizando en cada petición, así que el nombre
+# del usuario y los tokens CSRF nunca se comparten entre usuarios; los
+# bloques caros de las plantillas se guardan aparte con {% cache %},
+# usando las mismas claves (ver cache_plantillas).
+#
+# No hace falta borrar nada: cualquier escritura, por formulario o carga
+# masiva, sube version_datos() y las claves anteriores dejan de usarse.
+def rol_usuario(user):
+    """Lo único del usuario que cambia el contenido de una página."""
+    return "admin" if user.is_superuser else "usuario"
+
+
+def _segundos():
+    return getattr(settings, "NUAM_CACHE_VISTAS_SEGUNDOS", 300)
+
+
+def clave_vista(request, nombre, kwargs):
+    """Clave de la caché para una petición GET a la vista ``nombre``."""
+    consulta = json.dumps(
+        [sorted(kwargs.items()), sorted(request.GET.lists())], default=str
+    )
+    huella = hashlib.sha256(consulta.encode("utf-8")).hexdigest()[:32]
+    return f"nuam:vista:{nombre}:{rol_usuario(request.user)}:{huella}:{version_datos()}"
+
+
+def vista_en_cache(vista):
+    """
+    Guarda el contexto de las respuestas GET exitosas de ``vista``, que
+    debe devolver un TemplateResponse cuyo contexto no lleve querysets sin
+    evaluar (se guardaría la tabla entera). Se desactiva con
+    NUAM_CACHE_VISTAS = False.
+    """
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        if request.method != "GET" or not getattr(settings, "NUAM_CACHE_VISTAS", True):
+            return vista(request, *args, **kwargs)
+
+        clave = clave_vista(request, vista.__name__, kwargs)
+        guardada = cache.get(clave)
+        if guardada is not None:
+            plantilla, contexto = guardada
+            return TemplateResponse(request, plantilla, contexto)
+
+        respuesta = vista(request, *args, **kwargs)
+        if isinstance(respuesta, TemplateResponse) and respuesta.status_code == 200:
+            cache.set(clave, (respuesta.template_name, respuesta.context_data), _segundos())
+        return respuesta
+
+    return envoltura
+
+
+def cache_plantillas(request):
+    """
+    Context processor con lo que necesitan los {% cache %} de las
+    plantillas: duración (0 si NUAM_CACHE_VISTAS = False), versión de los
+    datos y rol del usuario.
+    """
+    if not getattr(request, "user", None) or not request.user.is_authenticated:
+        return {}
+    activa = getattr(settings, "NUAM_CACHE_VISTAS", True)
+    return {
+        "cache_segundos": _segundos() if activa else 0,
+        "cache_version": version_datos(),
+        "cache_rol": rol_usuario(request.user),
+    }
@@ -0,0 +1,127 @@
+import multiprocessing
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+
+import django
+from django.db import connections
+
+
+# Este módulo no importa los modelos al cargarse: los procesos hijos lo
+# importan (para leer _cargar_archivo) recién después de django.setup().
+@lru_cache(maxsize=None)
+def _mercado_en_nombre():
+    """instrumentos_CL.csv, CO-instrumentos.csv, ..."""
+    from .models import Instrumento
+
+    return re.compile(
+        r"(?:^|[^A-Z])(%s)(?:[^A-Z]|$)" % "|".join(c for c, _ in Instrumento.MERCADO_CHOICES)
+    )
+
+
+# =========================================================
+#   CLASIFICAR ARCHIVOS
+# =========================================================
+def clasificar_archivo(ruta):
+    """
+    Deduce (tipo, mercado) del nombre del archivo: los que contienen
+    "calific" son calificaciones; el resto son instrumentos y deben
+    llevar el código de mercado (CL, PE, CO) en el nombre.
+    """
+    nombre = os.path.basename(ruta)
+    if "calific" in nombre.lower():
+        return "CALIFICACIONES", ""
+
+    encontrado = _mercado_en_nombre().search(os.path.splitext(nombre)[0].upper())
+    if not encontrado:
+        raise ValueError(
+            f"No se pudo deducir el mercado de '{nombre}' "
+            "(se espera p. ej. instrumentos_CL.csv)."
+        )
+    return "INSTRUMENTOS", encontrado.group(1)
+
+
+def expandir_zip(ruta_zip, destino):
+    """Extrae los CSV de un ZIP en ``destino`` y devuelve sus rutas."""
+    rutas = []
+    with zipfile.ZipFile(ruta_zip) as zf:
+        for miembro in zf.infolist():
+            nombre = os.path.basename(miembro.filename)
+            if miembro.is_dir() or not nombre.lower().endswith(".csv"):
+                continue
+            ruta = os.path.join(destino, nombre)
+            with zf.open(miembro) as origen, open(ruta, "wb") as salida:
+                while bloque := origen.read(1024 * 1024):
+                    salida.write(bloque)
+            rutas.append(ruta)
+    return rutas
+
+
+# =========================================================
+#   EJECUCIÓN EN PARALELO
+# =========================================================
+def _cargar_archivo(tipo, ruta, mercado):
+    # Se importa aquí porque el proceso hijo inicializa Django primero.
+    from .cargas import cargar_instrumentos_csv, cargar_calificaciones_csv
+
+    ultimo = {}
+    inicio = time.perf_counter()
+    try:
+        with open(ruta, "rb") as archivo:
+            if tipo == "INSTRUMENTOS":
+                ok, msg = cargar_instrumentos_csv(archivo, mercado, progreso=ultimo.update)
+            else:
+                ok, msg = cargar_calificaciones_csv(archivo, progreso=ultimo.update)
+    except Exception as exc:
+        ok, msg = False, f"Error al procesar el archivo: {exc}"
+    finally:
+        connections.close_all()
+
+    return {
+        "archivo": os.path.basename(ruta),
+        "tipo": tipo,
+        "mercado": mercado,
+        "ok": ok,
+        "mensaje": msg,
+        "filas": ultimo.get("procesadas", 0),
+        "segundos": time.perf_counter() - inicio,
+    }
+
+
+def ejecutar_lote(archivos, procesos=None, al_terminar=None):
+    """
+    Carga varios CSV en paralelo. ``archivos`` es una lista de
+    (tipo, ruta, mercado). Primero corren en paralelo todos los archivos
+    de instrumentos; las calificaciones se lanzan cuando estos terminan,
+    porque referencian sus códigos. Devuelve los resultados por archivo
+    y el tiempo total; ``al_terminar(resultado)`` se llama a medida que
+    cada archivo termina.
+    """
+    fases = [
+        [a for a in archivos if a[0] == "INSTRUMENTOS"],
+        [a for a in archivos if a[0] == "CALIFICACIONES"],
+    ]
+
+    resultados = []
+    inicio = time.perf_counter()
+    # spawn en todas las plataformas (es el único que hay en Windows): cada
+    # hijo arranca sin conexiones heredadas y configura Django antes de
+    # recibir su primer archivo.
+    pool = ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+    with pool:
+        for fase in fases:
+            futuros = [pool.submit(_cargar_archivo, *a) for a in fase]
+            for futuro in as_completed(futuros):
+                resultado = futuro.result()
+                resultados.append(resultado)
+                if al_terminar:
+                    al_terminar(resultado)
+
+    return resultados, time.perf_counter() - inicio
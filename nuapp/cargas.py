@@ -0,0 +1,505 @@
+import codecs
+import csv
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from itertools import zip_longest
+
+from django.conf import settings
+from django.db import transaction
+from django.utils.dateparse import parse_date
+
+from .estadisticas import CambiosEstadisticas
+from .models import Instrumento, Calificacion
+from .versionado import incrementar_version, incrementar_version_instrumentos
+
+
+# =========================================================
+#   LECTURA EN STREAMING
+# =========================================================
+class LectorCSV:
+    """
+    Lee un CSV subido fila a fila sin cargarlo entero en memoria.
+
+    El encoding se detecta con una muestra del inicio del archivo; si
+    más adelante aparece una línea que no decodifica, esa línea se lee
+    como latin-1 en vez de abortar la carga. ``posicion()`` indica hasta
+    dónde se ha leído y se puede pasar como ``desde`` para retomar.
+    """
+
+    TAMANO_MUESTRA = 64 * 1024
+
+    def __init__(self, file_obj, desde=None):
+        self.file_obj = file_obj
+        self.encoding = _detectar_encoding(file_obj, self.TAMANO_MUESTRA)
+        self._reader = csv.reader(self._lineas(), delimiter=",")
+        self.encabezados = next(self._reader, None)
+        self._desfase = 0
+
+        if desde:
+            file_obj.seek(desde["bytes"])
+            self._desfase = desde["linea"] - self._reader.line_num
+
+    def _lineas(self):
+        # readline() en vez de iterar el archivo: así tell() es exacto.
+        primera = True
+        for linea in iter(self.file_obj.readline, b""):
+            if primera:
+                linea = linea.removeprefix(codecs.BOM_UTF8)
+                primera = False
+            try:
+                yield linea.decode(self.encoding)
+            except UnicodeDecodeError:
+                yield linea.decode("latin-1")
+
+    @property
+    def linea(self):
+        return self._reader.line_num + self._desfase
+
+    def posicion(self):
+        return {"bytes": self.file_obj.tell(), "linea": self.linea}
+
+    def __iter__(self):
+        for valores in self._reader:
+            if not valores:
+                continue
+            yield self.linea, dict(zip_longest(self.encabezados, valores))
+
+
+def _detectar_encoding(file_obj, tamano):
+    muestra = file_obj.read(tamano)
+    file_obj.seek(0)
+    try:
+        # final=False: la muestra puede cortar un carácter multibyte
+        codecs.getincrementaldecoder("utf-8")().decode(muestra, final=False)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin-1"
+
+
+def _tamano_lote(batch_size=None):
+    return batch_size or getattr(settings, "NUAM_CARGA_BATCH_SIZE", 1000)
+
+
+def _en_lotes(iterable, tamano):
+    lote = []
+    for item in iterable:
+        lote.append(item)
+        if len(lote) >= tamano:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+# =========================================================
+#   RECHAZOS
+# =========================================================
+class RegistroRechazos:
+    """
+    Filas rechazadas de una carga. Cuenta todas, guarda el detalle de
+    las primeras NUAM_CARGA_MAX_RECHAZOS para mostrarlas y, si recibe un
+    archivo de texto, escribe cada rechazo en él como una fila CSV.
+    """
+
+    ENCABEZADOS = ["linea", "codigo_instrumento", "motivo"]
+
+    def __init__(self, total=0, muestra=None, archivo=None):
+        self.total = total
+        self.muestra = list(muestra or [])
+        self._max_muestra = getattr(settings, "NUAM_CARGA_MAX_RECHAZOS", 50)
+        self._archivo = archivo
+        self._writer = None
+
+        if archivo is not None:
+            self._writer = csv.writer(archivo)
+            if archivo.tell() == 0:
+                self._writer.writerow(self.ENCABEZADOS)
+
+    def agregar(self, linea, codigo, motivo):
+        self.total += 1
+        if len(self.muestra) < self._max_muestra:
+            self.muestra.append({
+                "linea": linea,
+                "codigo_instrumento": codigo,
+                "motivo": motivo,
+            })
+        if self._writer:
+            self._writer.writerow([linea, codigo, motivo])
+
+    def posicion(self):
+        """Bytes escritos en el archivo de rechazos, para el checkpoint."""
+        if self._archivo is None:
+            return {}
+        self._archivo.flush()
+        return {"rechazos_bytes": self._archivo.tell()}
+
+
+# =========================================================
+#   VALIDACIÓN
+# =========================================================
+# Conjuntos y límites precalculados una vez; cada fila solo hace
+# búsquedas en sets y conversiones de la librería estándar.
+TIPOS_INSTRUMENTO = frozenset(c for c, _ in Instrumento.TIPO_CHOICES)
+ESTADOS_INSTRUMENTO = frozenset(c for c, _ in Instrumento.ESTADO_CHOICES)
+TIPOS_CALIFICACION = frozenset(c for c, _ in Calificacion.TIPO_CHOICES)
+ESTADOS_CALIFICACION = frozenset(c for c, _ in Calificacion.ESTADO_CHOICES)
+
+MAX_CODIGO = Instrumento._meta.get_field("codigo").max_length
+MAX_NOMBRE = Instrumento._meta.get_field("nombre").max_length
+
+_campo_monto = Calificacion._meta.get_field("monto")
+MONTO_LIMITE = Decimal(10) ** (_campo_monto.max_digits - _campo_monto.decimal_places)
+
+
+def _opcion(valor, opciones, campo, errores):
+    if valor not in opciones:
+        errores.append(f"valor inválido en {campo}: '{valor}'")
+    return valor
+
+
+def _fecha(valor, campo, errores, obligatoria=False):
+    if not valor:
+        if obligatoria:
+            errores.append(f"falta {campo}")
+        return None
+
+    try:
+        return date.fromisoformat(valor)
+    except ValueError:
+        pass
+
+    # Formatos que acepta Django pero no fromisoformat (p. ej. 2024-1-5)
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        errores.append(f"valor inválido en {campo}: '{valor}'")
+    return fecha
+
+
+def _monto(valor, errores):
+    if not valor:
+        return None
+    try:
+        monto = Decimal(valor)
+    except InvalidOperation:
+        errores.append(f"valor inválido en monto: '{valor}'")
+        return None
+    if not monto.is_finite() or abs(monto) >= MONTO_LIMITE:
+        errores.append(f"monto fuera de rango: '{valor}'")
+        return None
+    return monto
+
+
+def validar_instrumento(row):
+    """Devuelve (campos limpios, errores) para una fila de instrumentos."""
+    errores = []
+    codigo = (row["codigo"] or "").strip()
+    nombre = (row["nombre"] or "").strip()
+
+    if len(codigo) > MAX_CODIGO:
+        errores.append(f"codigo supera {MAX_CODIGO} caracteres")
+    if len(nombre) > MAX_NOMBRE:
+        errores.append(f"nombre supera {MAX_NOMBRE} caracteres")
+
+    datos = {
+        "codigo": codigo,
+        "nombre": nombre,
+        "tipo": _opcion((row["tipo"] or "").strip(), TIPOS_INSTRUMENTO, "tipo", errores),
+        "estado": _opcion((row["estado"] or "").strip(), ESTADOS_INSTRUMENTO, "estado", errores),
+        "fecha_emision": _fecha((row["fecha_emision"] or "").strip(), "fecha_emision", errores),
+        "fecha_vencimiento": _fecha((row["fecha_vencimiento"] or "").strip(), "fecha_vencimiento", errores),
+    }
+    return datos, errores
+
+
+def validar_calificacion(row):
+    """Devuelve (campos limpios, errores) para una fila de calificaciones."""
+    errores = []
+    datos = {
+        "tipo": _opcion((row["tipo"] or "").strip(), TIPOS_CALIFICACION, "tipo", errores),
+        "estado": _opcion((row["estado"] or "").strip(), ESTADOS_CALIFICACION, "estado", errores),
+        "fecha": _fecha((row["fecha"] or "").strip(), "fecha", errores, obligatoria=True),
+        "monto": _monto((row["monto"] or "").strip(), errores),
+    }
+    return datos, errores
+
+
+def _mensaje_validacion(que, validas, rechazos):
+    return (
+        f"Validación de {que} terminada: {validas} fila(s) válida(s), "
+        f"{rechazos.total} con errores. No se guardó ningún dato."
+    )
+
+
+# =========================================================
+#   INSTRUMENTOS
+# =========================================================
+CAMPOS_UPSERT_INSTRUMENTO = [
+    "nombre", "tipo", "estado", "mercado", "fecha_emision", "fecha_vencimiento",
+]
+
+
+def cargar_instrumentos_csv(
+    archivo, mercado, batch_size=None, progreso=None, checkpoint=None,
+    rechazos=None, solo_validar=False,
+):
+    """
+    Upsert por lotes: cada lote se envía como un único
+    INSERT ... ON CONFLICT(codigo) DO UPDATE y se confirma en su propia
+    transacción. Las filas que no pasan ``validar_instrumento`` van a
+    ``rechazos`` (un RegistroRechazos) y no se guardan. Las estadísticas
+    (ver estadisticas.py) se ajustan una vez por lote, en la misma
+    transacción.
+
+    Tras cada lote se llama ``progreso(checkpoint)`` dentro de esa misma
+    transacción; ``checkpoint`` trae la posición en el archivo y los
+    contadores, y pasarlo de vuelta a la función retoma la carga en el
+    punto en que quedó.
+
+    Con ``solo_validar`` se recorre el archivo completo aplicando las
+    mismas validaciones, pero sin leer ni escribir en la base de datos.
+    """
+    encabezados = ["codigo", "nombre", "tipo", "estado", "fecha_emision", "fecha_vencimiento"]
+    lector = LectorCSV(archivo, desde=checkpoint)
+
+    if lector.encabezados != encabezados:
+        return False, "Encabezados inválidos para instrumentos."
+
+    batch_size = _tamano_lote(batch_size)
+    if rechazos is None:
+        rechazos = RegistroRechazos()
+
+    def instrumentos():
+        for linea, row in lector:
+            codigo = (row["codigo"] or "").strip()
+            datos, errores = validar_instrumento(row)
+            if not codigo:
+                errores.insert(0, "falta codigo")
+            if errores:
+                rechazos.agregar(linea, codigo, "; ".join(errores))
+                continue
+
+            yield Instrumento(mercado=mercado, **datos)
+
+    checkpoint = checkpoint or {}
+    nuevos = checkpoint.get("nuevos", 0)
+    actualizados = checkpoint.get("actualizados", 0)
+    validas = checkpoint.get("procesadas", 0)
+
+    def avance():
+        return {
+            **lector.posicion(),
+            **rechazos.posicion(),
+            "procesadas": validas,
+            "rechazadas": rechazos.total,
+            "nuevos": nuevos,
+            "actualizados": actualizados,
+        }
+
+    for lote in _en_lotes(instrumentos(), batch_size):
+        validas += len(lote)
+        if solo_validar:
+            # Sin transacción ni consultas: solo se informa el avance
+            if progreso:
+                progreso(avance())
+            continue
+
+        with transaction.atomic():
+            # Dentro de un lote gana la última fila de cada código,
+            # igual que con update_or_create fila a fila.
+            por_codigo = {i.codigo: i for i in lote}
+            previos = {
+                codigo: (tipo, estado, mercado_previo)
+                for codigo, tipo, estado, mercado_previo in (
+                    Instrumento.objects
+                    .filter(codigo__in=list(por_codigo))
+                    .values_list("codigo", "tipo", "estado", "mercado")
+                )
+            }
+
+            cambios = CambiosEstadisticas()
+            for tipo, estado, mercado_previo in previos.values():
+                cambios.instrumento(mercado_previo, tipo, estado, signo=-1)
+            for i in por_codigo.values():
+                cambios.instrumento(mercado, i.tipo, i.estado)
+            # Las calificaciones siguen a su instrumento si cambia de mercado
+            movidos = [c for c, (_, _, m) in previos.items() if m != mercado]
+            if movidos:
+                cambios.mover_calificaciones(
+                    Calificacion.objects.filter(instrumento__codigo__in=movidos),
+                    hacia=mercado,
+                )
+
+            Instrumento.objects.bulk_create(
+                por_codigo.values(),
+                batch_size=batch_size,
+                update_conflicts=True,
+                unique_fields=["codigo"],
+                update_fields=CAMPOS_UPSERT_INSTRUMENTO,
+            )
+            cambios.aplicar()
+
+            insertados = len(por_codigo) - len(previos)
+            nuevos += insertados
+            actualizados += len(lote) - insertados
+            transaction.on_commit(incrementar_version)
+            transaction.on_commit(incrementar_version_instrumentos)
+
+            if progreso:
+                progreso(avance())
+
+    if solo_validar:
+        return True, _mensaje_validacion("instrumentos", validas, rechazos)
+
+    msg = (
+        f"Instrumentos procesados correctamente: {nuevos + actualizados} "
+        f"(nuevos: {nuevos}, actualizados: {actualizados})"
+    )
+    if rechazos.total:
+        msg += f" (rechazados: {rechazos.total})"
+    return True, msg
+
+
+# =========================================================
+#   CALIFICACIONES
+# =========================================================
+# Tope del mapa codigo -> (id, mercado), para que la memoria no crezca con el archivo
+MAX_CODIGOS_EN_CACHE = 100_000
+
+
+def cargar_calificaciones_csv(
+    archivo, batch_size=None, rechazos=None, progreso=None, checkpoint=None,
+    omitir_duplicados=False, solo_validar=False,
+):
+    """
+    Inserta las calificaciones con bulk_create por lotes. Los códigos de
+    instrumento de cada lote se resuelven con una sola consulta IN sobre
+    un mapa codigo -> (id, mercado) compartido por toda la carga; el
+    mercado sirve para sumar cada lote a EstadisticaMercado y
+    ResumenPeriodo. Las filas cuyo
+    instrumento no existe o que no pasan ``validar_calificacion`` se
+    agregan a ``rechazos`` en vez de abortar. Los lotes, ``progreso``,
+    ``checkpoint`` y ``solo_validar`` funcionan igual que en
+    ``cargar_instrumentos_csv``; al solo validar no se comprueba que el
+    instrumento exista, porque eso requiere consultar la base de datos.
+
+    Con ``omitir_duplicados`` no se insertan las filas cuya huella ya
+    existe en la tabla (o se repite dentro del lote); se comprueba con
+    una consulta indexada por lote.
+    """
+    encabezados = ["codigo_instrumento", "tipo", "estado", "fecha", "monto"]
+    lector = LectorCSV(archivo, desde=checkpoint)
+
+    if lector.encabezados != encabezados:
+        return False, "Encabezados inválidos para calificaciones."
+
+    batch_size = _tamano_lote(batch_size)
+    if rechazos is None:
+        rechazos = RegistroRechazos()
+
+    def filas():
+        for linea, row in lector:
+            codigo_instr = (row["codigo_instrumento"] or "").strip()
+            datos, errores = validar_calificacion(row)
+            if not codigo_instr:
+                errores.insert(0, "falta codigo_instrumento")
+            if errores:
+                rechazos.agregar(linea, codigo_instr, "; ".join(errores))
+                continue
+
+            yield linea, codigo_instr, datos
+
+    # codigo -> (id, mercado), o None si el instrumento no existe
+    ids_por_codigo = {}
+
+    checkpoint = checkpoint or {}
+    creadas = checkpoint.get("procesadas", 0)
+    omitidas = checkpoint.get("omitidas", 0)
+
+    def avance():
+        return {
+            **lector.posicion(),
+            **rechazos.posicion(),
+            "procesadas": creadas,
+            "rechazadas": rechazos.total,
+            "omitidas": omitidas,
+        }
+
+    for lote in _en_lotes(filas(), batch_size):
+        if solo_validar:
+            # Sin transacción ni consultas: solo se informa el avance
+            creadas += len(lote)
+            if progreso:
+                progreso(avance())
+            continue
+
+        with transaction.atomic():
+            codigos = {codigo for _, codigo, _ in lote}
+            if len(ids_por_codigo) + len(codigos) > MAX_CODIGOS_EN_CACHE:
+                ids_por_codigo.clear()
+
+            pendientes = codigos - ids_por_codigo.keys()
+            if pendientes:
+                encontrados = {
+                    codigo: (id_, mercado)
+                    for codigo, id_, mercado in (
+                        Instrumento.objects
+                        .filter(codigo__in=pendientes)
+                        .values_list("codigo", "id", "mercado")
+                    )
+                }
+                for codigo in pendientes:
+                    ids_por_codigo[codigo] = encontrados.get(codigo)
+
+            calificaciones, mercados = [], []
+            for linea, codigo_instr, datos in lote:
+                encontrado = ids_por_codigo[codigo_instr]
+                if encontrado is None:
+                    rechazos.agregar(linea, codigo_instr, "Instrumento inexistente")
+                    continue
+
+                instrumento_id, mercado = encontrado
+                calificacion = Calificacion(instrumento_id=instrumento_id, **datos)
+                # bulk_create no pasa por save(), la huella se calcula aquí
+                calificacion.huella = calificacion.calcular_huella()
+                calificaciones.append(calificacion)
+                mercados.append(mercado)
+
+            if omitir_duplicados and calificaciones:
+                vistas = set(
+                    Calificacion.objects
+                    .filter(huella__in={c.huella for c in calificaciones})
+                    .values_list("huella", flat=True)
+                )
+                nuevas, mercados_nuevas = [], []
+                for c, mercado in zip(calificaciones, mercados):
+                    if c.huella not in vistas:
+                        vistas.add(c.huella)
+                        nuevas.append(c)
+                        mercados_nuevas.append(mercado)
+                omitidas += len(calificaciones) - len(nuevas)
+                calificaciones, mercados = nuevas, mercados_nuevas
+
+            Calificacion.objects.bulk_create(calificaciones, batch_size=batch_size)
+            creadas += len(calificaciones)
+            if calificaciones:
+                cambios = CambiosEstadisticas()
+                for c, mercado in zip(calificaciones, mercados):
+                    cambios.calificacion(mercado, c.tipo, c.estado, c.monto, c.fecha)
+                cambios.aplicar()
+                transaction.on_commit(incrementar_version)
+
+            if progreso:
+                progreso(avance())
+
+    if solo_validar:
+        return True, _mensaje_validacion("calificaciones", creadas, rechazos)
+
+    msg = f"Calificaciones procesadas correctamente: {creadas}"
+    if omitidas:
+        msg += f" (omitidas por duplicadas: {omitidas})"
+    if rechazos.total:
+        msg += f" (rechazadas: {rechazos.total})"
+    return True, msg
@@ -0,0 +1,131 @@
+import csv
+import os
+import random
+from datetime import date, timedelta
+from itertools import accumulate
+
+from .models import Instrumento
+
+
+# Tamaños predefinidos: (instrumentos, calificaciones)
+TAMANOS = {
+    "10k": (1_000, 10_000),
+    "100k": (10_000, 100_000),
+    "1m": (100_000, 1_000_000),
+}
+
+# Distribuciones aproximadas a las de los archivos reales
+PESOS_MERCADO = {"CL": 0.5, "PE": 0.25, "CO": 0.25}
+PESOS_TIPO_INSTRUMENTO = {"ACCION": 0.45, "BONO": 0.35, "DERIVADO": 0.15, "OTRO": 0.05}
+PESOS_ESTADO_INSTRUMENTO = {"ACTIVO": 0.9, "INACTIVO": 0.1}
+PESOS_TIPO_CALIFICACION = {"RIESGO": 0.4, "CREDITO": 0.35, "TRIBUTARIA": 0.25}
+PESOS_ESTADO_CALIFICACION = {"ACTIVA": 0.85, "INACTIVA": 0.15}
+
+PREFIJOS_TIPO = {"ACCION": "ACC", "BONO": "BON", "DERIVADO": "DER", "OTRO": "OTR"}
+NOMBRES_TIPO = dict(Instrumento.TIPO_CHOICES)
+
+# Tope de los montos generados (muy por debajo del límite del campo)
+MONTO_MAXIMO = 1e12
+
+# Las calificaciones se reparten entre los instrumentos con una ley de
+# potencias: unos pocos instrumentos concentran muchas calificaciones.
+EXPONENTE_CONCENTRACION = 1.1
+
+
+def _elegir(rng, pesos, k):
+    return rng.choices(list(pesos), weights=list(pesos.values()), k=k)
+
+
+def generar_instrumentos(n, semilla=42):
+    """Genera ``n`` filas de instrumentos como dicts, agrupables por mercado."""
+    rng = random.Random(semilla)
+    mercados = _elegir(rng, PESOS_MERCADO, n)
+    tipos = _elegir(rng, PESOS_TIPO_INSTRUMENTO, n)
+    estados = _elegir(rng, PESOS_ESTADO_INSTRUMENTO, n)
+    hoy = date.today()
+
+    for i in range(n):
+        emision = hoy - timedelta(days=rng.randint(30, 3650))
+        vencimiento = (
+            emision + timedelta(days=rng.randint(365, 7300))
+            if tipos[i] in ("BONO", "DERIVADO") else None
+        )
+        yield {
+            "codigo": f"{PREFIJOS_TIPO[tipos[i]]}-{mercados[i]}-{i:07d}",
+            "nombre": f"{NOMBRES_TIPO[tipos[i]]} {mercados[i]} {i}",
+            "tipo": tipos[i],
+            "mercado": mercados[i],
+            "estado": estados[i],
+            "fecha_emision": emision.isoformat(),
+            "fecha_vencimiento": vencimiento.isoformat() if vencimiento else "",
+        }
+
+
+def generar_calificaciones(n, codigos, semilla=42):
+    """Genera ``n`` filas de calificaciones sobre la lista ``codigos``."""
+    rng = random.Random(semilla + 1)
+    acumulados = list(accumulate(
+        1 / (rango + 1) ** EXPONENTE_CONCENTRACION for rango in range(len(codigos))
+    ))
+    hoy = date.today()
+
+    # Se genera en bloques para no materializar listas de n elementos.
+    bloque = 10_000
+    for inicio in range(0, n, bloque):
+        k = min(bloque, n - inicio)
+        elegidos = rng.choices(codigos, cum_weights=acumulados, k=k)
+        tipos = _elegir(rng, PESOS_TIPO_CALIFICACION, k)
+        estados = _elegir(rng, PESOS_ESTADO_CALIFICACION, k)
+
+        for j in range(k):
+            monto = (
+                "" if rng.random() < 0.05
+                else f"{min(rng.lognormvariate(13, 1.5), MONTO_MAXIMO):.2f}"
+            )
+            yield {
+                "codigo_instrumento": elegidos[j],
+                "tipo": tipos[j],
+                "estado": estados[j],
+                "fecha": (hoy - timedelta(days=rng.randint(0, 1095))).isoformat(),
+                "monto": monto,
+            }
+
+
+def escribir_archivos(directorio, n_instrumentos, n_calificaciones, semilla=42):
+    """
+    Escribe instrumentos_<MERCADO>.csv y calificaciones.csv en
+    ``directorio`` con el formato que espera la carga masiva. Devuelve
+    las rutas en el orden en que deben cargarse.
+    """
+    os.makedirs(directorio, exist_ok=True)
+    encabezados_instr = ["codigo", "nombre", "tipo", "estado", "fecha_emision", "fecha_vencimiento"]
+
+    archivos = {}
+    writers = {}
+    codigos = []
+    try:
+        for fila in generar_instrumentos(n_instrumentos, semilla):
+            mercado = fila.pop("mercado")
+            if mercado not in writers:
+                ruta = os.path.join(directorio, f"instrumentos_{mercado}.csv")
+                archivos[mercado] = open(ruta, "w", newline="", encoding="utf-8")
+                writers[mercado] = csv.DictWriter(archivos[mercado], encabezados_instr)
+                writers[mercado].writeheader()
+            writers[mercado].writerow(fila)
+            codigos.append(fila["codigo"])
+    finally:
+        for f in archivos.values():
+            f.close()
+
+    rutas = [f.name for f in archivos.values()]
+
+    ruta_calif = os.path.join(directorio, "calificaciones.csv")
+    with open(ruta_calif, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, ["codigo_instrumento", "tipo", "estado", "fecha", "monto"])
+        writer.writeheader()
+        if codigos:
+            writer.writerows(generar_calificaciones(n_calificaciones, codigos, semilla))
+    rutas.append(ruta_calif)
+
+    return rutas
+
@@ -0,0 +1,233 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+
+from .models import Instrumento, Calificacion, EstadisticaMercado, ResumenPeriodo
+from .versionado import incrementar_version
+
+
+# =========================================================
+#   ESTADÍSTICAS POR MERCADO
+# =========================================================
+# EstadisticaMercado guarda cantidad y suma de monto por (modelo,
+# mercado, tipo, estado) y ResumenPeriodo lo mismo para las
+# calificaciones por día y por mes de su fecha. Los cambios se acumulan
+# en un CambiosEstadisticas y se suman a las filas en la base de datos:
+# las señales lo hacen en cada save()/delete() y las cargas masivas una
+# vez por lote. reconstruir_estadisticas() recalcula ambas desde cero.
+INSTRUMENTOS = "INSTRUMENTOS"
+CALIFICACIONES = "CALIFICACIONES"
+
+DIA = "DIA"
+MES = "MES"
+
+CAMPOS_ESTADISTICA = ["modelo", "mercado", "tipo", "estado"]
+CAMPOS_PERIODO = ["granularidad", "periodo", "mercado", "tipo", "estado"]
+
+
+def centavos(monto):
+    """Monto (Decimal, float de SQLite o None) en centavos enteros."""
+    if monto is None:
+        return 0
+    return int(Decimal(monto).quantize(Decimal("0.01")) * 100)
+
+
+def _acumular(modelo, campos, cambios):
+    """
+    Suma ``cambios`` ({clave: [cantidad, monto_centavos]}, con la clave en
+    el orden de ``campos``) a las filas de ``modelo``, creándolas si
+    faltan. Cada fila es un INSERT ... ON CONFLICT DO UPDATE (SQLite y
+    PostgreSQL): la suma la hace la base de datos, sin leer antes, y dos
+    escrituras simultáneas no se pisan.
+    """
+    q = connection.ops.quote_name
+    tabla = q(modelo._meta.db_table)
+    columnas = ", ".join(q(modelo._meta.get_field(c).column) for c in campos)
+    sql = (
+        f"INSERT INTO {tabla} ({columnas}, cantidad, monto_centavos) "
+        f"VALUES ({', '.join(['%s'] * (len(campos) + 2))}) "
+        f"ON CONFLICT ({columnas}) DO UPDATE SET "
+        f"cantidad = {tabla}.cantidad + excluded.cantidad, "
+        f"monto_centavos = {tabla}.monto_centavos + excluded.monto_centavos"
+    )
+    preparar = [modelo._meta.get_field(c).get_db_prep_value for c in campos]
+    filas = [
+        [p(v, connection) for p, v in zip(preparar, clave)] + cambio
+        for clave, cambio in cambios
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, filas)
+
+
+def _pendientes(cambios):
+    pendientes = [(clave, c) for clave, c in cambios.items() if c[0] or c[1]]
+    cambios.clear()
+    return pendientes
+
+
+class CambiosEstadisticas:
+    def __init__(self):
+        self._cambios = defaultdict(lambda: [0, 0])
+        self._periodos = defaultdict(lambda: [0, 0])
+
+    def sumar(self, modelo, mercado, tipo, estado, cantidad=1, monto_centavos=0):
+        cambio = self._cambios[modelo, mercado, tipo, estado]
+        cambio[0] += cantidad
+        cambio[1] += monto_centavos
+
+    def sumar_periodo(self, fecha, mercado, tipo, estado, cantidad=1, monto_centavos=0):
+        for granularidad, periodo in ((DIA, fecha), (MES, fecha.replace(day=1))):
+            cambio = self._periodos[granularidad, periodo, mercado, tipo, estado]
+            cambio[0] += cantidad
+            cambio[1] += monto_centavos
+
+    def instrumento(self, mercado, tipo, estado, signo=1):
+        self.sumar(INSTRUMENTOS, mercado, tipo, estado, signo)
+
+    def calificacion(self, mercado, tipo, estado, monto, fecha, signo=1):
+        monto = signo * centavos(monto)
+        self.sumar(CALIFICACIONES, mercado, tipo, estado, signo, monto)
+        self.sumar_periodo(fecha, mercado, tipo, estado, signo, monto)
+
+    def mover_calificaciones(self, calificaciones, hacia=None, desde=None):
+        """
+        Descuenta las calificaciones del queryset del mercado que hoy tiene
+        su instrumento (o de ``desde``, si el instrumento ya se guardó con
+        el mercado nuevo) y, si se indica ``hacia``, las suma en ese.
+        """
+        grupos = (
+            calificaciones.order_by()
+            .values_list("instrumento__mercado", "tipo", "estado", "fecha")
+            .annotate(n=Count("id"), monto=Sum("monto"))
+        )
+        for mercado, tipo, estado, fecha, n, monto in grupos:
+            monto = centavos(monto)
+            for m, signo in ((desde or mercado, -1), (hacia, 1)):
+                if m:
+                    self.sumar(CALIFICACIONES, m, tipo, estado, signo * n, signo * monto)
+                    self.sumar_periodo(fecha, m, tipo, estado, signo * n, signo * monto)
+
+    def aplicar(self):
+        estadisticas = _pendientes(self._cambios)
+        periodos = _pendientes(self._periodos)
+        with transaction.atomic():
+            if estadisticas:
+                _acumular(EstadisticaMercado, CAMPOS_ESTADISTICA, estadisticas)
+            if periodos:
+                _acumular(ResumenPeriodo, CAMPOS_PERIODO, periodos)
+
+
+# =========================================================
+#   LECTURA
+# =========================================================
+def grupos_guardados():
+    """
+    (instrumentos, calificaciones) con las filas de EstadisticaMercado en
+    la forma de grupos_instrumentos() y grupos_calificaciones().
+    """
+    instrumentos, calificaciones = [], []
+    filas = EstadisticaMercado.objects.values_list(
+        "modelo", "mercado", "tipo", "estado", "cantidad", "monto_centavos",
+    )
+    for modelo, mercado, tipo, estado, cantidad, monto in filas:
+        if modelo == INSTRUMENTOS:
+            instrumentos.append((tipo, estado, mercado, cantidad))
+        else:
+            calificaciones.append((tipo, estado, mercado, cantidad, Decimal(monto) / 100))
+    return instrumentos, calificaciones
+
+
+# =========================================================
+#   RECONSTRUCCIÓN DESDE LAS TABLAS
+# =========================================================
+def grupos_instrumentos():
+    """Tuplas (tipo, estado, mercado, instrumentos)."""
+    return (
+        Instrumento.objects.order_by()
+        .values_list("tipo", "estado", "mercado")
+        .annotate(n=Count("id"))
+    )
+
+
+def grupos_calificaciones():
+    """Tuplas (tipo, estado, mercado del instrumento, calificaciones, suma de monto)."""
+    return (
+        Calificacion.objects.order_by()
+        .values_list("tipo", "estado", "instrumento__mercado")
+        .annotate(n=Count("id"), monto=Sum("monto"))
+    )
+
+
+def calcular_estadisticas():
+    """{(modelo, mercado, tipo, estado): (cantidad, monto_centavos)} leído de las tablas."""
+    resultado = {}
+    for tipo, estado, mercado, n in grupos_instrumentos():
+        resultado[INSTRUMENTOS, mercado, tipo, estado] = (n, 0)
+    for tipo, estado, mercado, n, monto in grupos_calificaciones():
+        resultado[CALIFICACIONES, mercado, tipo, estado] = (n, centavos(monto))
+    return resultado
+
+
+def calcular_periodos():
+    """
+    {(granularidad, periodo, mercado, tipo, estado): (cantidad,
+    monto_centavos)} leído de las calificaciones. Los meses se suman desde
+    los días en Python, en centavos exactos.
+    """
+    resultado = {}
+    meses = defaultdict(lambda: [0, 0])
+    grupos = (
+        Calificacion.objects.order_by()
+        .values_list("fecha", "instrumento__mercado", "tipo", "estado")
+        .annotate(n=Count("id"), monto=Sum("monto"))
+    )
+    for fecha, mercado, tipo, estado, n, monto in grupos:
+        monto = centavos(monto)
+        resultado[DIA, fecha, mercado, tipo, estado] = (n, monto)
+        mes = meses[MES, fecha.replace(day=1), mercado, tipo, estado]
+        mes[0] += n
+        mes[1] += monto
+    resultado.update((clave, tuple(valor)) for clave, valor in meses.items())
+    return resultado
+
+
+def _reconstruir(modelo, campos, calculadas, solo_verificar):
+    guardadas = {
+        tuple(fila[:-2]): fila[-2:]
+        for fila in modelo.objects.values_list(*campos, "cantidad", "monto_centavos")
+    }
+    # Las combinaciones que quedaron en cero no cuentan como diferencia
+    diferencias = sorted(
+        clave for clave in calculadas.keys() | guardadas.keys()
+        if calculadas.get(clave, (0, 0)) != tuple(guardadas.get(clave, (0, 0)))
+    )
+    if not solo_verificar:
+        modelo.objects.all().delete()
+        modelo.objects.bulk_create(
+            (
+                modelo(**dict(zip(campos, clave)), cantidad=cantidad, monto_centavos=monto)
+                for clave, (cantidad, monto) in calculadas.items()
+            ),
+            batch_size=1000,
+        )
+    return diferencias
+
+
+def reconstruir_estadisticas(solo_verificar=False):
+    """
+    Reemplaza EstadisticaMercado y ResumenPeriodo por lo que dicen las
+    tablas y devuelve las claves cuyo valor guardado no coincidía (primero
+    las de EstadisticaMercado). Con ``solo_verificar`` devuelve las
+    diferencias sin escribir nada.
+    """
+    with transaction.atomic():
+        diferencias = _reconstruir(
+            EstadisticaMercado, CAMPOS_ESTADISTICA, calcular_estadisticas(), solo_verificar
+        ) + _reconstruir(
+            ResumenPeriodo, CAMPOS_PERIODO, calcular_periodos(), solo_verificar
+        )
+        if diferencias and not solo_verificar:
+            transaction.on_commit(incrementar_version)
+    return diferencias
@@ -0,0 +1,168 @@
+import hashlib
+import io
+import json
+import multiprocessing
+import os
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import django
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+from .exportaciones import (
+    ENCABEZADOS_INSTRUMENTOS,
+    ENCABEZADOS_CALIFICACIONES,
+    csv_en_bloques,
+    filas_instrumentos,
+    filas_calificaciones,
+)
+from .models import Instrumento, Calificacion
+
+
+# =========================================================
+#   FRAGMENTOS (UN CSV POR MODELO Y MERCADO)
+# =========================================================
+def _contar(filas, contador):
+    for fila in filas:
+        contador[0] += 1
+        yield fila
+
+
+def _generar_fragmento(tipo, mercado, directorio):
+    """Escribe el CSV de ``tipo`` para ``mercado`` y devuelve sus datos para el manifiesto."""
+    if tipo == "instrumentos":
+        encabezados = ENCABEZADOS_INSTRUMENTOS
+        filas = filas_instrumentos(Instrumento.objects.filter(mercado=mercado))
+    else:
+        encabezados = ENCABEZADOS_CALIFICACIONES
+        filas = filas_calificaciones(Calificacion.objects.filter(instrumento__mercado=mercado))
+
+    nombre = f"{tipo}_{mercado}.csv"
+    ruta = os.path.join(directorio, nombre)
+    contador = [0]
+    huella = hashlib.sha256()
+    total = 0
+
+    try:
+        with open(ruta, "wb") as archivo:
+            for bloque in csv_en_bloques(encabezados, _contar(filas, contador)):
+                datos = bloque.encode(settings.DEFAULT_CHARSET)
+                huella.update(datos)
+                total += len(datos)
+                archivo.write(datos)
+    finally:
+        connections.close_all()
+
+    return {
+        "archivo": nombre,
+        "ruta": ruta,
+        "modelo": tipo,
+        "mercado": mercado,
+        "filas": contador[0],
+        "bytes": total,
+        "sha256": huella.hexdigest(),
+    }
+
+
+# =========================================================
+#   ZIP EN STREAMING
+# =========================================================
+class _Salida(io.RawIOBase):
+    """Destino del ZipFile: acumula lo escrito hasta que se envía."""
+
+    def __init__(self):
+        self._bloques = []
+
+    def writable(self):
+        return True
+
+    def write(self, datos):
+        self._bloques.append(bytes(datos))
+        return len(datos)
+
+    def vaciar(self):
+        datos = b"".join(self._bloques)
+        self._bloques.clear()
+        return datos
+
+
+def _procesos():
+    procesos = getattr(settings, "NUAM_EXPORT_ZIP_PROCESOS", None)
+    if procesos is None:
+        procesos = os.cpu_count() or 1
+    fragmentos = 2 * len(Instrumento.MERCADO_CHOICES)
+    return max(1, min(procesos, fragmentos))
+
+
+def _fragmentos(directorio, procesos):
+    """Genera los CSV y los devuelve a medida que terminan."""
+    trabajos = [
+        (tipo, mercado, directorio)
+        for tipo in ("instrumentos", "calificaciones")
+        for mercado, _ in Instrumento.MERCADO_CHOICES
+    ]
+
+    if procesos == 1:
+        for trabajo in trabajos:
+            yield _generar_fragmento(*trabajo)
+        return
+
+    # Se llama desde el servidor web, que puede tener otros hilos con
+    # locks tomados: con fork un hijo podría heredar uno y quedar bloqueado.
+    # Con spawn cada hijo arranca limpio, sin conexiones heredadas, y
+    # configura Django antes de importar este módulo.
+    pool = ProcessPoolExecutor(
+        max_workers=procesos,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=django.setup,
+    )
+    try:
+        futuros = [pool.submit(_generar_fragmento, *trabajo) for trabajo in trabajos]
+        for futuro in as_completed(futuros):
+            yield futuro.result()
+    finally:
+        # Si el cliente corta la descarga, los que no empezaron se cancelan
+        pool.shutdown(wait=True, cancel_futures=True)
+
+
+def zip_por_mercado(procesos=None):
+    """
+    Genera, como bloques de bytes, un ZIP con un CSV por modelo y mercado
+    (instrumentos_CL.csv, calificaciones_PE.csv, ...) y un manifest.json
+    con filas, tamaño y SHA-256 de cada uno. Los CSV se generan en
+    paralelo en ``procesos`` procesos (NUAM_EXPORT_ZIP_PROCESOS) y se
+    agregan al ZIP en el orden en que terminan.
+    """
+    if procesos is None:
+        procesos = _procesos()
+    nivel = getattr(settings, "NUAM_EXPORT_GZIP_NIVEL", 6)
+    ahora = timezone.localtime()
+    salida = _Salida()
+    manifiesto = []
+
+    with tempfile.TemporaryDirectory(prefix="nuam-zip-") as tmp:
+        with zipfile.ZipFile(salida, "w", zipfile.ZIP_DEFLATED, compresslevel=nivel) as archivo_zip:
+            for fragmento in _fragmentos(tmp, procesos):
+                ruta = fragmento.pop("ruta")
+                # Tamaño conocido: ZIP64 solo si el CSV pasa de ~2 GB
+                grande = fragmento["bytes"] > 2 ** 31
+
+                with open(ruta, "rb") as origen, \
+                        archivo_zip.open(fragmento["archivo"], "w", force_zip64=grande) as destino:
+                    while bloque := origen.read(1024 * 1024):
+                        destino.write(bloque)
+                        comprimido = salida.vaciar()
+                        if comprimido:
+                            yield comprimido
+                os.unlink(ruta)
+                manifiesto.append(fragmento)
+
+            manifiesto.sort(key=lambda f: f["archivo"])
+            archivo_zip.writestr(
+                "manifest.json",
+                json.dumps({"generado": ahora.isoformat(), "archivos": manifiesto}, indent=2),
+            )
+        yield salida.vaciar()
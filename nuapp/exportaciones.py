@@ -0,0 +1,172 @@
+import csv
+import io
+import zlib
+
+from django.conf import settings
+
+from .models import Instrumento, Calificacion
+
+
+# =========================================================
+#   ENCABEZADOS
+# =========================================================
+ENCABEZADOS_INSTRUMENTOS = [
+    "Código",
+    "Nombre",
+    "Tipo",
+    "Mercado",
+    "Estado",
+    "Fecha Emisión",
+    "Fecha Vencimiento",
+]
+
+ENCABEZADOS_CALIFICACIONES = [
+    "Código",
+    "Instrumento",
+    "Tipo",
+    "Estado",
+    "Fecha",
+    "Monto",
+]
+
+
+# (encabezado, peso del ancho, alineación) para las tablas PDF
+COLUMNAS_PDF_INSTRUMENTOS = [
+    ("Código", 1.4, "izquierda"),
+    ("Nombre", 3.2, "izquierda"),
+    ("Tipo", 1, "izquierda"),
+    ("Mercado", 1, "izquierda"),
+    ("Estado", 0.9, "izquierda"),
+    ("Fecha Emisión", 1.1, "izquierda"),
+    ("Fecha Vencimiento", 1.2, "izquierda"),
+]
+
+COLUMNAS_PDF_CALIFICACIONES = [
+    ("Código", 1, "izquierda"),
+    ("Instrumento", 4, "izquierda"),
+    ("Tipo", 1, "izquierda"),
+    ("Estado", 0.9, "izquierda"),
+    ("Fecha", 1, "izquierda"),
+    ("Monto", 1.2, "derecha"),
+]
+
+
+def _chunk_size():
+    return getattr(settings, "NUAM_EXPORT_CHUNK_SIZE", 2000)
+
+
+# =========================================================
+#   FILAS
+# =========================================================
+# Se leen tuplas con values_list().iterator(): sin instanciar modelos y
+# sin traer la tabla completa a memoria. Las etiquetas de las opciones
+# salen de diccionarios armados una sola vez, no de get_*_display().
+def filas_instrumentos(queryset=None):
+    tipos = dict(Instrumento.TIPO_CHOICES)
+    mercados = dict(Instrumento.MERCADO_CHOICES)
+
+    if queryset is None:
+        queryset = Instrumento.objects.all()
+
+    tuplas = (
+        queryset
+        .order_by("codigo")
+        .values_list(
+            "codigo", "nombre", "tipo", "mercado", "estado",
+            "fecha_emision", "fecha_vencimiento",
+        )
+        .iterator(chunk_size=_chunk_size())
+    )
+
+    for codigo, nombre, tipo, mercado, estado, emision, vencimiento in tuplas:
+        yield [
+            codigo,
+            nombre,
+            tipos.get(tipo, tipo),
+            mercados.get(mercado, mercado),
+            estado,
+            emision or "",
+            vencimiento or "",
+        ]
+
+
+def filas_calificaciones(queryset=None):
+    tipos = dict(Calificacion.TIPO_CHOICES)
+
+    if queryset is None:
+        queryset = Calificacion.objects.all()
+
+    tuplas = (
+        queryset
+        .order_by("id")
+        .values_list(
+            "id", "instrumento__codigo", "instrumento__nombre",
+            "tipo", "estado", "fecha", "monto",
+        )
+        .iterator(chunk_size=_chunk_size())
+    )
+
+    for id_, codigo, nombre, tipo, estado, fecha, monto in tuplas:
+        yield [
+            f"CAL-{id_}",
+            f"{codigo} - {nombre}",
+            tipos.get(tipo, tipo),
+            estado,
+            fecha,
+            "" if monto is None else monto,
+        ]
+
+
+# =========================================================
+#   CSV EN STREAMING
+# =========================================================
+def csv_en_bloques(encabezados, filas):
+    """
+    Genera el CSV como bloques de texto de NUAM_EXPORT_CHUNK_SIZE filas.
+    El encabezado sale solo en el primer bloque, antes de la consulta,
+    para que el cliente reciba el primer byte de inmediato.
+    """
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    por_bloque = _chunk_size()
+
+    writer.writerow(encabezados)
+    yield buffer.getvalue()
+    buffer.seek(0)
+    buffer.truncate()
+
+    for i, fila in enumerate(filas, 1):
+        writer.writerow(fila)
+        if i % por_bloque == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    resto = buffer.getvalue()
+    if resto:
+        yield resto
+
+
+# =========================================================
+#   GZIP EN STREAMING
+# =========================================================
+def gzip_en_bloques(bloques, nivel=None):
+    """
+    Comprime en formato gzip a medida que llegan los bloques (texto o
+    bytes), sin juntar el archivo completo. El nivel por defecto sale de
+    NUAM_EXPORT_GZIP_NIVEL (1 = más rápido, 9 = más pequeño).
+    """
+    if nivel is None:
+        nivel = getattr(settings, "NUAM_EXPORT_GZIP_NIVEL", 6)
+    # wbits=31: cabecera y cola gzip (con fecha 0, así el resultado no
+    # cambia entre dos compresiones del mismo contenido)
+    compresor = zlib.compressobj(nivel, zlib.DEFLATED, 31)
+
+    for bloque in bloques:
+        if isinstance(bloque, str):
+            bloque = bloque.encode(settings.DEFAULT_CHARSET)
+        comprimido = compresor.compress(bloque)
+        if comprimido:
+            yield comprimido
+
+    yield compresor.flush()
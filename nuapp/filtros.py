@@ -0,0 +1,84 @@
+from django.utils.dateparse import parse_date
+
+from .busqueda import filtrar_por_texto
+from .models import Instrumento, Calificacion
+
+
+# =========================================================
+#   FILTROS DE LISTADOS
+# =========================================================
+# Los usan tanto los listados como las exportaciones, para que un
+# export descargue exactamente lo que el usuario está viendo.
+PARAMETROS_INSTRUMENTOS = ("q", "tipo", "mercado", "estado")
+PARAMETROS_CALIFICACIONES = ("codigo", "tipo", "estado", "mercado", "fecha_desde", "fecha_hasta")
+
+
+def _fecha(valor):
+    try:
+        return parse_date(valor)
+    except ValueError:
+        return None
+
+
+def filtrar_instrumentos(params, queryset=None):
+    """Filtros de instrumentos_view: q (código o nombre), tipo, mercado, estado."""
+    if queryset is None:
+        queryset = Instrumento.objects.all()
+
+    q = params.get("q", "")
+    tipo = params.get("tipo", "")
+    mercado = params.get("mercado", "")
+    estado = params.get("estado", "")
+
+    if q:
+        queryset = filtrar_por_texto(queryset, q)
+
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+
+    if mercado:
+        queryset = queryset.filter(mercado=mercado)
+
+    if estado:
+        queryset = queryset.filter(estado=estado)
+
+    return queryset
+
+
+def filtrar_calificaciones(params, queryset=None):
+    """
+    Filtros de calificaciones_view: codigo (CAL-12 o 12), tipo, estado,
+    mercado del instrumento y rango fecha_desde / fecha_hasta.
+    """
+    if queryset is None:
+        queryset = Calificacion.objects.all()
+
+    codigo = params.get("codigo", "")
+    tipo = params.get("tipo", "")
+    estado = params.get("estado", "")
+    mercado = params.get("mercado", "")
+    fecha_desde = _fecha(params.get("fecha_desde", ""))
+    fecha_hasta = _fecha(params.get("fecha_hasta", ""))
+
+    # Código de calificación (CAL-12 o 12)
+    if codigo:
+        codigo = codigo.replace("CAL-", "")
+        if codigo.isdigit():
+            queryset = queryset.filter(id=codigo)
+
+    if tipo:
+        queryset = queryset.filter(tipo=tipo)
+
+    if estado:
+        queryset = queryset.filter(estado=estado)
+
+    if mercado:
+        queryset = queryset.filter(instrumento__mercado=mercado)
+
+    if fecha_desde:
+        queryset = queryset.filter(fecha__gte=fecha_desde)
+
+    if fecha_hasta:
+        queryset = queryset.filter(fecha__lte=fecha_hasta)
+
+    return queryset
@@ -0,0 +1,69 @@
+import json
+import os
+
+from django.core.management.base import BaseCommand
+
+from nuapp.benchmark import comparar, ejecutar_benchmark, guardar
+from nuapp.datos_sinteticos import TAMANOS
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cargadores y exportadores con datos sintéticos en una base de "
+        "datos temporal y guarda filas/s, consultas y memoria pico en JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tamano", choices=sorted(TAMANOS), default="10k")
+        parser.add_argument("--semilla", type=int, default=42)
+        parser.add_argument(
+            "--sin-memoria",
+            action="store_true",
+            help="No mide memoria (tracemalloc hace más lentos los tiempos).",
+        )
+        parser.add_argument(
+            "--salida",
+            help="Archivo JSON de resultados (por defecto en benchmarks/).",
+        )
+        parser.add_argument(
+            "--comparar",
+            help="JSON de una ejecución anterior con el que comparar filas/s.",
+        )
+
+    def handle(self, *args, **options):
+        n_instr, n_calif = TAMANOS[options["tamano"]]
+        self.stdout.write(
+            f"Benchmark {options['tamano']}: {n_instr} instrumentos, {n_calif} calificaciones"
+        )
+
+        informe = ejecutar_benchmark(
+            n_instr,
+            n_calif,
+            semilla=options["semilla"],
+            memoria=not options["sin_memoria"],
+            al_medir=self._informar,
+        )
+
+        salida = options["salida"] or os.path.join(
+            "benchmarks", f"{informe['commit'] or 'sin-commit'}_{options['tamano']}.json"
+        )
+        guardar(informe, salida)
+        self.stdout.write(self.style.SUCCESS(f"Resultados guardados en {salida}"))
+
+        if options["comparar"]:
+            with open(options["comparar"], encoding="utf-8") as f:
+                anterior = json.load(f)
+            self.stdout.write("")
+            self.stdout.write(f"Comparación con {anterior.get('commit') or options['comparar']}:")
+            for nombre, antes, ahora, variacion in comparar(anterior, informe):
+                estilo = self.style.SUCCESS if variacion >= 0 else self.style.WARNING
+                self.stdout.write(estilo(
+                    f"  {nombre:<44} {antes:>10,} -> {ahora:>10,} filas/s ({variacion:+.1f}%)"
+                ))
+
+    def _informar(self, r):
+        memoria = f"{r['memoria_pico_kb']:>8,} KB" if r["memoria_pico_kb"] is not None else ""
+        self.stdout.write(
+            f"  {r['nombre']:<44} {r['filas']:>9} filas  {r['segundos']:>8.2f} s  "
+            f"{r['filas_por_segundo'] or 0:>9,} filas/s  {r['consultas']:>6} consultas  {memoria}"
+        )
@@ -0,0 +1,67 @@
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+
+from nuapp.carga_lote import clasificar_archivo, ejecutar_lote, expandir_zip
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga varios CSV (o ZIP de CSV) en paralelo. Los instrumentos de "
+        "cada mercado se cargan a la vez; las calificaciones, al terminar "
+        "los instrumentos. El tipo y el mercado se deducen del nombre: "
+        "instrumentos_CL.csv, instrumentos_PE.csv, calificaciones_*.csv."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("archivos", nargs="+", help="Archivos .csv o .zip")
+        parser.add_argument(
+            "--procesos",
+            type=int,
+            default=None,
+            help="Procesos en paralelo (por defecto, uno por núcleo).",
+        )
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory(prefix="nuam-lote-") as tmp:
+            rutas = []
+            for ruta in options["archivos"]:
+                if ruta.lower().endswith(".zip"):
+                    rutas.extend(expandir_zip(ruta, tmp))
+                else:
+                    rutas.append(ruta)
+
+            archivos = []
+            for ruta in rutas:
+                try:
+                    tipo, mercado = clasificar_archivo(ruta)
+                except ValueError as exc:
+                    raise CommandError(str(exc))
+                archivos.append((tipo, ruta, mercado))
+
+            if not archivos:
+                raise CommandError("No se encontraron archivos CSV para cargar.")
+
+            resultados, total = ejecutar_lote(
+                archivos, procesos=options["procesos"], al_terminar=self._informar
+            )
+
+        filas = sum(r["filas"] for r in resultados)
+        fallidos = [r for r in resultados if not r["ok"]]
+
+        self.stdout.write("")
+        self.stdout.write(
+            f"{len(resultados)} archivo(s), {filas} filas en {total:.1f} s "
+            f"({filas / total if total else 0:,.0f} filas/s)"
+        )
+        if fallidos:
+            raise CommandError(f"{len(fallidos)} archivo(s) con error.")
+
+    def _informar(self, r):
+        velocidad = r["filas"] / r["segundos"] if r["segundos"] else 0
+        estilo = self.style.SUCCESS if r["ok"] else self.style.ERROR
+        self.stdout.write(estilo(
+            f"{r['archivo']:<30} {r['tipo']:<14} {r['mercado'] or '-':<3} "
+            f"{r['filas']:>10} filas  {r['segundos']:>7.1f} s  {velocidad:>10,.0f} filas/s"
+        ))
+        self.stdout.write(f"    {r['mensaje']}")
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from nuapp.datos_sinteticos import TAMANOS, escribir_archivos
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera CSV sintéticos de instrumentos (uno por mercado) y "
+        "calificaciones, con el formato de la carga masiva."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("directorio", help="Carpeta donde se escriben los CSV.")
+        parser.add_argument(
+            "--tamano",
+            choices=sorted(TAMANOS),
+            default="10k",
+            help="Tamaño predefinido (filas de calificaciones).",
+        )
+        parser.add_argument("--instrumentos", type=int, help="Sobrescribe el n.º de instrumentos.")
+        parser.add_argument("--calificaciones", type=int, help="Sobrescribe el n.º de calificaciones.")
+        parser.add_argument("--semilla", type=int, default=42)
+
+    def handle(self, *args, **options):
+        n_instr, n_calif = TAMANOS[options["tamano"]]
+        n_instr = options["instrumentos"] if options["instrumentos"] is not None else n_instr
+        n_calif = options["calificaciones"] if options["calificaciones"] is not None else n_calif
+
+        if n_instr <= 0:
+            raise CommandError("Se necesita al menos un instrumento.")
+
+        rutas = escribir_archivos(
+            options["directorio"], n_instr, n_calif, semilla=options["semilla"]
+        )
+        for ruta in rutas:
+            self.stdout.write(ruta)
+        self.stdout.write(self.style.SUCCESS(
+            f"{n_instr} instrumentos y {n_calif} calificaciones generados."
+        ))
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from nuapp.models import TrabajoCarga
+from nuapp.trabajos import ejecutar_trabajo
+
+
+class Command(BaseCommand):
+    help = "Procesa los trabajos de carga masiva pendientes."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--reanudar",
+            action="store_true",
+            help=(
+                "Retoma desde su checkpoint los trabajos que quedaron a medias "
+                "(PROCESANDO o ERROR). Usar solo sin otros workers activos."
+            ),
+        )
+        parser.add_argument(
+            "--continuo",
+            action="store_true",
+            help="Sigue esperando trabajos nuevos en vez de terminar.",
+        )
+        parser.add_argument(
+            "--intervalo",
+            type=float,
+            default=2.0,
+            help="Segundos entre revisiones en modo continuo.",
+        )
+
+    def handle(self, *args, **options):
+        if options["reanudar"]:
+            interrumpidos = (
+                TrabajoCarga.objects
+                .filter(estado__in=["PROCESANDO", "ERROR"])
+                .exclude(archivo="")
+                .order_by("creado_en")
+                .values_list("id", flat=True)
+            )
+            for trabajo_id in interrumpidos:
+                self.stdout.write(f"Retomando trabajo {trabajo_id}...")
+                ejecutar_trabajo(trabajo_id, reanudar=True)
+                self._informar(trabajo_id)
+
+        while True:
+            pendientes = list(
+                TrabajoCarga.objects
+                .filter(estado="PENDIENTE")
+                .order_by("creado_en")
+                .values_list("id", flat=True)
+            )
+
+            for trabajo_id in pendientes:
+                self.stdout.write(f"Procesando trabajo {trabajo_id}...")
+                ejecutar_trabajo(trabajo_id)
+                self._informar(trabajo_id)
+
+            if not options["continuo"]:
+                break
+            time.sleep(options["intervalo"])
+
+    def _informar(self, trabajo_id):
+        trabajo = TrabajoCarga.objects.get(id=trabajo_id)
+        self.stdout.write(f"  {trabajo.get_estado_display()}: {trabajo.mensaje}")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from nuapp.estadisticas import reconstruir_estadisticas
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula las estadísticas por mercado (EstadisticaMercado) y los "
+        "resúmenes por periodo (ResumenPeriodo) desde las tablas de "
+        "instrumentos y calificaciones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--verificar",
+            action="store_true",
+            help="Solo compara con lo guardado y falla si hay diferencias; no escribe.",
+        )
+
+    def handle(self, *args, **options):
+        diferencias = reconstruir_estadisticas(solo_verificar=options["verificar"])
+        for clave in diferencias:
+            self.stdout.write("  " + " ".join(map(str, clave)))
+
+        if options["verificar"]:
+            if diferencias:
+                raise CommandError(
+                    f"{len(diferencias)} combinación(es) no coinciden con las tablas."
+                )
+            self.stdout.write(self.style.SUCCESS("Las estadísticas están al día."))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Estadísticas reconstruidas ({len(diferencias)} combinación(es) corregidas)."
+        ))
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrabajoCarga',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('INSTRUMENTOS', 'Instrumentos'), ('CALIFICACIONES', 'Calificaciones')], max_length=20)),
+                ('mercado', models.CharField(blank=True, choices=[('CL', 'Chile'), ('PE', 'Perú'), ('CO', 'Colombia')], max_length=5)),
+                ('archivo', models.FileField(upload_to='cargas/%Y/%m/')),
+                ('nombre_archivo', models.CharField(blank=True, max_length=255)),
+                ('estado', models.CharField(choices=[('PENDIENTE', 'Pendiente'), ('PROCESANDO', 'Procesando'), ('COMPLETADO', 'Completado'), ('ERROR', 'Error')], default='PENDIENTE', max_length=12)),
+                ('filas_procesadas', models.PositiveIntegerField(default=0)),
+                ('filas_rechazadas', models.PositiveIntegerField(default=0)),
+                ('rechazos', models.JSONField(blank=True, default=list)),
+                ('mensaje', models.TextField(blank=True)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('iniciado_en', models.DateTimeField(blank=True, null=True)),
+                ('finalizado_en', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-creado_en'],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0002_trabajocarga'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajocarga',
+            name='checkpoint',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
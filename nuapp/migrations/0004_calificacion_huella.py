@@ -0,0 +1,63 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:20
+
+import hashlib
+from decimal import Decimal, InvalidOperation
+
+from django.db import migrations, models
+
+
+# Copia de nuapp.models.huella_calificacion al momento de esta migración,
+# para que siga produciendo las mismas huellas aunque el modelo cambie.
+def huella_calificacion(instrumento_id, tipo, estado, fecha, monto):
+    if monto in (None, ""):
+        monto = ""
+    else:
+        try:
+            monto = str(Decimal(str(monto)).quantize(Decimal("0.01")))
+        except InvalidOperation:
+            monto = str(monto).strip()
+
+    fecha = fecha.isoformat() if hasattr(fecha, "isoformat") else (fecha or "")
+
+    partes = [str(instrumento_id), tipo or "", estado or "", fecha, monto]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
+def calcular_huellas(apps, schema_editor):
+    Calificacion = apps.get_model("nuapp", "Calificacion")
+
+    while True:
+        lote = list(
+            Calificacion.objects
+            .filter(huella="")
+            .only("id", "instrumento_id", "tipo", "estado", "fecha", "monto")
+            .order_by("id")[:2000]
+        )
+        if not lote:
+            break
+
+        for c in lote:
+            c.huella = huella_calificacion(c.instrumento_id, c.tipo, c.estado, c.fecha, c.monto)
+        Calificacion.objects.bulk_update(lote, ["huella"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0003_trabajocarga_checkpoint'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='calificacion',
+            name='huella',
+            field=models.CharField(db_index=True, default='', editable=False, max_length=64),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='trabajocarga',
+            name='omitir_duplicados',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(calcular_huellas, migrations.RunPython.noop),
+    ]
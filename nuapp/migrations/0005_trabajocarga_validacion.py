@@ -0,0 +1,23 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0004_calificacion_huella'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajocarga',
+            name='archivo_rechazos',
+            field=models.FileField(blank=True, upload_to='rechazos/'),
+        ),
+        migrations.AddField(
+            model_name='trabajocarga',
+            name='solo_validar',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,70 @@
+from django.db import migrations
+
+
+# Tabla FTS5 de contenido externo sobre nuapp_instrumento: guarda solo el
+# índice trigram y lee código y nombre de la tabla original. Los triggers
+# la mantienen sincronizada con cualquier INSERT, UPDATE (incluido el
+# ON CONFLICT DO UPDATE de las cargas) y DELETE.
+#
+# Ojo: si una migración futura obliga a SQLite a reconstruir
+# nuapp_instrumento, los triggers se pierden y hay que volver a crearlos.
+CREAR = [
+    """
+    CREATE VIRTUAL TABLE nuapp_instrumento_busqueda USING fts5(
+        codigo, nombre,
+        content='nuapp_instrumento', content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER nuapp_instrumento_busqueda_ai AFTER INSERT ON nuapp_instrumento BEGIN
+        INSERT INTO nuapp_instrumento_busqueda(rowid, codigo, nombre)
+        VALUES (new.id, new.codigo, new.nombre);
+    END
+    """,
+    """
+    CREATE TRIGGER nuapp_instrumento_busqueda_ad AFTER DELETE ON nuapp_instrumento BEGIN
+        INSERT INTO nuapp_instrumento_busqueda(nuapp_instrumento_busqueda, rowid, codigo, nombre)
+        VALUES ('delete', old.id, old.codigo, old.nombre);
+    END
+    """,
+    """
+    CREATE TRIGGER nuapp_instrumento_busqueda_au
+    AFTER UPDATE OF codigo, nombre ON nuapp_instrumento BEGIN
+        INSERT INTO nuapp_instrumento_busqueda(nuapp_instrumento_busqueda, rowid, codigo, nombre)
+        VALUES ('delete', old.id, old.codigo, old.nombre);
+        INSERT INTO nuapp_instrumento_busqueda(rowid, codigo, nombre)
+        VALUES (new.id, new.codigo, new.nombre);
+    END
+    """,
+    # Indexa los instrumentos que ya existen
+    "INSERT INTO nuapp_instrumento_busqueda(nuapp_instrumento_busqueda) VALUES ('rebuild')",
+]
+
+ELIMINAR = [
+    "DROP TRIGGER IF EXISTS nuapp_instrumento_busqueda_ai",
+    "DROP TRIGGER IF EXISTS nuapp_instrumento_busqueda_ad",
+    "DROP TRIGGER IF EXISTS nuapp_instrumento_busqueda_au",
+    "DROP TABLE IF EXISTS nuapp_instrumento_busqueda",
+]
+
+
+def _ejecutar(sentencias):
+    def operacion(apps, schema_editor):
+        # En otras bases de datos la búsqueda usa icontains (ver nuapp/busqueda.py)
+        if schema_editor.connection.vendor != "sqlite":
+            return
+        for sql in sentencias:
+            schema_editor.execute(sql)
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0005_trabajocarga_validacion'),
+    ]
+
+    operations = [
+        migrations.RunPython(_ejecutar(CREAR), _ejecutar(ELIMINAR)),
+    ]
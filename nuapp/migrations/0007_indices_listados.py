@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0006_busqueda_instrumentos'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='calificacion',
+            index=models.Index(fields=['-fecha', 'id'], name='calif_fecha_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacion',
+            index=models.Index(fields=['tipo', '-fecha', 'id'], name='calif_tipo_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacion',
+            index=models.Index(fields=['estado', '-fecha', 'id'], name='calif_estado_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='calificacion',
+            index=models.Index(fields=['instrumento', '-fecha', 'id'], name='calif_instr_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumento',
+            index=models.Index(fields=['mercado', 'codigo'], name='instr_mercado_codigo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumento',
+            index=models.Index(fields=['tipo', 'codigo'], name='instr_tipo_codigo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='instrumento',
+            index=models.Index(fields=['estado', 'codigo'], name='instr_estado_codigo_idx'),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:00
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def llenar_estadisticas(apps, schema_editor):
+    # Misma agrupación que estadisticas.calcular_estadisticas(), con los
+    # modelos históricos.
+    Instrumento = apps.get_model("nuapp", "Instrumento")
+    Calificacion = apps.get_model("nuapp", "Calificacion")
+    EstadisticaMercado = apps.get_model("nuapp", "EstadisticaMercado")
+
+    filas = [
+        EstadisticaMercado(
+            modelo="INSTRUMENTOS", mercado=mercado, tipo=tipo, estado=estado, cantidad=n,
+        )
+        for tipo, estado, mercado, n in (
+            Instrumento.objects.order_by()
+            .values_list("tipo", "estado", "mercado")
+            .annotate(n=Count("id"))
+        )
+    ]
+    for tipo, estado, mercado, n, monto in (
+        Calificacion.objects.order_by()
+        .values_list("tipo", "estado", "instrumento__mercado")
+        .annotate(n=Count("id"), monto=Sum("monto"))
+    ):
+        filas.append(EstadisticaMercado(
+            modelo="CALIFICACIONES", mercado=mercado, tipo=tipo, estado=estado, cantidad=n,
+            monto_centavos=int(Decimal(monto or 0).quantize(Decimal("0.01")) * 100),
+        ))
+    EstadisticaMercado.objects.bulk_create(filas)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0007_indices_listados'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticaMercado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('INSTRUMENTOS', 'Instrumentos'), ('CALIFICACIONES', 'Calificaciones')], max_length=20)),
+                ('mercado', models.CharField(max_length=5)),
+                ('tipo', models.CharField(max_length=20)),
+                ('estado', models.CharField(max_length=10)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('monto_centavos', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('modelo', 'mercado', 'tipo', 'estado'), name='estadistica_mercado_unica')],
+            },
+        ),
+        migrations.RunPython(llenar_estadisticas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:05
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def llenar_resumenes(apps, schema_editor):
+    # Misma agrupación que estadisticas.calcular_periodos(), con los
+    # modelos históricos.
+    Calificacion = apps.get_model("nuapp", "Calificacion")
+    ResumenPeriodo = apps.get_model("nuapp", "ResumenPeriodo")
+
+    periodos = defaultdict(lambda: [0, 0])
+    for fecha, mercado, tipo, estado, n, monto in (
+        Calificacion.objects.order_by()
+        .values_list("fecha", "instrumento__mercado", "tipo", "estado")
+        .annotate(n=Count("id"), monto=Sum("monto"))
+    ):
+        monto = int(Decimal(monto or 0).quantize(Decimal("0.01")) * 100)
+        for clave in (("DIA", fecha), ("MES", fecha.replace(day=1))):
+            periodo = periodos[(*clave, mercado, tipo, estado)]
+            periodo[0] += n
+            periodo[1] += monto
+
+    ResumenPeriodo.objects.bulk_create(
+        (
+            ResumenPeriodo(
+                granularidad=granularidad, periodo=periodo, mercado=mercado,
+                tipo=tipo, estado=estado, cantidad=cantidad, monto_centavos=monto,
+            )
+            for (granularidad, periodo, mercado, tipo, estado), (cantidad, monto)
+            in periodos.items()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('nuapp', '0008_estadisticas_mercado'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenPeriodo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularidad', models.CharField(choices=[('DIA', 'Día'), ('MES', 'Mes')], max_length=3)),
+                ('periodo', models.DateField()),
+                ('mercado', models.CharField(max_length=5)),
+                ('tipo', models.CharField(max_length=20)),
+                ('estado', models.CharField(max_length=10)),
+                ('cantidad', models.BigIntegerField(default=0)),
+                ('monto_centavos', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('granularidad', 'periodo', 'mercado', 'tipo', 'estado'), name='resumen_periodo_unico')],
+            },
+        ),
+        migrations.RunPython(llenar_resumenes, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,9 @@
+import hashlib
+from decimal import Decimal, InvalidOperation
+
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 # =========================
 # PERSONA
@@ -63,6 +67,13 @@ class Instrumento(models.Model):
 
     class Meta:
         ordering = ["codigo"]
+        # Filtros del listado (con su orden por código), conteos por
+        # mercado del dashboard y agrupaciones de reportes.
+        indexes = [
+            models.Index(fields=["mercado", "codigo"], name="instr_mercado_codigo_idx"),
+            models.Index(fields=["tipo", "codigo"], name="instr_tipo_codigo_idx"),
+            models.Index(fields=["estado", "codigo"], name="instr_estado_codigo_idx"),
+        ]
 
     def __str__(self):
         return f"{self.codigo} - {self.nombre}"
@@ -71,6 +82,26 @@ class Instrumento(models.Model):
 # =========================
 # CALIFICACION
 # =========================
+def huella_calificacion(instrumento_id, tipo, estado, fecha, monto):
+    """
+    Huella determinística de una calificación: dos filas con el mismo
+    instrumento, tipo, estado, fecha y monto producen la misma huella,
+    sin importar cómo venían escritos la fecha o el monto.
+    """
+    if monto in (None, ""):
+        monto = ""
+    else:
+        try:
+            monto = str(Decimal(str(monto)).quantize(Decimal("0.01")))
+        except InvalidOperation:
+            monto = str(monto).strip()
+
+    fecha = fecha.isoformat() if hasattr(fecha, "isoformat") else (fecha or "")
+
+    partes = [str(instrumento_id), tipo or "", estado or "", fecha, monto]
+    return hashlib.sha256("|".join(partes).encode("utf-8")).hexdigest()
+
+
 class Calificacion(models.Model):
     TIPO_CHOICES = [
         ("RIESGO", "Riesgo"),
@@ -94,10 +125,167 @@ class Calificacion(models.Model):
     fecha = models.DateField()
     monto = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True)
 
+    # Ver huella_calificacion(); permite detectar filas repetidas al recargar
+    huella = models.CharField(max_length=64, db_index=True, editable=False)
+
     creado_en = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         ordering = ["-fecha"]
+        # Listado ordenado por (-fecha, id) con sus filtros, rangos de
+        # fecha y calificaciones de un instrumento en su detalle.
+        indexes = [
+            models.Index(fields=["-fecha", "id"], name="calif_fecha_id_idx"),
+            models.Index(fields=["tipo", "-fecha", "id"], name="calif_tipo_fecha_idx"),
+            models.Index(fields=["estado", "-fecha", "id"], name="calif_estado_fecha_idx"),
+            models.Index(fields=["instrumento", "-fecha", "id"], name="calif_instr_fecha_idx"),
+        ]
 
     def __str__(self):
         return f"{self.instrumento.codigo} - {self.tipo} ({self.fecha})"
+
+    def calcular_huella(self):
+        return huella_calificacion(
+            self.instrumento_id, self.tipo, self.estado, self.fecha, self.monto
+        )
+
+    def save(self, *args, **kwargs):
+        self.huella = self.calcular_huella()
+        super().save(*args, **kwargs)
+
+
+# =========================
+# ESTADÍSTICAS POR MERCADO
+# =========================
+class EstadisticaMercado(models.Model):
+    """
+    Cantidad y suma de monto de instrumentos o calificaciones por
+    mercado, tipo y estado. Se mantiene al día de forma incremental
+    (ver nuapp/estadisticas.py), así que dashboard y reportes no
+    recorren las tablas.
+    """
+    MODELO_CHOICES = [
+        ("INSTRUMENTOS", "Instrumentos"),
+        ("CALIFICACIONES", "Calificaciones"),
+    ]
+
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    mercado = models.CharField(max_length=5)
+    tipo = models.CharField(max_length=20)
+    estado = models.CharField(max_length=10)
+
+    cantidad = models.BigIntegerField(default=0)
+    # En centavos: los incrementos sobre un entero son exactos
+    monto_centavos = models.BigIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["modelo", "mercado", "tipo", "estado"],
+                name="estadistica_mercado_unica",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.mercado}/{self.tipo}/{self.estado}: {self.cantidad}"
+
+    @property
+    def monto(self):
+        return Decimal(self.monto_centavos) / 100
+
+
+# =========================
+# RESÚMENES POR PERIODO
+# =========================
+class ResumenPeriodo(models.Model):
+    """
+    Cantidad y suma de monto de calificaciones por día o por mes de su
+    fecha, mercado del instrumento, tipo y estado. Se mantiene igual que
+    EstadisticaMercado y responde las tendencias sin leer calificaciones.
+    """
+    GRANULARIDAD_CHOICES = [
+        ("DIA", "Día"),
+        ("MES", "Mes"),
+    ]
+
+    granularidad = models.CharField(max_length=3, choices=GRANULARIDAD_CHOICES)
+    # Primer día del periodo
+    periodo = models.DateField()
+    mercado = models.CharField(max_length=5)
+    tipo = models.CharField(max_length=20)
+    estado = models.CharField(max_length=10)
+
+    cantidad = models.BigIntegerField(default=0)
+    monto_centavos = models.BigIntegerField(default=0)
+
+    class Meta:
+        # La restricción empieza por (granularidad, periodo): es también el
+        # índice de las consultas por rango de fechas.
+        constraints = [
+            models.UniqueConstraint(
+                fields=["granularidad", "periodo", "mercado", "tipo", "estado"],
+                name="resumen_periodo_unico",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.granularidad} {self.periodo} {self.mercado}/{self.tipo}/{self.estado}: {self.cantidad}"
+
+    @property
+    def monto(self):
+        return Decimal(self.monto_centavos) / 100
+
+
+# =========================
+# TRABAJO DE CARGA MASIVA
+# =========================
+class TrabajoCarga(models.Model):
+    TIPO_CHOICES = [
+        ("INSTRUMENTOS", "Instrumentos"),
+        ("CALIFICACIONES", "Calificaciones"),
+    ]
+
+    ESTADO_CHOICES = [
+        ("PENDIENTE", "Pendiente"),
+        ("PROCESANDO", "Procesando"),
+        ("COMPLETADO", "Completado"),
+        ("ERROR", "Error"),
+    ]
+
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    mercado = models.CharField(max_length=5, choices=Instrumento.MERCADO_CHOICES, blank=True)
+    archivo = models.FileField(upload_to="cargas/%Y/%m/")
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    omitir_duplicados = models.BooleanField(default=False)
+    solo_validar = models.BooleanField(default=False)
+
+    estado = models.CharField(max_length=12, choices=ESTADO_CHOICES, default="PENDIENTE")
+    filas_procesadas = models.PositiveIntegerField(default=0)
+    filas_rechazadas = models.PositiveIntegerField(default=0)
+    rechazos = models.JSONField(default=list, blank=True)
+    archivo_rechazos = models.FileField(upload_to="rechazos/", blank=True)
+    mensaje = models.TextField(blank=True)
+
+    # Posición del último lote confirmado, para retomar la carga
+    checkpoint = models.JSONField(default=dict, blank=True)
+
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ["-creado_en"]
+
+    def __str__(self):
+        return f"{self.tipo} #{self.id} ({self.estado})"
+
+    @property
+    def terminado(self):
+        return self.estado in ("COMPLETADO", "ERROR")
+
+    @property
+    def duracion(self):
+        if not self.iniciado_en:
+            return None
+        return (self.finalizado_en or timezone.now()) - self.iniciado_en
@@ -0,0 +1,192 @@
+import base64
+import binascii
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from .cache_exportaciones import clave_exportacion
+from .versionado import version_datos
+
+
+# =========================================================
+#   PAGINACIÓN POR CURSOR (KEYSET)
+# =========================================================
+# En vez de OFFSET, cada página pide las filas que vienen después (o
+# antes) de la última clave vista, así que cualquier página cuesta lo
+# mismo que la primera. ``orden`` es una lista de (campo, descendente)
+# cuyo último campo debe ser único, p. ej. [("fecha", True), ("id", False)].
+def codificar_cursor(direccion, valores):
+    datos = json.dumps([direccion, valores], cls=DjangoJSONEncoder, separators=(",", ":"))
+    return base64.urlsafe_b64encode(datos.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decodificar_cursor(cursor, n_campos):
+    """Devuelve (dirección, valores) o None si el cursor no es válido."""
+    try:
+        datos = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        direccion, valores = json.loads(datos)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+    if direccion not in ("despues", "antes") or not isinstance(valores, list):
+        return None
+    if len(valores) != n_campos:
+        return None
+    return direccion, valores
+
+
+def _valores_cursor(queryset, orden, valores):
+    """
+    Convierte los valores de un cursor al tipo de su campo (o anotación)
+    en ``queryset``; None si alguno no corresponde, para no llevar a la
+    consulta valores que la harían fallar.
+    """
+    anotaciones = queryset.query.annotations
+    convertidos = []
+    try:
+        for (nombre, _), valor in zip(orden, valores):
+            if valor is None or isinstance(valor, (dict, list)):
+                return None
+            if nombre in anotaciones:
+                campo = anotaciones[nombre].output_field
+            else:
+                campo = queryset.model._meta.get_field(nombre)
+            convertidos.append(campo.to_python(valor))
+    except (ValidationError, TypeError, ValueError):
+        return None
+    return convertidos
+
+
+def _despues_de(orden, valores, adelante):
+    """
+    (a, b) > (x, y) en el sentido del orden, como OR de prefijos iguales.
+    Se antepone la cota no estricta del primer campo (a >= x) para que
+    SQLite pueda buscar directamente en el índice en vez de recorrerlo
+    desde el principio.
+    """
+    condicion = Q()
+    for i, (campo, descendente) in enumerate(orden):
+        iguales = {c: v for (c, _), v in zip(orden[:i], valores[:i])}
+        lookup = "gt" if descendente != adelante else "lt"
+        condicion |= Q(**iguales, **{f"{campo}__{lookup}": valores[i]})
+
+    if len(orden) > 1:
+        campo, descendente = orden[0]
+        lookup = "gte" if descendente != adelante else "lte"
+        condicion = Q(**{f"{campo}__{lookup}": valores[0]}) & condicion
+    return condicion
+
+
+def _ordenar(queryset, orden, invertido=False):
+    campos = []
+    for campo, descendente in orden:
+        if descendente != invertido:
+            campos.append(f"-{campo}")
+        else:
+            campos.append(campo)
+    return queryset.order_by(*campos)
+
+
+class Pagina:
+    def __init__(self, objetos, cursor_anterior, cursor_siguiente, params):
+        self.objetos = objetos
+        self.cursor_anterior = cursor_anterior
+        self.cursor_siguiente = cursor_siguiente
+        self.url_anterior = url_con_cursor(params, cursor_anterior) if cursor_anterior else None
+        self.url_siguiente = url_con_cursor(params, cursor_siguiente) if cursor_siguiente else None
+
+    def __iter__(self):
+        return iter(self.objetos)
+
+    def __len__(self):
+        return len(self.objetos)
+
+
+def tamano_pagina(params):
+    """Filas por página: ?por_pagina= acotado a NUAM_LISTADO_MAX_POR_PAGINA."""
+    por_defecto = getattr(settings, "NUAM_LISTADO_POR_PAGINA", 50)
+    maximo = getattr(settings, "NUAM_LISTADO_MAX_POR_PAGINA", 500)
+    try:
+        tamano = int(params.get("por_pagina", por_defecto))
+    except (TypeError, ValueError):
+        tamano = por_defecto
+    return max(1, min(tamano, maximo))
+
+
+def paginar(queryset, orden, params, clave=None, estricto=False):
+    """
+    Devuelve la página de ``queryset`` indicada por ?cursor= en ``params``
+    (la primera si no hay cursor o no es válido; con ``estricto``, un
+    cursor inválido lanza ValueError), de tamano_pagina(params) filas.
+    Se lee una fila de más para saber si hay otra página sin hacer un
+    COUNT.
+
+    ``clave(fila)`` da los valores del orden de una fila; por defecto se
+    leen como atributos, así que hace falta para querysets de values_list().
+    """
+    cursor = params.get("cursor")
+    por_pagina = tamano_pagina(params)
+    estado = decodificar_cursor(cursor, len(orden)) if cursor else None
+    if estado is not None:
+        valores = _valores_cursor(queryset, orden, estado[1])
+        estado = (estado[0], valores) if valores is not None else None
+    if cursor and estado is None and estricto:
+        raise ValueError("cursor inválido")
+
+    if estado is None:
+        filas = list(_ordenar(queryset, orden)[:por_pagina + 1])
+        hay_mas, hay_antes = len(filas) > por_pagina, False
+        filas = filas[:por_pagina]
+    elif estado[0] == "despues":
+        filas = list(
+            _ordenar(queryset.filter(_despues_de(orden, estado[1], True)), orden)
+            [:por_pagina + 1]
+        )
+        hay_mas, hay_antes = len(filas) > por_pagina, True
+        filas = filas[:por_pagina]
+    else:
+        filas = list(
+            _ordenar(queryset.filter(_despues_de(orden, estado[1], False)), orden, invertido=True)
+            [:por_pagina + 1]
+        )
+        hay_mas, hay_antes = True, len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+
+    if clave is None:
+        def clave(objeto):
+            return [getattr(objeto, campo) for campo, _ in orden]
+
+    anterior = codificar_cursor("antes", clave(filas[0])) if filas and hay_antes else None
+    siguiente = codificar_cursor("despues", clave(filas[-1])) if filas and hay_mas else None
+    return Pagina(filas, anterior, siguiente, params)
+
+
+def url_con_cursor(params, cursor):
+    """Query string actual (filtros incluidos) con otro cursor."""
+    params = params.copy()
+    params["cursor"] = cursor
+    return f"?{params.urlencode()}"
+
+
+# =========================================================
+#   TOTALES EN CACHÉ
+# =========================================================
+def total_en_cache(nombre, queryset, params, parametros):
+    """
+    COUNT del listado filtrado, guardado en la caché de Django por
+    (listado, filtros, versión de los datos): se calcula una vez por
+    cada cambio en los datos. Con NUAM_LISTADO_CONTAR = False no se
+    cuenta y devuelve None.
+    """
+    if not getattr(settings, "NUAM_LISTADO_CONTAR", True):
+        return None
+
+    clave = "nuam:total:" + clave_exportacion(nombre, params, parametros, version_datos())
+    total = cache.get(clave)
+    if total is None:
+        total = queryset.count()
+        cache.set(clave, total, None)
+    return total
@@ -0,0 +1,233 @@
+import re
+import zlib
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, islice
+
+
+# =========================================================
+#   PÁGINA Y TIPOGRAFÍA
+# =========================================================
+ANCHO_PAGINA = 842  # A4 apaisado, en puntos
+ALTO_PAGINA = 595
+MARGEN = 36
+TAMANO_FUENTE = 8
+ALTO_FILA = 12
+RELLENO = 4
+INICIO_TABLA = ALTO_PAGINA - MARGEN - 40
+
+FILAS_POR_PAGINA = (INICIO_TABLA - ALTO_FILA - MARGEN) // ALTO_FILA
+
+# Anchos de Helvetica (1/1000 del tamaño de fuente) por byte cp1252.
+# Solo el rango ASCII es exacto; el resto usa el ancho de una letra común.
+_ANCHOS_ASCII = [
+    278, 278, 355, 556, 556, 889, 667, 191, 333, 333, 389, 584, 278, 333, 278, 278,
+    556, 556, 556, 556, 556, 556, 556, 556, 556, 556, 278, 278, 584, 584, 584, 556,
+    1015, 667, 667, 722, 722, 667, 611, 778, 722, 278, 500, 667, 556, 833, 722, 778,
+    667, 778, 722, 667, 611, 722, 667, 944, 667, 667, 611, 278, 278, 278, 469, 556,
+    333, 556, 556, 500, 556, 556, 278, 556, 556, 222, 222, 500, 222, 833, 556, 556,
+    556, 556, 333, 500, 278, 556, 500, 722, 500, 500, 500, 334, 260, 334, 584,
+]
+ANCHOS = [556] * 32 + _ANCHOS_ASCII + [556] * (256 - 32 - len(_ANCHOS_ASCII))
+ANCHOS[0x85] = 1000  # puntos suspensivos
+ANCHO_MAXIMO = max(ANCHOS)
+
+_ESPECIALES = re.compile(rb"[\\()\r\n]")
+_ESCAPES = {b"\\": b"\\\\", b"(": b"\\(", b")": b"\\)", b"\r": b" ", b"\n": b" "}
+
+
+# =========================================================
+#   TEXTO
+# =========================================================
+def _codificar(valor):
+    if valor is None:
+        return b""
+    if not isinstance(valor, str):
+        valor = str(valor)
+    return valor.encode("cp1252", errors="replace")
+
+
+def _ancho(datos, tamano=TAMANO_FUENTE):
+    return sum(map(ANCHOS.__getitem__, datos)) * tamano / 1000
+
+
+def _ajustar(datos, ancho_max, tamano=TAMANO_FUENTE):
+    """Recorta el texto con "…" para que quepa en ancho_max puntos."""
+    limite = ancho_max * 1000 / tamano
+    if len(datos) * ANCHO_MAXIMO <= limite:
+        return datos
+    acumulados = list(accumulate(map(ANCHOS.__getitem__, datos)))
+    if acumulados[-1] <= limite:
+        return datos
+    return datos[:bisect_right(acumulados, limite - ANCHOS[0x85])] + b"\x85"
+
+
+def _literal(datos):
+    if _ESPECIALES.search(datos) is None:
+        return datos
+    return _ESPECIALES.sub(lambda m: _ESCAPES[m.group()], datos)
+
+
+# =========================================================
+#   CONTENIDO DE UNA PÁGINA
+# =========================================================
+class _Diseno:
+    """Posiciones de columnas y filas, calculadas una vez por documento."""
+
+    def __init__(self, columnas):
+        disponible = ANCHO_PAGINA - 2 * MARGEN
+        total = sum(peso for _, peso, _ in columnas)
+
+        self.encabezados = [_codificar(titulo) for titulo, _, _ in columnas]
+        self.columnas = []
+        x = MARGEN
+        for _, peso, alineacion in columnas:
+            ancho = disponible * peso / total
+            self.columnas.append((x, ancho - 2 * RELLENO, alineacion == "derecha"))
+            x += ancho
+
+        # Línea base de cada fila (la fila 0 es el encabezado)
+        self.bases = [
+            b"%.1f" % (INICIO_TABLA - (i + 1) * ALTO_FILA + 3.5)
+            for i in range(FILAS_POR_PAGINA + 1)
+        ]
+
+    def celda(self, datos, columna, base):
+        x, ancho, derecha = self.columnas[columna]
+        datos = _ajustar(datos, ancho)
+        if derecha:
+            x = x + RELLENO + ancho - _ancho(datos)
+        else:
+            x = x + RELLENO
+        return b"1 0 0 1 %.1f %s Tm (%s) Tj\n" % (x, base, _literal(datos))
+
+
+def _contenido_pagina(diseno, titulo, subtitulo, filas):
+    partes = []
+    ancho_tabla = ANCHO_PAGINA - 2 * MARGEN
+
+    # Fondos: encabezado oscuro y filas alternadas
+    partes.append(b"0.12 0.16 0.23 rg\n%d %d %d %d re f\n" % (
+        MARGEN, INICIO_TABLA - ALTO_FILA, ancho_tabla, ALTO_FILA,
+    ))
+    partes.append(b"0.95 0.96 0.98 rg\n")
+    for i in range(1, len(filas), 2):
+        partes.append(b"%d %d %d %d re\n" % (
+            MARGEN, INICIO_TABLA - (i + 2) * ALTO_FILA, ancho_tabla, ALTO_FILA,
+        ))
+    partes.append(b"f\n")
+
+    # Título y subtítulo
+    partes.append(b"BT\n0 g\n/F2 14 Tf\n1 0 0 1 %d %d Tm (%s) Tj\n" % (
+        MARGEN, ALTO_PAGINA - MARGEN - 14, _literal(_codificar(titulo)),
+    ))
+    partes.append(b"0.4 g\n/F1 %d Tf\n1 0 0 1 %d %d Tm (%s) Tj\n" % (
+        TAMANO_FUENTE, MARGEN, ALTO_PAGINA - MARGEN - 28, _literal(_codificar(subtitulo)),
+    ))
+
+    # Encabezado de la tabla
+    partes.append(b"1 g\n/F2 %d Tf\n" % TAMANO_FUENTE)
+    for columna, datos in enumerate(diseno.encabezados):
+        partes.append(diseno.celda(datos, columna, diseno.bases[0]))
+
+    # Filas
+    partes.append(b"0 g\n/F1 %d Tf\n" % TAMANO_FUENTE)
+    for i, fila in enumerate(filas, 1):
+        base = diseno.bases[i]
+        for columna, valor in enumerate(fila):
+            if valor is None or valor == "":
+                continue
+            partes.append(diseno.celda(_codificar(valor), columna, base))
+
+    if not filas:
+        partes.append(b"0.4 g\n1 0 0 1 %d %s Tm (Sin registros) Tj\n" % (
+            MARGEN + RELLENO, diseno.bases[1],
+        ))
+
+    partes.append(b"ET\n")
+    return b"".join(partes)
+
+
+def _en_paginas(filas):
+    """Agrupa las filas por página; siempre devuelve al menos una."""
+    filas = iter(filas)
+    bloque = list(islice(filas, FILAS_POR_PAGINA))
+    yield bloque
+    while True:
+        bloque = list(islice(filas, FILAS_POR_PAGINA))
+        if not bloque:
+            return
+        yield bloque
+
+
+# =========================================================
+#   DOCUMENTO
+# =========================================================
+class _Escritor:
+    """Lleva la posición de cada objeto para armar la tabla xref al final."""
+
+    def __init__(self):
+        self.posicion = 0
+        self.offsets = array("Q")
+
+    def crudo(self, datos):
+        self.posicion += len(datos)
+        return datos
+
+    def objeto(self, numero, cuerpo):
+        if numero >= len(self.offsets):
+            self.offsets.extend([0] * (numero + 1 - len(self.offsets)))
+        self.offsets[numero] = self.posicion
+        return self.crudo(b"%d 0 obj\n%s\nendobj\n" % (numero, cuerpo))
+
+    def flujo(self, numero, contenido):
+        comprimido = zlib.compress(contenido, 6)
+        return self.objeto(numero, b"<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream" % (
+            len(comprimido), comprimido,
+        ))
+
+
+def tabla_pdf(titulo, columnas, filas, subtitulo=""):
+    """
+    Genera un PDF con una tabla paginada, como bloques de bytes (uno por
+    página). ``columnas`` es una lista de (encabezado, peso, alineación)
+    y ``filas`` cualquier iterable de listas; se consume de a una página
+    y de lo ya escrito solo se guarda la posición de cada objeto.
+
+    Objetos fijos: 1 catálogo, 2 árbol de páginas (se escribe al final,
+    cuando se conocen todas), 3 y 4 fuentes. Desde el 5, cada página usa
+    dos objetos: su contenido y la página.
+    """
+    diseno = _Diseno(columnas)
+    escritor = _Escritor()
+
+    yield escritor.crudo(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+    yield escritor.objeto(
+        3, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica /Encoding /WinAnsiEncoding >>"
+    )
+    yield escritor.objeto(
+        4, b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica-Bold /Encoding /WinAnsiEncoding >>"
+    )
+
+    n_paginas = 0
+    numero = 5
+    for n_pagina, bloque in enumerate(_en_paginas(filas), 1):
+        texto = f"{subtitulo} · Página {n_pagina}" if subtitulo else f"Página {n_pagina}"
+        yield escritor.flujo(numero, _contenido_pagina(diseno, titulo, texto, bloque))
+        yield escritor.objeto(numero + 1, (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %d %d] "
+            b"/Resources << /Font << /F1 3 0 R /F2 4 0 R >> >> /Contents %d 0 R >>"
+        ) % (ANCHO_PAGINA, ALTO_PAGINA, numero))
+        n_paginas = n_pagina
+        numero += 2
+
+    hijos = b" ".join(b"%d 0 R" % p for p in range(6, numero, 2))
+    yield escritor.objeto(2, b"<< /Type /Pages /Kids [%s] /Count %d >>" % (hijos, n_paginas))
+    yield escritor.objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+    inicio_xref = escritor.posicion
+    yield b"xref\n0 %d\n0000000000 65535 f \n" % numero
+    for desde in range(1, numero, 1000):
+        hasta = min(desde + 1000, numero)
+        yield b"".join(b"%010d 00000 n \n" % escritor.offsets[i] for i in range(desde, hasta))
+    yield b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (numero, inicio_xref)
@@ -0,0 +1,74 @@
+from collections import Counter
+from decimal import Decimal
+
+from .estadisticas import grupos_guardados
+from .models import Instrumento
+
+
+# =========================================================
+#   REPORTES (DESDE LAS ESTADÍSTICAS POR MERCADO)
+# =========================================================
+# Los grupos (tipo, estado, mercado) de cada modelo se leen de
+# EstadisticaMercado, que se mantiene al día en cada escritura; son unas
+# pocas decenas de filas y todos los desgloses del reporte salen de
+# sumarlas en Python, sin recorrer instrumentos ni calificaciones.
+ESTADO_ACTIVA = "ACTIVA"
+
+# SQLite suma los DecimalField en coma flotante; cada grupo se redondea
+# a los decimales del campo antes de acumular, para que los totales
+# cuadren al centavo.
+CENTAVOS = Decimal("0.01")
+
+
+def _desglose(conteos, campo):
+    """Lista de {campo: valor, "total": n} ordenada por valor, como values().annotate()."""
+    return [{campo: valor, "total": n} for valor, n in sorted(conteos.items()) if n]
+
+
+def armar_reporte(instrumentos, calificaciones):
+    """Contexto de reportes.html a partir de los grupos de cada modelo."""
+    inst_tipo, inst_estado, inst_mercado = Counter(), Counter(), Counter()
+    for tipo, estado, mercado, n in instrumentos:
+        inst_tipo[tipo] += n
+        inst_estado[estado] += n
+        inst_mercado[mercado] += n
+
+    cal_tipo, cal_estado = Counter(), Counter()
+    activas, monto_activo = Counter(), Counter()
+    monto_total = Decimal(0)
+    for tipo, estado, mercado, n, monto in calificaciones:
+        monto = Decimal(monto or 0).quantize(CENTAVOS)
+        cal_tipo[tipo] += n
+        cal_estado[estado] += n
+        monto_total += monto
+        if estado == ESTADO_ACTIVA:
+            activas[mercado] += n
+            monto_activo[mercado] += monto
+
+    return {
+        "total_instrumentos": sum(inst_tipo.values()),
+        "total_calificaciones": sum(cal_tipo.values()),
+
+        "instrumentos_por_tipo": _desglose(inst_tipo, "tipo"),
+        "instrumentos_por_estado": _desglose(inst_estado, "estado"),
+        "instrumentos_por_mercado": _desglose(inst_mercado, "mercado"),
+
+        "calificaciones_por_tipo": _desglose(cal_tipo, "tipo"),
+        "calificaciones_por_estado": _desglose(cal_estado, "estado"),
+        "monto_total_calificaciones": monto_total,
+
+        "paises": [
+            {
+                "mercado": codigo,
+                "mercado_label": nombre,
+                "instrumentos": inst_mercado[codigo],
+                "calificaciones_activas": activas[codigo],
+                "monto_activo": monto_activo[codigo],
+            }
+            for codigo, nombre in Instrumento.MERCADO_CHOICES
+        ],
+    }
+
+
+def reporte_general():
+    return armar_reporte(*grupos_guardados())
@@ -0,0 +1,111 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .estadisticas import CambiosEstadisticas
+from .models import Instrumento, Calificacion
+from .versionado import incrementar_version, incrementar_version_instrumentos
+
+
+# Las cargas masivas usan bulk_create, que no emite señales; ellas
+# incrementan la versión por su cuenta al confirmar cada lote.
+@receiver(post_save, sender=Instrumento)
+@receiver(post_delete, sender=Instrumento)
+@receiver(post_save, sender=Calificacion)
+@receiver(post_delete, sender=Calificacion)
+def datos_modificados(sender, **kwargs):
+    transaction.on_commit(incrementar_version)
+
+
+@receiver(post_save, sender=Instrumento)
+@receiver(post_delete, sender=Instrumento)
+def instrumentos_modificados(sender, **kwargs):
+    transaction.on_commit(incrementar_version_instrumentos)
+
+
+# =========================================================
+#   ESTADÍSTICAS POR MERCADO
+# =========================================================
+# Antes de guardar se leen los valores anteriores para restarlos de su
+# combinación (mercado, tipo, estado) y, en las calificaciones, de su día
+# y mes; las cargas masivas aplican sus cambios por lote en cargas.py.
+@receiver(pre_save, sender=Instrumento)
+def instrumento_previo(sender, instance, raw=False, **kwargs):
+    instance._estadistica_previa = None
+    if instance.pk and not raw:
+        instance._estadistica_previa = (
+            Instrumento.objects.filter(pk=instance.pk)
+            .values_list("mercado", "tipo", "estado").first()
+        )
+
+
+@receiver(post_save, sender=Instrumento)
+def instrumento_guardado(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cambios = CambiosEstadisticas()
+    previa = getattr(instance, "_estadistica_previa", None)
+    if previa:
+        cambios.instrumento(*previa, signo=-1)
+        # Sus calificaciones se cuentan en el mercado del instrumento
+        if previa[0] != instance.mercado:
+            cambios.mover_calificaciones(
+                Calificacion.objects.filter(instrumento=instance),
+                hacia=instance.mercado,
+                desde=previa[0],
+            )
+    cambios.instrumento(instance.mercado, instance.tipo, instance.estado)
+    cambios.aplicar()
+
+
+@receiver(pre_delete, sender=Instrumento)
+def instrumento_eliminado(sender, instance, **kwargs):
+    # Se descuentan aquí, de una vez, las calificaciones que se borran
+    # en cascada; calificacion_eliminada las ignora.
+    cambios = CambiosEstadisticas()
+    cambios.instrumento(instance.mercado, instance.tipo, instance.estado, signo=-1)
+    cambios.mover_calificaciones(Calificacion.objects.filter(instrumento=instance))
+    cambios.aplicar()
+
+
+@receiver(pre_save, sender=Calificacion)
+def calificacion_previa(sender, instance, raw=False, **kwargs):
+    instance._estadistica_previa = None
+    if instance.pk and not raw:
+        instance._estadistica_previa = (
+            Calificacion.objects.filter(pk=instance.pk)
+            .values_list("instrumento__mercado", "tipo", "estado", "monto", "fecha")
+            .first()
+        )
+
+
+@receiver(post_save, sender=Calificacion)
+def calificacion_guardada(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    cambios = CambiosEstadisticas()
+    previa = getattr(instance, "_estadistica_previa", None)
+    if previa:
+        cambios.calificacion(*previa, signo=-1)
+    # save() acepta fecha y monto como texto; aquí se necesitan convertidos
+    cambios.calificacion(
+        instance.instrumento.mercado, instance.tipo, instance.estado,
+        sender._meta.get_field("monto").to_python(instance.monto),
+        sender._meta.get_field("fecha").to_python(instance.fecha),
+    )
+    cambios.aplicar()
+
+
+@receiver(post_delete, sender=Calificacion)
+def calificacion_eliminada(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, Instrumento) or getattr(origin, "model", None) is Instrumento:
+        return
+    mercado = (
+        Instrumento.objects.filter(pk=instance.instrumento_id)
+        .values_list("mercado", flat=True).first()
+    )
+    cambios = CambiosEstadisticas()
+    cambios.calificacion(
+        mercado, instance.tipo, instance.estado, instance.monto, instance.fecha, signo=-1,
+    )
+    cambios.aplicar()
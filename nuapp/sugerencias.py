@@ -0,0 +1,103 @@
+import threading
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+
+from .models import Instrumento
+from .versionado import version_instrumentos
+
+
+# =========================================================
+#   SUGERENCIAS DE INSTRUMENTOS (TYPEAHEAD)
+# =========================================================
+# Cada proceso guarda en memoria los códigos y nombres en minúsculas,
+# ordenados, con el id de su instrumento al lado. Un prefijo se ubica con
+# bisect y se leen solo las primeras coincidencias, sin recorrer la
+# tabla de instrumentos. El índice se rehace cuando sube
+# version_instrumentos(): al guardar o borrar un instrumento o al
+# confirmar un lote de la carga masiva.
+class IndicePrefijos:
+    def __init__(self, filas):
+        """``filas``: tuplas (id, codigo, nombre)."""
+        codigos, nombres = [], []
+        for id_, codigo, nombre in filas:
+            codigos.append((codigo.casefold(), id_))
+            nombres.append((nombre.casefold(), id_))
+
+        codigos.sort()
+        nombres.sort()
+        # Claves e ids en listas paralelas: bisect compara solo strings y
+        # los ids ocupan 8 bytes cada uno.
+        self._claves = [[c for c, _ in codigos], [n for n, _ in nombres]]
+        self._ids = [array("q", (i for _, i in codigos)), array("q", (i for _, i in nombres))]
+
+    def __len__(self):
+        return len(self._ids[0])
+
+    def buscar(self, q, limite):
+        """
+        Ids de hasta ``limite`` instrumentos cuyo código o nombre empieza
+        por ``q``: primero los de código, luego los de nombre, cada grupo
+        en orden alfabético.
+        """
+        prefijo = q.strip().casefold()
+        if not prefijo:
+            return []
+
+        encontrados = {}
+        for claves, ids in zip(self._claves, self._ids):
+            i = bisect_left(claves, prefijo)
+            while i < len(claves) and claves[i].startswith(prefijo):
+                encontrados.setdefault(ids[i])
+                if len(encontrados) == limite:
+                    return list(encontrados)
+                i += 1
+        return list(encontrados)
+
+
+_indice = None
+_version = None
+_bloqueo = threading.Lock()
+
+
+def indice_instrumentos():
+    """El índice del proceso, rehecho si cambió el catálogo."""
+    global _indice, _version
+
+    # La versión se lee antes de armar el índice: si un instrumento cambia
+    # mientras tanto, la siguiente consulta lo vuelve a armar.
+    version = version_instrumentos()
+    if _indice is not None and _version == version:
+        return _indice
+
+    with _bloqueo:
+        if _indice is None or _version != version:
+            filas = (
+                Instrumento.objects
+                .values_list("id", "codigo", "nombre")
+                .iterator(chunk_size=getattr(settings, "NUAM_EXPORT_CHUNK_SIZE", 2000))
+            )
+            _indice = IndicePrefijos(filas)
+            _version = version
+        return _indice
+
+
+def sugerir_instrumentos(q, limite=None):
+    """
+    (id, codigo, nombre) de los instrumentos sugeridos para ``q``. El
+    índice solo guarda las claves; los datos de los pocos elegidos se
+    leen por clave primaria.
+    """
+    if limite is None:
+        limite = getattr(settings, "NUAM_SUGERENCIAS_LIMITE", 10)
+
+    ids = indice_instrumentos().buscar(q, limite)
+    if not ids:
+        return []
+
+    datos = {
+        fila[0]: fila
+        for fila in Instrumento.objects.filter(id__in=ids).values_list("id", "codigo", "nombre")
+    }
+    return [datos[id_] for id_ in ids if id_ in datos]
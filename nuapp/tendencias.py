@@ -0,0 +1,172 @@
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Q, Sum
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .estadisticas import DIA, MES
+from .models import Calificacion, Instrumento, ResumenPeriodo
+
+
+# =========================================================
+#   TENDENCIAS DE CALIFICACIONES
+# =========================================================
+# Se responden desde ResumenPeriodo, nunca desde las calificaciones. En
+# las series mensuales los meses completos del rango salen de las filas
+# MES y los meses de los extremos, si el rango los corta, de las filas
+# DIA; así cualquier rango de fechas lee a lo más unos cientos de filas
+# por combinación de mercado, tipo y estado.
+GRANULARIDADES = {"mes": MES, "dia": DIA}
+DIMENSIONES = ("mercado", "tipo", "estado")
+
+OPCIONES_FILTRO = {
+    "mercado": {c for c, _ in Instrumento.MERCADO_CHOICES},
+    "tipo": {c for c, _ in Calificacion.TIPO_CHOICES},
+    "estado": {c for c, _ in Calificacion.ESTADO_CHOICES},
+}
+
+
+def _mes_siguiente(fecha):
+    return (fecha.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def anio_anterior(fecha):
+    """La misma fecha un año antes (el 29 de febrero pasa a ser el 28)."""
+    try:
+        return fecha.replace(year=fecha.year - 1)
+    except ValueError:
+        return fecha.replace(year=fecha.year - 1, day=28)
+
+
+def _fecha(params, nombre):
+    valor = params.get(nombre, "")
+    if not valor:
+        return None
+    try:
+        fecha = parse_date(valor)
+    except ValueError:
+        fecha = None
+    if fecha is None:
+        raise ValueError(f"{nombre} debe tener el formato AAAA-MM-DD.")
+    return fecha
+
+
+def parametros_tendencia(params):
+    """
+    Lee desde, hasta, granularidad (mes o dia), por (mercado, tipo o
+    estado) y los filtros mercado, tipo y estado. Por defecto, los últimos
+    doce meses hasta hoy. Lanza ValueError si algún valor no es válido.
+    """
+    hasta = _fecha(params, "hasta") or timezone.localdate()
+    desde = _fecha(params, "desde") or anio_anterior(_mes_siguiente(hasta))
+    if desde > hasta:
+        raise ValueError("La fecha desde no puede ser posterior a hasta.")
+
+    granularidad = GRANULARIDADES.get(params.get("granularidad") or "mes")
+    if granularidad is None:
+        raise ValueError(f"granularidad debe ser una de: {', '.join(GRANULARIDADES)}.")
+
+    maximo = getattr(settings, "NUAM_TENDENCIAS_MAX_DIAS", 731)
+    if granularidad == DIA and (hasta - desde).days >= maximo:
+        raise ValueError(f"Por día se pueden pedir hasta {maximo} días.")
+
+    por = params.get("por") or None
+    if por is not None and por not in DIMENSIONES:
+        raise ValueError(f"por debe ser uno de: {', '.join(DIMENSIONES)}.")
+
+    filtros = {}
+    for campo, opciones in OPCIONES_FILTRO.items():
+        valor = params.get(campo, "")
+        if valor and valor not in opciones:
+            raise ValueError(f"valor inválido en {campo}: '{valor}'")
+        if valor:
+            filtros[campo] = valor
+
+    return {
+        "desde": desde,
+        "hasta": hasta,
+        "granularidad": granularidad,
+        "por": por,
+        "filtros": filtros,
+    }
+
+
+def _rangos(desde, hasta, granularidad):
+    """Condición sobre ResumenPeriodo que cubre [desde, hasta] sin contar dos veces."""
+    if granularidad == DIA:
+        return Q(granularidad=DIA, periodo__range=(desde, hasta))
+
+    primer_mes = desde if desde.day == 1 else _mes_siguiente(desde)
+    fin_meses = _mes_siguiente(hasta)
+    if fin_meses - timedelta(days=1) != hasta:
+        fin_meses = hasta.replace(day=1)
+
+    if primer_mes >= fin_meses:
+        return Q(granularidad=DIA, periodo__range=(desde, hasta))
+    return (
+        Q(granularidad=MES, periodo__gte=primer_mes, periodo__lt=fin_meses)
+        | Q(granularidad=DIA, periodo__gte=desde, periodo__lt=primer_mes)
+        | Q(granularidad=DIA, periodo__gte=fin_meses, periodo__lte=hasta)
+    )
+
+
+def tendencia(desde, hasta, granularidad=MES, por=None, filtros=None):
+    """
+    Serie de calificaciones entre ``desde`` y ``hasta`` (inclusive): dicts
+    {"periodo", [por], "cantidad", "monto"} ordenados por periodo, con un
+    periodo por mes (su primer día) o por día. Los periodos sin
+    calificaciones no aparecen.
+    """
+    columnas = ["periodo"] + ([por] if por else [])
+    filas = (
+        ResumenPeriodo.objects
+        .filter(_rangos(desde, hasta, granularidad), **(filtros or {}))
+        .order_by()
+        .values_list(*columnas)
+        .annotate(n=Sum("cantidad"), centavos=Sum("monto_centavos"))
+    )
+
+    # Las filas DIA de los extremos se suman a su mes
+    series = defaultdict(lambda: [0, 0])
+    for *clave, n, monto in filas:
+        if granularidad == MES:
+            clave[0] = clave[0].replace(day=1)
+        serie = series[tuple(clave)]
+        serie[0] += n
+        serie[1] += monto
+
+    return [
+        {
+            **dict(zip(columnas, clave)),
+            "cantidad": n,
+            "monto": Decimal(monto).scaleb(-2),
+        }
+        for clave, (n, monto) in sorted(series.items())
+        if n
+    ]
+
+
+def tendencia_interanual(desde, hasta, granularidad=MES, por=None, filtros=None):
+    """
+    tendencia() con el mismo rango un año antes al lado de cada periodo:
+    agrega "cantidad_anterior", "monto_anterior" y "variacion" (% de
+    cantidad, None si el año anterior no tuvo calificaciones).
+    """
+    actual = tendencia(desde, hasta, granularidad, por, filtros)
+    anterior = {
+        (fila["periodo"], fila.get(por)): fila
+        for fila in tendencia(
+            anio_anterior(desde), anio_anterior(hasta), granularidad, por, filtros
+        )
+    }
+
+    for fila in actual:
+        previa = anterior.get((anio_anterior(fila["periodo"]), fila.get(por)))
+        n = previa["cantidad"] if previa else 0
+        fila["cantidad_anterior"] = n
+        fila["monto_anterior"] = previa["monto"] if previa else Decimal(0)
+        fila["variacion"] = round((fila["cantidad"] - n) * 100 / n, 1) if n else None
+    return actual
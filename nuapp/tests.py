@@ -1,3 +1,1346 @@
-from django.test import TestCase
+import csv
+import gzip
+import hashlib
+import importlib
+import io
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import unittest
+import zipfile
+from unittest import mock
+from datetime import date, timedelta
+from decimal import Decimal
 
-# Create your tests here.
+try:
+    import pypdf
+except ImportError:  # Solo lo usan las pruebas de los PDF
+    pypdf = None
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .busqueda import TABLA_BUSQUEDA, filtrar_por_texto
+from .cargas import LectorCSV, RegistroRechazos, cargar_calificaciones_csv, cargar_instrumentos_csv
+from .estadisticas import reconstruir_estadisticas
+from .exportacion_mercados import zip_por_mercado
+from .exportaciones import gzip_en_bloques
+from .models import Instrumento, Calificacion, TrabajoCarga, huella_calificacion
+from .paginacion import codificar_cursor
+from .sugerencias import sugerir_instrumentos
+from .pdf import FILAS_POR_PAGINA, tabla_pdf
+from .trabajos import ejecutar_trabajo
+from .tendencias import tendencia
+from .versionado import incrementar_version, incrementar_version_instrumentos, version_datos
+
+
+# =========================================================
+#   PLANES DE CONSULTA
+# =========================================================
+# Ejecuta cada vista con datos de prueba, pasa sus consultas por
+# EXPLAIN QUERY PLAN y falla si alguna consulta caliente recorre una
+# tabla completa o, siendo paginada, ordena con un B-tree temporal.
+ESCANEO_COMPLETO = re.compile(r"\bSCAN (nuapp_\w+)$")
+ORDEN_TEMPORAL = "USE TEMP B-TREE FOR ORDER BY"
+
+
+class PlanesDeConsultaTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Las versiones de datos y la caché de exportaciones van a un temporal
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_VERSION_INSTRUMENTOS=f"{cls._tmp.name}/version_instrumentos",
+            NUAM_EXPORT_CACHE=False,
+            NUAM_CACHE_VISTAS=False,
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("planes", password="x")
+
+        mercados = [m for m, _ in Instrumento.MERCADO_CHOICES]
+        tipos = [t for t, _ in Instrumento.TIPO_CHOICES]
+        Instrumento.objects.bulk_create([
+            Instrumento(
+                codigo=f"INS-{mercados[i % 3]}-{i:04}",
+                nombre=f"Instrumento {i}",
+                tipo=tipos[i % len(tipos)],
+                mercado=mercados[i % 3],
+                estado="ACTIVO" if i % 5 else "INACTIVO",
+            )
+            for i in range(120)
+        ])
+
+        instrumentos = list(Instrumento.objects.all())
+        tipos_cal = [t for t, _ in Calificacion.TIPO_CHOICES]
+        calificaciones = []
+        for i in range(600):
+            c = Calificacion(
+                instrumento=instrumentos[i % len(instrumentos)],
+                tipo=tipos_cal[i % len(tipos_cal)],
+                estado="ACTIVA" if i % 4 else "INACTIVA",
+                fecha=date(2024, 1, 1) + timedelta(days=i % 90),
+                monto=Decimal(i),
+            )
+            c.huella = c.calcular_huella()
+            calificaciones.append(c)
+        Calificacion.objects.bulk_create(calificaciones)
+        # bulk_create no pasa por las señales
+        reconstruir_estadisticas()
+
+        cls.instrumento = instrumentos[0]
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    # -----------------------------------------------------
+    # Utilidades
+    # -----------------------------------------------------
+    def _consultas(self, url, data=None):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url, data)
+            if response.streaming:
+                for _ in response.streaming_content:
+                    pass
+        self.assertEqual(response.status_code, 200, url)
+        return [
+            q["sql"] for q in capturadas.captured_queries
+            if q["sql"].startswith("SELECT") and "nuapp_" in q["sql"]
+        ]
+
+    def _plan(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            return [fila[3] for fila in cursor.fetchall()]
+
+    def assertSinEscaneos(self, url, data=None):
+        consultas = self._consultas(url, data)
+        self.assertTrue(consultas, f"{url} no consultó tablas de nuapp")
+
+        for sql in consultas:
+            plan = self._plan(sql)
+            detalle = f"\n{sql}\n" + "\n".join(plan)
+
+            # Leer la tabla entera es inevitable en un total sin filtros
+            if " WHERE " in sql:
+                for paso in plan:
+                    self.assertIsNone(ESCANEO_COMPLETO.search(paso), detalle)
+
+            if " LIMIT " not in sql:
+                continue
+            recorridos = [
+                paso for paso in plan
+                if paso.startswith("SCAN nuapp_") and "VIRTUAL TABLE INDEX" not in paso
+            ]
+            # Una página no debe ordenar la tabla para quedarse con unas
+            # pocas filas: el orden temporal solo vale sobre filas que un
+            # índice ya acotó (búsqueda por texto, calificaciones de un mercado).
+            if ORDEN_TEMPORAL in plan:
+                self.assertEqual(recorridos, [], detalle)
+            # Con cursor, el índice se busca desde la última clave vista en
+            # vez de recorrerlo desde el principio.
+            if data and "cursor" in data:
+                self.assertEqual(recorridos, [], detalle)
+
+    def _siguiente(self, url, data, listado):
+        """Parámetros de la segunda página de ``listado`` (clave del contexto)."""
+        response = self.client.get(url, data)
+        pagina = response.context[listado]
+        self.assertIsNotNone(pagina.cursor_siguiente)
+        return {**data, "cursor": pagina.cursor_siguiente}
+
+    # -----------------------------------------------------
+    # Vistas
+    # -----------------------------------------------------
+    def test_dashboard(self):
+        self.assertSinEscaneos(reverse("dashboard"))
+
+    def test_listado_instrumentos(self):
+        url = reverse("instrumentos")
+        filtros = [
+            {},
+            {"mercado": "CL"},
+            {"tipo": "BONO"},
+            {"estado": "INACTIVO"},
+            {"q": "Instrumento 1"},
+        ]
+        for data in filtros:
+            data = {"por_pagina": 10, **data}
+            with self.subTest(data=data):
+                self.assertSinEscaneos(url, data)
+                self.assertSinEscaneos(url, self._siguiente(url, data, "instrumentos"))
+
+    def test_listado_calificaciones(self):
+        url = reverse("calificaciones")
+        filtros = [
+            {},
+            {"tipo": "CREDITO"},
+            {"estado": "INACTIVA"},
+            {"fecha_desde": "2024-02-01", "fecha_hasta": "2024-02-15"},
+            {"mercado": "PE"},
+        ]
+        for data in filtros:
+            data = {"por_pagina": 10, **data}
+            with self.subTest(data=data):
+                self.assertSinEscaneos(url, data)
+                self.assertSinEscaneos(url, self._siguiente(url, data, "calificaciones"))
+
+    def test_detalle_instrumento(self):
+        url = reverse("instrumento_detalle", args=[self.instrumento.id])
+        for data in ({}, {"tipo": "RIESGO"}, {"fecha_desde": "2024-01-02"}):
+            data = {"por_pagina": 1, **data}
+            with self.subTest(data=data):
+                self.assertSinEscaneos(url, data)
+                self.assertSinEscaneos(url, self._siguiente(url, data, "calificaciones"))
+
+    def test_cursor_invalido(self):
+        # Un cursor con valores que no calzan con el orden muestra la primera página
+        url = reverse("calificaciones")
+        primera = self.client.get(url, {"por_pagina": 10}).context["calificaciones"]
+        for valores in (["no-es-fecha", 1], [{"a": 1}, 1], ["2024-01-01", None], ["2024-01-01", "x"]):
+            with self.subTest(valores=valores):
+                response = self.client.get(
+                    url, {"por_pagina": 10, "cursor": codificar_cursor("despues", valores)}
+                )
+                self.assertEqual(response.status_code, 200)
+                pagina = response.context["calificaciones"]
+                self.assertEqual(
+                    [c.id for c in pagina.objetos], [c.id for c in primera.objetos]
+                )
+                self.assertIsNone(pagina.cursor_anterior)
+
+    def test_formulario_calificacion(self):
+        calificacion = Calificacion.objects.filter(instrumento=self.instrumento).first()
+        self.assertSinEscaneos(reverse("calificacion_editar", args=[calificacion.id]))
+        self.assertSinEscaneos(reverse("instrumento_sugerencias"), {"q": "ins-cl"})
+
+    def test_reportes(self):
+        self.assertSinEscaneos(reverse("reportes"))
+
+    def test_exportaciones_filtradas(self):
+        casos = [
+            ("exportar_instrumentos_csv", {"mercado": "CO"}),
+            ("exportar_instrumentos_csv", {"q": "Instrumento 7"}),
+            ("exportar_calificaciones_csv", {"tipo": "RIESGO"}),
+            ("exportar_calificaciones_csv", {"fecha_desde": "2024-03-01", "fecha_hasta": "2024-03-10"}),
+        ]
+        for nombre, data in casos:
+            with self.subTest(vista=nombre, data=data):
+                self.assertSinEscaneos(reverse(nombre), data)
+
+    def test_api(self):
+        casos = [
+            (reverse("api_instrumentos"), {"mercado": "CL", "fields": "codigo"}),
+            (reverse("api_instrumentos"), {"codigos": "INS-CL-0000,INS-PE-0001"}),
+            (reverse("api_calificaciones"), {"tipo": "RIESGO"}),
+            (
+                reverse("api_calificaciones_instrumento", args=[self.instrumento.codigo]),
+                {"fields": "fecha,monto"},
+            ),
+        ]
+        for url, data in casos:
+            with self.subTest(url=url, data=data):
+                self.assertSinEscaneos(url, data)
+
+    def test_api_cursor_invalido(self):
+        urls = [
+            reverse("api_calificaciones"),
+            reverse("api_calificaciones_instrumento", args=[self.instrumento.codigo]),
+        ]
+        cursores = [
+            "no-es-base64!",
+            codificar_cursor("despues", ["no-es-fecha", 1]),
+            codificar_cursor("antes", [{"a": 1}, 1]),
+        ]
+        for url in urls:
+            for cursor in cursores:
+                with self.subTest(url=url, cursor=cursor):
+                    response = self.client.get(url, {"cursor": cursor})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertEqual(response.json(), {"error": "cursor inválido"})
+
+    def test_tendencias(self):
+        casos = [
+            (reverse("reportes_tendencias"), {}),
+            (reverse("reportes_tendencias"), {"desde": "2024-01-15", "hasta": "2024-03-10"}),
+            (
+                reverse("api_tendencias"),
+                {"granularidad": "dia", "desde": "2024-02-01", "hasta": "2024-02-20", "mercado": "CL"},
+            ),
+            (
+                reverse("api_tendencias"),
+                {"desde": "2023-01-01", "hasta": "2024-12-31", "por": "tipo", "interanual": "1"},
+            ),
+        ]
+        for url, data in casos:
+            with self.subTest(url=url, data=data):
+                self.assertSinEscaneos(url, data)
+
+
+# =========================================================
+#   FILTROS
+# =========================================================
+# Listados y exportaciones deben devolver exactamente las filas que
+# cumplen los filtros, ni más ni menos.
+class FiltrosTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_VERSION_INSTRUMENTOS=f"{cls._tmp.name}/version_instrumentos",
+            NUAM_EXPORT_CACHE=False,
+            NUAM_CACHE_VISTAS=False,
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("filtros", password="x")
+        mercados = [m for m, _ in Instrumento.MERCADO_CHOICES]
+        tipos = [t for t, _ in Instrumento.TIPO_CHOICES]
+        for i in range(12):
+            Instrumento.objects.create(
+                codigo=f"INS-{i:02}",
+                nombre=f"Bono serie {i}" if i % 2 else f"Acción {i}",
+                tipo=tipos[i % len(tipos)],
+                mercado=mercados[i % 3],
+                estado="ACTIVO" if i % 5 else "INACTIVO",
+            )
+
+        instrumentos = list(Instrumento.objects.order_by("codigo"))
+        tipos_cal = [t for t, _ in Calificacion.TIPO_CHOICES]
+        for i in range(40):
+            Calificacion.objects.create(
+                instrumento=instrumentos[i % len(instrumentos)],
+                tipo=tipos_cal[i % len(tipos_cal)],
+                estado="ACTIVA" if i % 4 else "INACTIVA",
+                fecha=date(2024, 1, 1) + timedelta(days=3 * i),
+                monto=Decimal(i),
+            )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+
+    def _listado(self, nombre, clave, data):
+        response = self.client.get(reverse(nombre), {**data, "por_pagina": 500})
+        self.assertEqual(response.status_code, 200)
+        return [getattr(fila, clave) for fila in response.context[nombre]]
+
+    def _exportado(self, nombre, data):
+        response = self.client.get(reverse(nombre), data)
+        self.assertEqual(response.status_code, 200)
+        contenido = b"".join(response.streaming_content).decode("utf-8-sig")
+        return [fila[0] for fila in list(csv.reader(io.StringIO(contenido)))[1:]]
+
+    def test_instrumentos(self):
+        todos = list(Instrumento.objects.all())
+        casos = [
+            ({"q": "serie"}, lambda i: "serie" in i.nombre.lower()),
+            ({"q": "INS-1"}, lambda i: i.codigo.startswith("INS-1")),
+            ({"tipo": "BONO"}, lambda i: i.tipo == "BONO"),
+            ({"mercado": "PE"}, lambda i: i.mercado == "PE"),
+            ({"estado": "INACTIVO"}, lambda i: i.estado == "INACTIVO"),
+            (
+                {"q": "bono", "mercado": "CL", "estado": "ACTIVO"},
+                lambda i: "bono" in i.nombre.lower() and i.mercado == "CL" and i.estado == "ACTIVO",
+            ),
+        ]
+        for data, cumple in casos:
+            with self.subTest(data=data):
+                esperados = sorted(i.codigo for i in todos if cumple(i))
+                self.assertTrue(esperados)
+                self.assertEqual(sorted(self._listado("instrumentos", "codigo", data)), esperados)
+                self.assertEqual(sorted(self._exportado("exportar_instrumentos_csv", data)), esperados)
+
+    def test_calificaciones(self):
+        todas = list(Calificacion.objects.select_related("instrumento"))
+        una = todas[7]
+        casos = [
+            ({"codigo": f"CAL-{una.id}"}, lambda c: c.id == una.id),
+            ({"codigo": str(una.id)}, lambda c: c.id == una.id),
+            ({"tipo": "CREDITO"}, lambda c: c.tipo == "CREDITO"),
+            ({"estado": "INACTIVA"}, lambda c: c.estado == "INACTIVA"),
+            ({"mercado": "CO"}, lambda c: c.instrumento.mercado == "CO"),
+            (
+                {"fecha_desde": "2024-01-10", "fecha_hasta": "2024-02-15"},
+                lambda c: date(2024, 1, 10) <= c.fecha <= date(2024, 2, 15),
+            ),
+            ({"fecha_desde": "2024-04-01"}, lambda c: c.fecha >= date(2024, 4, 1)),
+            (
+                {"tipo": "RIESGO", "mercado": "CL", "fecha_hasta": "2024-03-31"},
+                lambda c: c.tipo == "RIESGO" and c.instrumento.mercado == "CL"
+                and c.fecha <= date(2024, 3, 31),
+            ),
+        ]
+        for data, cumple in casos:
+            with self.subTest(data=data):
+                esperadas = sorted(c.id for c in todas if cumple(c))
+                self.assertTrue(esperadas)
+                self.assertEqual(sorted(self._listado("calificaciones", "id", data)), esperadas)
+                self.assertEqual(
+                    sorted(int(codigo.removeprefix("CAL-"))
+                           for codigo in self._exportado("exportar_calificaciones_csv", data)),
+                    esperadas,
+                )
+
+
+# =========================================================
+#   ESTADÍSTICAS INCREMENTALES
+# =========================================================
+# Después de cada escritura, EstadisticaMercado y ResumenPeriodo deben
+# coincidir con recalcularlas desde las tablas.
+class EstadisticasTests(TestCase):
+
+    def assertAlDia(self):
+        self.assertEqual(reconstruir_estadisticas(solo_verificar=True), [])
+
+    def test_formularios(self):
+        instrumento = Instrumento.objects.create(
+            codigo="INS-1", nombre="Uno", tipo="BONO", mercado="CL",
+        )
+        otro = Instrumento.objects.create(
+            codigo="INS-2", nombre="Dos", tipo="ACCION", mercado="PE",
+        )
+        calificacion = Calificacion.objects.create(
+            instrumento=instrumento, tipo="RIESGO", fecha=date(2024, 1, 31), monto=Decimal("10.50"),
+        )
+        Calificacion.objects.create(
+            instrumento=otro, tipo="CREDITO", fecha=date(2024, 2, 1), monto=Decimal("1.25"),
+        )
+        self.assertAlDia()
+
+        calificacion.fecha = date(2024, 2, 1)
+        calificacion.estado = "INACTIVA"
+        calificacion.save()
+        self.assertAlDia()
+
+        instrumento.mercado = "CO"
+        instrumento.save()
+        self.assertAlDia()
+
+        calificacion.delete()
+        self.assertAlDia()
+
+        otro.delete()
+        self.assertAlDia()
+
+    def test_formulario_calificacion(self):
+        usuario = User.objects.create_user("form", password="x")
+        self.client.force_login(usuario)
+        instrumento = Instrumento.objects.create(
+            codigo="INS-1", nombre="Uno", tipo="BONO", mercado="CL",
+        )
+        datos = {
+            "instrumento": str(instrumento.id), "tipo": "RIESGO", "estado": "ACTIVA",
+            "fecha": "2024-01-31", "monto": "10.50",
+        }
+        response = self.client.post(reverse("calificacion_nueva"), datos)
+        self.assertRedirects(response, reverse("calificaciones"))
+        self.assertAlDia()
+
+        calificacion = Calificacion.objects.get()
+        response = self.client.post(
+            reverse("calificacion_editar", args=[calificacion.id]),
+            {**datos, "fecha": "2024-02-01", "monto": ""},
+        )
+        self.assertRedirects(response, reverse("calificaciones"))
+        self.assertAlDia()
+
+        # Una fecha inválida vuelve al formulario sin guardar nada
+        response = self.client.post(reverse("calificacion_nueva"), {**datos, "fecha": "31/01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "fecha")
+        self.assertEqual(Calificacion.objects.count(), 1)
+        self.assertAlDia()
+
+    def test_cargas(self):
+        instrumentos = (
+            b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+            b"INS-1,Uno,BONO,ACTIVO,,\n"
+            b"INS-2,Dos,ACCION,INACTIVO,,\n"
+        )
+        calificaciones = (
+            b"codigo_instrumento,tipo,estado,fecha,monto\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-31,10.50\n"
+            b"INS-1,RIESGO,ACTIVA,2024-02-01,0.10\n"
+            b"INS-2,CREDITO,INACTIVA,2024-02-01,\n"
+        )
+        cargar_instrumentos_csv(io.BytesIO(instrumentos), "CL")
+        cargar_calificaciones_csv(io.BytesIO(calificaciones))
+        cargar_calificaciones_csv(io.BytesIO(calificaciones), omitir_duplicados=True)
+        self.assertAlDia()
+
+        # Recargar los instrumentos en otro mercado mueve sus calificaciones
+        cargar_instrumentos_csv(io.BytesIO(instrumentos), "PE")
+        self.assertAlDia()
+
+    def test_tendencia(self):
+        instrumento = Instrumento.objects.create(
+            codigo="INS-1", nombre="Uno", tipo="BONO", mercado="CL",
+        )
+        for fecha, monto in [
+            (date(2024, 1, 10), "1.00"),
+            (date(2024, 1, 20), "2.00"),
+            (date(2024, 2, 5), "4.00"),
+            (date(2024, 3, 31), "8.00"),
+        ]:
+            Calificacion.objects.create(
+                instrumento=instrumento, tipo="RIESGO", fecha=fecha, monto=Decimal(monto),
+            )
+
+        # Enero cortado por el rango sale de los días; febrero y marzo, de los meses
+        serie = tendencia(date(2024, 1, 15), date(2024, 3, 31))
+        self.assertEqual(
+            [(f["periodo"], f["cantidad"], f["monto"]) for f in serie],
+            [
+                (date(2024, 1, 1), 1, Decimal("2.00")),
+                (date(2024, 2, 1), 1, Decimal("4.00")),
+                (date(2024, 3, 1), 1, Decimal("8.00")),
+            ],
+        )
+        self.assertEqual(
+            [f["mercado"] for f in tendencia(date(2024, 1, 1), date(2024, 1, 31), por="mercado")],
+            ["CL"],
+        )
+
+
+# =========================================================
+#   CARGAS MASIVAS
+# =========================================================
+class CargasTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # Los trabajos no se encolan: las pruebas los ejecutan a mano
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_VERSION_INSTRUMENTOS=f"{cls._tmp.name}/version_instrumentos",
+            MEDIA_ROOT=f"{cls._tmp.name}/media",
+            NUAM_CARGA_HILOS=0,
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    def _rechazos(self, registro):
+        """Filas (linea, codigo, motivo) escritas en el archivo de rechazos."""
+        return [tuple(fila) for fila in csv.reader(io.StringIO(registro._archivo.getvalue()))][1:]
+
+    def test_validacion_instrumentos(self):
+        rechazos = RegistroRechazos(archivo=io.StringIO())
+        # Solo validar no abre transacciones ni consulta la base de datos
+        with self.assertNumQueries(0):
+            ok, _ = cargar_instrumentos_csv(
+                io.BytesIO(
+                    b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+                    b"INS-1,Uno,BONO,ACTIVO,2024-01-01,\n"
+                    b"INS-2,Dos,FONDO,ACTIVO,,\n"
+                    b"INS-3,Tres,BONO,VIGENTE,,\n"
+                    b"INS-4,Cuatro,BONO,ACTIVO,01/02/2024,\n"
+                    b",Cinco,BONO,ACTIVO,,\n"
+                ),
+                "CL", rechazos=rechazos, solo_validar=True,
+            )
+        self.assertTrue(ok)
+        self.assertEqual(self._rechazos(rechazos), [
+            ("3", "INS-2", "valor inválido en tipo: 'FONDO'"),
+            ("4", "INS-3", "valor inválido en estado: 'VIGENTE'"),
+            ("5", "INS-4", "valor inválido en fecha_emision: '01/02/2024'"),
+            ("6", "", "falta codigo"),
+        ])
+        self.assertFalse(Instrumento.objects.exists())
+
+    def test_validacion_calificaciones(self):
+        rechazos = RegistroRechazos(archivo=io.StringIO())
+        # Solo validar no abre transacciones ni consulta la base de datos
+        with self.assertNumQueries(0):
+            ok, _ = cargar_calificaciones_csv(
+                io.BytesIO(
+                    b"codigo_instrumento,tipo,estado,fecha,monto\n"
+                    b"INS-1,RIESGO,ACTIVA,2024-01-31,10.50\n"
+                    b"INS-1,OTRO,ACTIVA,2024-01-31,1\n"
+                    b"INS-1,RIESGO,VIGENTE,2024-01-31,1\n"
+                    b"INS-1,RIESGO,ACTIVA,31/01/2024,1\n"
+                    b"INS-1,RIESGO,ACTIVA,2024-01-31,diez\n"
+                    b",RIESGO,ACTIVA,,1\n"
+                ),
+                rechazos=rechazos, solo_validar=True,
+            )
+        self.assertTrue(ok)
+        self.assertEqual(self._rechazos(rechazos), [
+            ("3", "INS-1", "valor inválido en tipo: 'OTRO'"),
+            ("4", "INS-1", "valor inválido en estado: 'VIGENTE'"),
+            ("5", "INS-1", "valor inválido en fecha: '31/01/2024'"),
+            ("6", "INS-1", "valor inválido en monto: 'diez'"),
+            ("7", "", "falta codigo_instrumento; falta fecha"),
+        ])
+        self.assertEqual(rechazos.total, 5)
+        self.assertFalse(Calificacion.objects.exists())
+
+    def test_trabajo(self):
+        self.client.force_login(User.objects.create_user("carga", password="x"))
+        archivo = io.BytesIO(
+            b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+            b"INS-1,Uno,BONO,ACTIVO,,\n"
+            b"INS-2,Dos,FONDO,ACTIVO,,\n"
+        )
+        archivo.name = "instrumentos.csv"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                reverse("carga_masiva"),
+                {"tipo": "INSTRUMENTOS", "mercado": "CL", "archivo": archivo},
+            )
+        trabajo = TrabajoCarga.objects.get()
+        self.assertRedirects(response, f"{reverse('carga_masiva')}?trabajo={trabajo.id}")
+
+        url = reverse("carga_masiva_estado", args=[trabajo.id])
+        estado = self.client.get(url).json()
+        self.assertEqual(estado["estado"], "PENDIENTE")
+        self.assertFalse(estado["terminado"])
+        self.assertIsNone(estado["iniciado_en"])
+
+        ejecutar_trabajo(trabajo.id)
+        estado = self.client.get(url).json()
+        self.assertEqual(estado["estado"], "COMPLETADO")
+        self.assertTrue(estado["terminado"])
+        self.assertEqual(estado["filas_procesadas"], 1)
+        self.assertEqual(estado["filas_rechazadas"], 1)
+        self.assertEqual(estado["rechazos"][0]["linea"], 3)
+        self.assertIsNotNone(estado["duracion_segundos"])
+        self.assertEqual(
+            estado["url_rechazos"], reverse("carga_masiva_rechazos", args=[trabajo.id])
+        )
+        rechazos = b"".join(self.client.get(estado["url_rechazos"]).streaming_content)
+        self.assertIn(b"3,INS-2,valor inv", rechazos)
+
+        # Un trabajo ya tomado no se vuelve a procesar
+        ejecutar_trabajo(trabajo.id)
+        self.assertEqual(self.client.get(url).json()["finalizado_en"], estado["finalizado_en"])
+        # Completado, el CSV subido ya no hace falta
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.archivo.name, "")
+        self.assertEqual(Instrumento.objects.count(), 1)
+
+    @override_settings(NUAM_CARGA_BATCH_SIZE=2)
+    def test_retomar_trabajo_con_rechazos(self):
+        Instrumento.objects.create(codigo="INS-1", nombre="Uno", tipo="BONO", mercado="CL")
+        trabajo = TrabajoCarga.objects.create(
+            tipo="CALIFICACIONES",
+            archivo=ContentFile(
+                b"codigo_instrumento,tipo,estado,fecha,monto\n"
+                b"INS-1,RIESGO,ACTIVA,2024-01-01,1\n"
+                b"INS-1,OTRO,ACTIVA,2024-01-02,2\n"
+                b"INS-1,RIESGO,ACTIVA,2024-01-03,3\n"
+                b"INS-1,RIESGO,ACTIVA,2024-01-04,4\n"
+                b"INS-1,RIESGO,VIGENTE,2024-01-05,5\n"
+                b"INS-1,RIESGO,ACTIVA,2024-01-06,6\n",
+                name="calificaciones.csv",
+            ),
+        )
+        bulk_create = Calificacion.objects.bulk_create
+
+        def falla_en(n):
+            """bulk_create que falla en su llamada número ``n``."""
+            llamadas = []
+
+            def envoltura(*args, **kwargs):
+                llamadas.append(1)
+                if len(llamadas) == n:
+                    raise RuntimeError("caída simulada")
+                return bulk_create(*args, **kwargs)
+            return envoltura
+
+        # Falla el primer lote (sin checkpoint) y, al retomar, el segundo;
+        # cada vez el archivo de rechazos ya tenía filas escritas.
+        with mock.patch.object(Calificacion.objects, "bulk_create", falla_en(1)):
+            ejecutar_trabajo(trabajo.id)
+        trabajo.refresh_from_db()
+        self.assertEqual((trabajo.estado, trabajo.checkpoint), ("ERROR", {}))
+
+        with mock.patch.object(Calificacion.objects, "bulk_create", falla_en(2)):
+            ejecutar_trabajo(trabajo.id, reanudar=True)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, "ERROR")
+        self.assertEqual(trabajo.checkpoint["procesadas"], 2)
+
+        ejecutar_trabajo(trabajo.id, reanudar=True)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, "COMPLETADO")
+        self.assertEqual(trabajo.filas_rechazadas, 2)
+        self.assertEqual(Calificacion.objects.count(), 4)
+
+        with trabajo.archivo_rechazos.open("rb") as archivo:
+            contenido = archivo.read()
+        self.assertNotIn(b"\0", contenido)
+        self.assertEqual(contenido.decode("utf-8").splitlines(), [
+            "linea,codigo_instrumento,motivo",
+            "3,INS-1,valor inválido en tipo: 'OTRO'",
+            "6,INS-1,valor inválido en estado: 'VIGENTE'",
+        ])
+
+    def test_retomar_desde_checkpoint(self):
+        cargar_instrumentos_csv(
+            io.BytesIO(
+                b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+                b"INS-1,Uno,BONO,ACTIVO,,\n"
+            ),
+            "CL",
+        )
+        calificaciones = (
+            b"codigo_instrumento,tipo,estado,fecha,monto\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-01,1\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-02,2\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-03,3\n"
+            b"INS-1,OTRO,ACTIVA,2024-01-04,4\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-05,5\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-06,6\n"
+        )
+
+        # El segundo lote falla al confirmar: queda el checkpoint del primero
+        checkpoints = []
+
+        def progreso(checkpoint):
+            if checkpoints:
+                raise RuntimeError("caída simulada")
+            checkpoints.append(checkpoint)
+
+        with self.assertRaises(RuntimeError):
+            cargar_calificaciones_csv(io.BytesIO(calificaciones), batch_size=2, progreso=progreso)
+        self.assertEqual(
+            list(Calificacion.objects.order_by("fecha").values_list("monto", flat=True)),
+            [Decimal("1.00"), Decimal("2.00")],
+        )
+
+        checkpoint = checkpoints[0]
+        rechazos = RegistroRechazos(total=checkpoint["rechazadas"], archivo=io.StringIO())
+        ok, msg = cargar_calificaciones_csv(
+            io.BytesIO(calificaciones), batch_size=2, checkpoint=checkpoint, rechazos=rechazos,
+        )
+        self.assertTrue(ok)
+        self.assertEqual(msg, "Calificaciones procesadas correctamente: 5 (rechazadas: 1)")
+        self.assertEqual(
+            list(Calificacion.objects.order_by("fecha").values_list("monto", flat=True)),
+            [Decimal(n) for n in ("1.00", "2.00", "3.00", "5.00", "6.00")],
+        )
+        # Las líneas se siguen contando desde el principio del archivo
+        self.assertEqual(self._rechazos(rechazos), [("5", "INS-1", "valor inválido en tipo: 'OTRO'")])
+        self.assertEqual(reconstruir_estadisticas(solo_verificar=True), [])
+
+    def test_linea_latin1(self):
+        # La muestra solo ve el inicio en UTF-8; la línea en latin-1 viene después
+        archivo = io.BytesIO(
+            "codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+            "INS-1,Ñandú,BONO,ACTIVO,,\n".encode("utf-8")
+            + "INS-2,Peñón,BONO,ACTIVO,,\n".encode("latin-1")
+            + "INS-3,Acción,BONO,ACTIVO,,\n".encode("utf-8")
+        )
+        with mock.patch.object(LectorCSV, "TAMANO_MUESTRA", 80):
+            ok, _ = cargar_instrumentos_csv(archivo, "CL")
+        self.assertTrue(ok)
+        self.assertEqual(
+            list(Instrumento.objects.order_by("codigo").values_list("nombre", flat=True)),
+            ["Ñandú", "Peñón", "Acción"],
+        )
+
+    def test_nuevos_y_actualizados(self):
+        encabezado = b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+        filas = [
+            b"INS-1,Uno,BONO,ACTIVO,,\n",
+            b"INS-2,Dos,ACCION,ACTIVO,,\n",
+            b"INS-3,Tres,DERIVADO,ACTIVO,,\n",
+        ]
+        ok, msg = cargar_instrumentos_csv(io.BytesIO(encabezado + b"".join(filas)), "CL")
+        self.assertTrue(ok)
+        self.assertEqual(msg, "Instrumentos procesados correctamente: 3 (nuevos: 3, actualizados: 0)")
+
+        # La misma carga con una fila cambiada y una nueva
+        filas[1] = b"INS-2,Dos renombrado,ACCION,INACTIVO,,\n"
+        filas.append(b"INS-4,Cuatro,BONO,ACTIVO,,\n")
+        ok, msg = cargar_instrumentos_csv(io.BytesIO(encabezado + b"".join(filas)), "CL")
+        self.assertTrue(ok)
+        self.assertEqual(msg, "Instrumentos procesados correctamente: 4 (nuevos: 1, actualizados: 3)")
+        self.assertEqual(Instrumento.objects.count(), 4)
+        self.assertEqual(
+            Instrumento.objects.values_list("nombre", "estado").get(codigo="INS-2"),
+            ("Dos renombrado", "INACTIVO"),
+        )
+
+    def test_instrumento_inexistente(self):
+        cargar_instrumentos_csv(
+            io.BytesIO(
+                b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+                b"INS-1,Uno,BONO,ACTIVO,,\n"
+            ),
+            "CL",
+        )
+        rechazos = RegistroRechazos(archivo=io.StringIO())
+        ok, msg = cargar_calificaciones_csv(
+            io.BytesIO(
+                b"codigo_instrumento,tipo,estado,fecha,monto\n"
+                b"INS-1,RIESGO,ACTIVA,2024-01-01,1\n"
+                b"NO-EXISTE,RIESGO,ACTIVA,2024-01-02,2\n"
+                b"INS-1,CREDITO,ACTIVA,2024-01-03,3\n"
+            ),
+            rechazos=rechazos,
+        )
+        # El resto del lote se guarda igual
+        self.assertTrue(ok)
+        self.assertEqual(msg, "Calificaciones procesadas correctamente: 2 (rechazadas: 1)")
+        self.assertEqual(self._rechazos(rechazos), [("3", "NO-EXISTE", "Instrumento inexistente")])
+        self.assertEqual(
+            list(Calificacion.objects.order_by("fecha").values_list("instrumento__codigo", "tipo")),
+            [("INS-1", "RIESGO"), ("INS-1", "CREDITO")],
+        )
+
+    def test_omitir_duplicados(self):
+        cargar_instrumentos_csv(
+            io.BytesIO(
+                b"codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+                b"INS-1,Uno,BONO,ACTIVO,,\n"
+            ),
+            "CL",
+        )
+        calificaciones = (
+            b"codigo_instrumento,tipo,estado,fecha,monto\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-31,100\n"
+            b"INS-1,RIESGO,ACTIVA,2024-01-31,100.00\n"
+            b"INS-1,RIESGO,ACTIVA,2024-1-31,100.0\n"
+            b"INS-1,RIESGO,ACTIVA,2024-02-01,100\n"
+        )
+        # Sin omitir se guardan todas; omitiendo, las repetidas del lote no
+        _, msg = cargar_calificaciones_csv(io.BytesIO(calificaciones))
+        self.assertEqual(msg, "Calificaciones procesadas correctamente: 4")
+        Calificacion.objects.all().delete()
+
+        _, msg = cargar_calificaciones_csv(io.BytesIO(calificaciones), omitir_duplicados=True)
+        self.assertEqual(
+            msg, "Calificaciones procesadas correctamente: 2 (omitidas por duplicadas: 2)"
+        )
+        # ... y las que ya están en la tabla tampoco
+        _, msg = cargar_calificaciones_csv(io.BytesIO(calificaciones), omitir_duplicados=True)
+        self.assertEqual(
+            msg, "Calificaciones procesadas correctamente: 0 (omitidas por duplicadas: 4)"
+        )
+        self.assertEqual(Calificacion.objects.count(), 2)
+
+    def test_huella(self):
+        huella = huella_calificacion(1, "RIESGO", "ACTIVA", date(2024, 1, 31), "100")
+        for monto in ("100.00", Decimal("100"), 100):
+            with self.subTest(monto=monto):
+                self.assertEqual(
+                    huella_calificacion(1, "RIESGO", "ACTIVA", date(2024, 1, 31), monto), huella
+                )
+        self.assertNotEqual(
+            huella_calificacion(1, "RIESGO", "ACTIVA", date(2024, 1, 31), "100.01"), huella
+        )
+        # La copia de la migración 0004 calcula las mismas huellas
+        migracion = importlib.import_module("nuapp.migrations.0004_calificacion_huella")
+        self.assertEqual(
+            migracion.huella_calificacion(1, "RIESGO", "ACTIVA", date(2024, 1, 31), "100.00"), huella
+        )
+
+
+
+class CargaLoteTests(SimpleTestCase):
+    """
+    carga_lote corre en procesos aparte, que no ven la base de datos de
+    las pruebas: el comando se ejecuta como en producción contra una
+    base SQLite temporal, con un módulo de ajustes que la apunta.
+    """
+
+    def _manage(self, tmp, *args):
+        entorno = {
+            **os.environ,
+            "DJANGO_SETTINGS_MODULE": "ajustes_lote",
+            "PYTHONPATH": os.pathsep.join([tmp, str(settings.BASE_DIR)]),
+        }
+        return subprocess.run(
+            [sys.executable, str(settings.BASE_DIR / "manage.py"), *args],
+            cwd=tmp, env=entorno, capture_output=True, text=True, timeout=300,
+        )
+
+    def test_dos_procesos(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            base = os.path.join(tmp, "lote.sqlite3")
+            with open(os.path.join(tmp, "ajustes_lote.py"), "w") as ajustes:
+                ajustes.write(
+                    "from nuam_project.settings import *\n"
+                    f"DATABASES['default']['NAME'] = {base!r}\n"
+                    f"NUAM_VERSION_DATOS = {os.path.join(tmp, 'version_datos')!r}\n"
+                    f"NUAM_VERSION_INSTRUMENTOS = {os.path.join(tmp, 'version_instrumentos')!r}\n"
+                )
+            encabezado = "codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+            for mercado, n in (("CL", 3), ("PE", 2)):
+                with open(os.path.join(tmp, f"instrumentos_{mercado}.csv"), "w") as archivo:
+                    archivo.write(encabezado)
+                    for i in range(n):
+                        archivo.write(f"{mercado}-{i},Instrumento {i},BONO,ACTIVO,,\n")
+            with open(os.path.join(tmp, "calificaciones.csv"), "w") as archivo:
+                archivo.write("codigo_instrumento,tipo,estado,fecha,monto\n")
+                for codigo in ("CL-0", "CL-1", "CL-2", "PE-0", "PE-1", "PE-1"):
+                    archivo.write(f"{codigo},RIESGO,ACTIVA,2024-01-31,1.00\n")
+
+            migracion = self._manage(tmp, "migrate", "-v0")
+            self.assertEqual(migracion.returncode, 0, migracion.stderr)
+            carga = self._manage(
+                tmp, "carga_lote", "--procesos", "2",
+                "instrumentos_CL.csv", "instrumentos_PE.csv", "calificaciones.csv",
+            )
+            self.assertEqual(carga.returncode, 0, carga.stdout + carga.stderr)
+            self.assertIn("3 archivo(s), 11 filas", carga.stdout)
+
+            with sqlite3.connect(base) as bd:
+                self.assertEqual(
+                    bd.execute(
+                        "SELECT mercado, COUNT(*) FROM nuapp_instrumento GROUP BY mercado ORDER BY mercado"
+                    ).fetchall(),
+                    [("CL", 3), ("PE", 2)],
+                )
+                self.assertEqual(bd.execute("SELECT COUNT(*) FROM nuapp_calificacion").fetchone(), (6,))
+            bd.close()
+
+
+# =========================================================
+#   BÚSQUEDA DE INSTRUMENTOS
+# =========================================================
+# El índice FTS5 debe responder lo mismo que icontains y seguir a la
+# tabla en cada escritura (triggers de la migración 0006).
+class BusquedaTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_VERSION_INSTRUMENTOS=f"{cls._tmp.name}/version_instrumentos",
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        for codigo, nombre in [
+            ("BONO-CL-001", "Bono Tesorería 2030"),
+            ("BONO-PE-002", "Bono soberano 10% anual"),
+            ("ACC-CO-ECO", "Ecopetrol ordinaria"),
+            ("ACC-CL-SQM", "SQM serie B"),
+            ("DER_FX_01", "Forward USD/CLP"),
+            ("FONDO-7", 'Fondo "Renta" Fija'),
+            ("AB", "Ab"),
+        ]:
+            Instrumento.objects.create(codigo=codigo, nombre=nombre, tipo="BONO", mercado="CL")
+
+    def _buscar(self, q):
+        return set(filtrar_por_texto(Instrumento.objects.all(), q).values_list("codigo", flat=True))
+
+    def _icontains(self, q):
+        return set(
+            Instrumento.objects
+            .filter(Q(codigo__icontains=q) | Q(nombre__icontains=q))
+            .values_list("codigo", flat=True)
+        )
+
+    def assertIndiceIntegro(self):
+        # FTS5 compara el índice con la tabla de contenido y falla si difieren
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {TABLA_BUSQUEDA}({TABLA_BUSQUEDA}, rank) VALUES ('integrity-check', 1)"
+            )
+
+    def test_igual_que_icontains(self):
+        consultas = [
+            "bono", "BONO-", "-cl-", "tesorer", "ía 2", "10%", "USD/", "_FX", '"Renta"',
+            "ecopetrol ORD", "serie b", "no-existe",
+            # Menos de 3 caracteres: no usan el índice
+            "ab", "B", "7", "%",
+        ]
+        for q in consultas:
+            with self.subTest(q=q):
+                self.assertEqual(self._buscar(q), self._icontains(q))
+        self.assertEqual(self._buscar("10%"), {"BONO-PE-002"})
+        self.assertEqual(self._buscar("_FX"), {"DER_FX_01"})
+
+    def test_sigue_las_escrituras(self):
+        instrumento = Instrumento.objects.create(
+            codigo="NUEVO-1", nombre="Letra hipotecaria", tipo="BONO", mercado="PE",
+        )
+        self.assertEqual(self._buscar("hipotec"), {"NUEVO-1"})
+
+        instrumento.nombre = "Pagaré bancario"
+        instrumento.save()
+        self.assertEqual(self._buscar("hipotec"), set())
+        self.assertEqual(self._buscar("pagaré"), {"NUEVO-1"})
+
+        instrumento.codigo = "RENOMBRADO-1"
+        instrumento.save()
+        self.assertEqual(self._buscar("nuevo-"), set())
+        self.assertEqual(self._buscar("renombr"), {"RENOMBRADO-1"})
+
+        Instrumento.objects.filter(codigo="ACC-CL-SQM").update(nombre="Soquimich B")
+        self.assertEqual(self._buscar("serie b"), set())
+        self.assertEqual(self._buscar("soquim"), {"ACC-CL-SQM"})
+
+        instrumento.delete()
+        self.assertEqual(self._buscar("pagaré"), set())
+        self.assertEqual(self._buscar("renombr"), set())
+        self.assertIndiceIntegro()
+
+    def test_sigue_las_cargas(self):
+        # El upsert por lotes inserta unos y actualiza otros (ON CONFLICT DO UPDATE)
+        cargar_instrumentos_csv(
+            io.BytesIO(
+                "codigo,nombre,tipo,estado,fecha_emision,fecha_vencimiento\n"
+                "BONO-CL-001,Bono Tesorería 2040,BONO,ACTIVO,,\n"
+                "CARGA-1,Cuota de fondo mutuo,OTRO,ACTIVO,,\n".encode("utf-8")
+            ),
+            "CL",
+        )
+        self.assertEqual(self._buscar("2030"), set())
+        self.assertEqual(self._buscar("2040"), {"BONO-CL-001"})
+        self.assertEqual(self._buscar("fondo"), {"FONDO-7", "CARGA-1"})
+        self.assertEqual(self._buscar("mutuo"), self._icontains("mutuo"))
+        self.assertIndiceIntegro()
+
+
+class SugerenciasTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_VERSION_INSTRUMENTOS=f"{cls._tmp.name}/version_instrumentos",
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        for codigo, nombre in [
+            ("BONO-2", "Alfa"),
+            ("BONO-1", "Bono central"),
+            ("ACC-1", "Bonanza minera"),
+            ("ACC-2", "Cobre andino"),
+        ]:
+            Instrumento.objects.create(codigo=codigo, nombre=nombre, tipo="BONO", mercado="CL")
+
+    def setUp(self):
+        # El índice es del proceso: otra prueba pudo armarlo con otros datos
+        incrementar_version_instrumentos()
+
+    def _codigos(self, q, limite=None):
+        return [codigo for _, codigo, _ in sugerir_instrumentos(q, limite)]
+
+    def test_prefijos_y_limite(self):
+        # Primero los códigos, luego los nombres; cada grupo en orden alfabético
+        self.assertEqual(self._codigos("bon"), ["BONO-1", "BONO-2", "ACC-1"])
+        self.assertEqual(self._codigos("  BoN "), ["BONO-1", "BONO-2", "ACC-1"])
+        self.assertEqual(self._codigos("bon", limite=2), ["BONO-1", "BONO-2"])
+        self.assertEqual(self._codigos("acc-"), ["ACC-1", "ACC-2"])
+        self.assertEqual(self._codigos("andino"), [])
+        self.assertEqual(self._codigos(""), [])
+        with self.settings(NUAM_SUGERENCIAS_LIMITE=1):
+            self.assertEqual(self._codigos("bon"), ["BONO-1"])
+
+        self.client.force_login(User.objects.create_user("sugiere", password="x"))
+        response = self.client.get(reverse("instrumento_sugerencias"), {"q": "cob"})
+        acc2 = Instrumento.objects.get(codigo="ACC-2")
+        self.assertEqual(
+            response.json(),
+            {"resultados": [{"id": acc2.id, "codigo": "ACC-2", "nombre": "Cobre andino"}]},
+        )
+
+    def test_se_rehace_con_la_version(self):
+        self.assertEqual(self._codigos("bon"), ["BONO-1", "BONO-2", "ACC-1"])
+
+        # La versión de instrumentos sube al confirmar cada escritura
+        with self.captureOnCommitCallbacks(execute=True):
+            Instrumento.objects.create(codigo="BONITO", nombre="Nuevo", tipo="BONO", mercado="PE")
+        self.assertEqual(self._codigos("bon"), ["BONITO", "BONO-1", "BONO-2", "ACC-1"])
+
+        acc1 = Instrumento.objects.get(codigo="ACC-1")
+        acc1.nombre = "Plata del sur"
+        with self.captureOnCommitCallbacks(execute=True):
+            acc1.save()
+        self.assertEqual(self._codigos("bon"), ["BONITO", "BONO-1", "BONO-2"])
+        self.assertEqual(self._codigos("plata"), ["ACC-1"])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Instrumento.objects.filter(codigo="BONITO").delete()
+        self.assertEqual(self._codigos("bonit"), [])
+
+
+# =========================================================
+#   CACHÉ DE VISTAS
+# =========================================================
+class CacheVistasTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_CACHE_VISTAS=True,
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ana = User.objects.create_user("ana", password="x")
+        cls.beto = User.objects.create_user("beto", password="x")
+        cls.admin = User.objects.create_superuser("raiz", password="x")
+        Instrumento.objects.create(codigo="INS-1", nombre="Uno", tipo="BONO", mercado="CL")
+
+    def setUp(self):
+        cache.clear()
+
+    def _get(self, usuario, url, data=None):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url, data)
+        self.assertEqual(response.status_code, 200)
+        consultas = [q["sql"] for q in capturadas.captured_queries if "nuapp_" in q["sql"]]
+        return response, consultas
+
+    def test_acierto_sin_consultas(self):
+        url = reverse("instrumentos")
+        _, consultas = self._get(self.ana, url, {"mercado": "CL"})
+        self.assertTrue(consultas)
+
+        response, consultas = self._get(self.ana, url, {"mercado": "CL"})
+        self.assertEqual(consultas, [])
+        self.assertContains(response, "INS-1")
+
+        # Otra query string es otra entrada
+        _, consultas = self._get(self.ana, url, {"mercado": "PE"})
+        self.assertTrue(consultas)
+
+        # Una escritura sube la versión y deja atrás lo guardado
+        incrementar_version()
+        _, consultas = self._get(self.ana, url, {"mercado": "CL"})
+        self.assertTrue(consultas)
+
+    def test_usuario_y_rol(self):
+        url = reverse("instrumentos")
+        self._get(self.ana, url)
+
+        # Mismo rol: el contexto viene de la caché, pero la página es de beto
+        response, consultas = self._get(self.beto, url)
+        self.assertEqual(consultas, [])
+        self.assertContains(response, "beto")
+        self.assertNotContains(response, "ana")
+        self.assertContains(response, "csrfmiddlewaretoken")
+
+        # Otro rol calcula su propia entrada
+        response, consultas = self._get(self.admin, url)
+        self.assertTrue(consultas)
+        self.assertContains(response, "Usuarios y Roles")
+
+
+# =========================================================
+#   EXPORTACIONES
+# =========================================================
+class ExportacionesTests(TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls._tmp = tempfile.TemporaryDirectory()
+        cls._ajustes = override_settings(
+            NUAM_VERSION_DATOS=f"{cls._tmp.name}/version_datos",
+            NUAM_VERSION_INSTRUMENTOS=f"{cls._tmp.name}/version_instrumentos",
+            NUAM_EXPORT_CACHE_DIR=f"{cls._tmp.name}/exportaciones",
+            NUAM_EXPORT_CACHE=True,
+        )
+        cls._ajustes.enable()
+        cls.addClassCleanup(cls._tmp.cleanup)
+        cls.addClassCleanup(cls._ajustes.disable)
+        super().setUpClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = User.objects.create_user("exporta", password="x")
+        instrumento = Instrumento.objects.create(
+            codigo="INS-1", nombre="Uno", tipo="BONO", mercado="CL",
+        )
+        Calificacion.objects.create(
+            instrumento=instrumento, tipo="RIESGO", fecha=date(2024, 1, 31), monto=Decimal("10.50"),
+        )
+
+    def setUp(self):
+        self.client.force_login(self.usuario)
+        # Cada prueba empieza en una versión nueva: lo que otra dejó en la
+        # caché de exportaciones no corresponde a estos datos.
+        incrementar_version()
+
+    def _descargar(self, nombre, data=None):
+        response = self.client.get(reverse(nombre), data)
+        self.assertEqual(response.status_code, 200)
+        return b"".join(response.streaming_content)
+
+    def _texto_pdf(self, contenido):
+        return "\n".join(p.extract_text() for p in pypdf.PdfReader(io.BytesIO(contenido)).pages)
+
+    @unittest.skipUnless(pypdf, "requiere pypdf")
+    def test_pdf_fechado_por_version(self):
+        # El PDF en caché lleva la fecha de la versión de sus datos, no la de la descarga
+        with open(settings.NUAM_VERSION_DATOS, "w") as archivo:
+            archivo.write(str(1706702400 * 10**9))
+        primera = self._descargar("exportar_instrumentos_pdf")
+        self.assertIn("Datos al 31/01/2024 12:00", self._texto_pdf(primera))
+        self.assertEqual(self._descargar("exportar_instrumentos_pdf"), primera)
+
+    @unittest.skipUnless(pypdf, "requiere pypdf")
+    def test_pdf_valido(self):
+        columnas = [("Código", 1, "izquierda"), ("Nombre", 3, "izquierda"), ("Monto", 1, "derecha")]
+        filas = [[f"INS-{i}", f"Instrumento {i}", f"{i}.00"] for i in range(2 * FILAS_POR_PAGINA)]
+        filas.append(["ÚLTIMO", "Peñón (serie \\ B)", None])
+
+        # strict: la tabla xref y los offsets deben ser exactos
+        lector = pypdf.PdfReader(io.BytesIO(b"".join(tabla_pdf("Prueba", columnas, filas))), strict=True)
+        self.assertEqual(len(lector.pages), 3)
+        self.assertIn("Página 1", lector.pages[0].extract_text())
+        self.assertIn("INS-0", lector.pages[0].extract_text())
+        ultima = lector.pages[2].extract_text()
+        self.assertIn("Página 3", ultima)
+        self.assertIn("Peñón (serie \\ B)", ultima)
+        self.assertIn("ÚLTIMO", ultima)
+
+        vacio = pypdf.PdfReader(io.BytesIO(b"".join(tabla_pdf("Prueba", columnas, []))), strict=True)
+        self.assertEqual(len(vacio.pages), 1)
+        self.assertIn("Sin registros", vacio.pages[0].extract_text())
+
+        texto = self._texto_pdf(self._descargar("exportar_calificaciones_pdf"))
+        self.assertIn("INS-1", texto)
+        self.assertIn("10.50", texto)
+
+    def test_gzip(self):
+        bloques = ["codigo,nombre\n", "INS-1,Peñón\n", b"INS-2,Dos\n" * 5000, ""]
+        esperado = b"".join(b if isinstance(b, bytes) else b.encode("utf-8") for b in bloques)
+        comprimido = b"".join(gzip_en_bloques(iter(bloques), nivel=1))
+        self.assertEqual(gzip.decompress(comprimido), esperado)
+        # Sin fecha en la cabecera: el mismo contenido da los mismos bytes
+        self.assertEqual(b"".join(gzip_en_bloques(iter(bloques), nivel=1)), comprimido)
+        self.assertEqual(gzip.decompress(b"".join(gzip_en_bloques([]))), b"")
+
+        for nombre in ("exportar_calificaciones_csv", "exportar_instrumentos_pdf"):
+            with self.subTest(exportacion=nombre):
+                plano = self._descargar(nombre)
+                response = self.client.get(reverse(nombre), {"gzip": "1"})
+                self.assertEqual(response["Content-Type"], "application/gzip")
+                self.assertIn('.gz"', response["Content-Disposition"])
+                self.assertEqual(gzip.decompress(b"".join(response.streaming_content)), plano)
+                # La segunda descarga sale de la caché en disco
+                self.assertEqual(gzip.decompress(self._descargar(nombre, {"gzip": "1"})), plano)
+
+    def test_zip_por_mercado(self):
+        otro = Instrumento.objects.create(codigo="INS-2", nombre="Dos", tipo="ACCION", mercado="PE")
+        for dia in (1, 2):
+            Calificacion.objects.create(instrumento=otro, tipo="CREDITO", fecha=date(2024, 2, dia))
+
+        archivo_zip = zipfile.ZipFile(io.BytesIO(b"".join(zip_por_mercado(procesos=1))))
+        self.assertIsNone(archivo_zip.testzip())
+        mercados = [m for m, _ in Instrumento.MERCADO_CHOICES]
+        esperados = sorted(
+            f"{modelo}_{mercado}.csv"
+            for modelo in ("instrumentos", "calificaciones") for mercado in mercados
+        )
+        self.assertEqual(sorted(archivo_zip.namelist()), sorted(esperados + ["manifest.json"]))
+
+        manifiesto = json.loads(archivo_zip.read("manifest.json"))["archivos"]
+        self.assertEqual([f["archivo"] for f in manifiesto], esperados)
+        filas = {}
+        for fragmento in manifiesto:
+            with self.subTest(archivo=fragmento["archivo"]):
+                contenido = archivo_zip.read(fragmento["archivo"])
+                self.assertEqual(fragmento["bytes"], len(contenido))
+                self.assertEqual(fragmento["sha256"], hashlib.sha256(contenido).hexdigest())
+                lineas = list(csv.reader(io.StringIO(contenido.decode("utf-8"))))
+                self.assertEqual(fragmento["filas"], len(lineas) - 1)
+                filas[fragmento["archivo"]] = fragmento["filas"]
+
+        self.assertEqual(filas["instrumentos_CL.csv"], 1)
+        self.assertEqual(filas["instrumentos_PE.csv"], 1)
+        self.assertEqual(filas["instrumentos_CO.csv"], 0)
+        self.assertEqual(filas["calificaciones_CL.csv"], 1)
+        self.assertEqual(filas["calificaciones_PE.csv"], 2)
+
+    def _consultas(self, data=None, **cabeceras):
+        """GET a la exportación CSV de calificaciones: (respuesta, contenido, consultas a nuapp)."""
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(reverse("exportar_calificaciones_csv"), data, **cabeceras)
+            contenido = b"".join(response.streaming_content) if response.streaming else response.content
+        consultas = [q["sql"] for q in capturadas.captured_queries if "nuapp_" in q["sql"]]
+        return response, contenido, consultas
+
+    def test_cache_exportacion(self):
+        primera, contenido, consultas = self._consultas()
+        self.assertEqual(primera.status_code, 200)
+        self.assertTrue(consultas)
+        etag = primera["ETag"]
+        self.assertTrue(etag.startswith('"') and etag.endswith('"'))
+        self.assertIn("INS-1", contenido.decode("utf-8"))
+        directorio = settings.NUAM_EXPORT_CACHE_DIR
+        self.assertEqual(len(os.listdir(directorio)), 1)
+
+        # Acierto: sale del disco sin consultar las tablas
+        response, repetido, consultas = self._consultas()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(consultas, [])
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(repetido, contenido)
+
+        # El navegador ya la tiene
+        response, cuerpo, consultas = self._consultas(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(cuerpo, b"")
+        self.assertEqual(consultas, [])
+
+        # Otros filtros son otra entrada
+        response, _, consultas = self._consultas({"tipo": "CREDITO"})
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertTrue(consultas)
+
+        # Una escritura sube la versión: el ETag anterior ya no sirve
+        Calificacion.objects.create(
+            instrumento=Instrumento.objects.get(codigo="INS-1"), tipo="CREDITO", fecha=date(2024, 3, 1),
+        )
+        incrementar_version()
+        response, nuevo, consultas = self._consultas(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertTrue(consultas)
+        self.assertEqual(len(nuevo.splitlines()), len(contenido.splitlines()) + 1)
+        # ... y los archivos de la versión anterior se borran
+        self.assertTrue(all(n.startswith(version_datos()) for n in os.listdir(directorio)))
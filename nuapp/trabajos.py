@@ -0,0 +1,144 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, connection
+from django.utils import timezone
+
+from .cargas import RegistroRechazos, cargar_instrumentos_csv, cargar_calificaciones_csv
+from .models import TrabajoCarga
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "NUAM_CARGA_HILOS", 1),
+            thread_name_prefix="nuam-carga",
+        )
+    return _executor
+
+
+# =========================================================
+#   ENCOLAR
+# =========================================================
+def encolar_trabajo(trabajo_id):
+    """
+    Ejecuta el trabajo en el pool de hilos del proceso web. Con
+    NUAM_CARGA_HILOS = 0 no hace nada y el trabajo queda PENDIENTE
+    hasta que lo tome ``manage.py procesar_cargas``.
+    """
+    if not getattr(settings, "NUAM_CARGA_HILOS", 1):
+        return
+    _get_executor().submit(_ejecutar_en_hilo, trabajo_id)
+
+
+def _ejecutar_en_hilo(trabajo_id):
+    close_old_connections()
+    try:
+        ejecutar_trabajo(trabajo_id)
+    except Exception:
+        logger.exception("Falló el trabajo de carga %s", trabajo_id)
+    finally:
+        connection.close()
+
+
+# =========================================================
+#   EJECUTAR
+# =========================================================
+def ejecutar_trabajo(trabajo_id, reanudar=False):
+    """
+    Procesa un trabajo PENDIENTE. Con ``reanudar=True`` toma en cambio un
+    trabajo que quedó a medias (PROCESANDO tras una caída, o ERROR) y lo
+    continúa desde su último checkpoint; usarlo solo cuando no haya otro
+    worker procesándolo.
+    """
+    # Reclamar el trabajo de forma atómica: si otro worker ya lo tomó,
+    # el UPDATE no afecta filas y no se procesa dos veces.
+    if reanudar:
+        tomado = (
+            TrabajoCarga.objects
+            .filter(id=trabajo_id, estado__in=["PROCESANDO", "ERROR"])
+            .exclude(archivo="")
+            .update(estado="PROCESANDO", finalizado_en=None)
+        )
+    else:
+        tomado = (
+            TrabajoCarga.objects
+            .filter(id=trabajo_id, estado="PENDIENTE")
+            .update(estado="PROCESANDO", iniciado_en=timezone.now())
+        )
+    if not tomado:
+        return
+
+    trabajo = TrabajoCarga.objects.get(id=trabajo_id)
+    checkpoint = trabajo.checkpoint or None
+
+    # Todos los rechazos van a un CSV descargable. Al retomar, se descarta
+    # lo escrito después del último lote confirmado.
+    nombre_rechazos = f"rechazos/trabajo_{trabajo_id}.csv"
+    ruta_rechazos = default_storage.path(nombre_rechazos)
+    os.makedirs(os.path.dirname(ruta_rechazos), exist_ok=True)
+
+    with open(ruta_rechazos, "a+", newline="", encoding="utf-8") as archivo_rechazos:
+        # truncate() no mueve la posición: sin el seek, tell() seguiría en
+        # el final anterior y se omitiría el encabezado.
+        archivo_rechazos.truncate((checkpoint or {}).get("rechazos_bytes", 0))
+        archivo_rechazos.seek(0, os.SEEK_END)
+        rechazos = RegistroRechazos(
+            total=(checkpoint or {}).get("rechazadas", 0),
+            muestra=trabajo.rechazos if checkpoint else None,
+            archivo=archivo_rechazos,
+        )
+
+        def progreso(nuevo_checkpoint):
+            TrabajoCarga.objects.filter(id=trabajo_id).update(
+                filas_procesadas=nuevo_checkpoint["procesadas"],
+                filas_rechazadas=nuevo_checkpoint["rechazadas"],
+                rechazos=rechazos.muestra,
+                checkpoint=nuevo_checkpoint,
+            )
+
+        opciones = {
+            "progreso": progreso,
+            "checkpoint": checkpoint,
+            "rechazos": rechazos,
+            "solo_validar": trabajo.solo_validar,
+        }
+        try:
+            with open(trabajo.archivo.path, "rb") as archivo:
+                if trabajo.tipo == "INSTRUMENTOS":
+                    ok, msg = cargar_instrumentos_csv(archivo, trabajo.mercado, **opciones)
+                else:
+                    ok, msg = cargar_calificaciones_csv(
+                        archivo, omitir_duplicados=trabajo.omitir_duplicados, **opciones
+                    )
+        except Exception as exc:
+            ok, msg = False, f"Error al procesar el archivo: {exc}"
+            logger.exception("Error en el trabajo de carga %s", trabajo_id)
+
+    cambios = {
+        "estado": "COMPLETADO" if ok else "ERROR",
+        "mensaje": msg,
+        "filas_rechazadas": rechazos.total,
+        "rechazos": rechazos.muestra,
+        "finalizado_en": timezone.now(),
+    }
+
+    if rechazos.total:
+        cambios["archivo_rechazos"] = nombre_rechazos
+    else:
+        default_storage.delete(nombre_rechazos)
+
+    # El archivo solo se conserva si la carga falló, para poder retomarla.
+    if ok:
+        trabajo.archivo.storage.delete(trabajo.archivo.name)
+        cambios["archivo"] = ""
+
+    TrabajoCarga.objects.filter(id=trabajo_id).update(**cambios)
@@ -34,6 +34,11 @@ urlpatterns = [
         views.instrumento_detalle_view,
         name="instrumento_detalle",
     ),
+    path(
+        "instrumentos/sugerencias/",
+        views.sugerencias_instrumentos_view,
+        name="instrumento_sugerencias",
+    ),
     path(
         "instrumentos/eliminar/<int:instrumento_id>/",
         views.instrumento_eliminar_view,
@@ -64,6 +69,16 @@ urlpatterns = [
     # CARGA MASIVA
     # =========================
     path("carga-masiva/", views.carga_masiva_view, name="carga_masiva"),
+    path(
+        "carga-masiva/estado/<int:trabajo_id>/",
+        views.carga_masiva_estado_view,
+        name="carga_masiva_estado",
+    ),
+    path(
+        "carga-masiva/rechazos/<int:trabajo_id>/",
+        views.carga_masiva_rechazos_view,
+        name="carga_masiva_rechazos",
+    ),
 
     # =========================
     # ADMIN
@@ -74,6 +89,7 @@ urlpatterns = [
     # REPORTES
     # =========================
     path("reportes/", views.reportes_view, name="reportes"),
+    path("reportes/tendencias/", views.tendencias_view, name="reportes_tendencias"),
 
   # =========================
 # EXPORTACIONES CSV/PDF
@@ -98,4 +114,21 @@ path(
     views.exportar_calificaciones_pdf,
     name="exportar_calificaciones_pdf",
 ),
+path(
+    "exportar/mercados/zip/",
+    views.exportar_mercados_zip,
+    name="exportar_mercados_zip",
+),
+
+    # =========================
+    # API JSON (v1)
+    # =========================
+    path("api/v1/instrumentos/", views.api_instrumentos, name="api_instrumentos"),
+    path(
+        "api/v1/instrumentos/<str:codigo>/calificaciones/",
+        views.api_calificaciones_instrumento,
+        name="api_calificaciones_instrumento",
+    ),
+    path("api/v1/calificaciones/", views.api_calificaciones, name="api_calificaciones"),
+    path("api/v1/tendencias/", views.api_tendencias, name="api_tendencias"),
 ]
\ No newline at end of file
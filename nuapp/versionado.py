@@ -0,0 +1,75 @@
+import os
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+
+
+# =========================================================
+#   VERSIÓN DE LOS DATOS
+# =========================================================
+# Un número guardado en un archivo que sube cada vez que cambian
+# instrumentos o calificaciones. Se lee sin consultar la base de datos
+# y lo comparten todos los procesos (web, procesar_cargas, carga_lote).
+def _ruta():
+    return Path(getattr(
+        settings, "NUAM_VERSION_DATOS", settings.BASE_DIR / "var" / "version_datos"
+    ))
+
+
+def _ruta_instrumentos():
+    return Path(getattr(
+        settings, "NUAM_VERSION_INSTRUMENTOS",
+        settings.BASE_DIR / "var" / "version_instrumentos",
+    ))
+
+
+def _leer(ruta):
+    try:
+        return ruta.read_text().strip() or "0"
+    except FileNotFoundError:
+        return "0"
+
+
+def _incrementar(ruta):
+    """
+    Guarda una versión nueva. Se usa el reloj en nanosegundos para que
+    dos procesos no escriban el mismo número, pero nunca se retrocede.
+    """
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+
+    nueva = max(time.time_ns(), int(_leer(ruta)) + 1)
+    fd, temporal = tempfile.mkstemp(dir=ruta.parent, prefix=".version-")
+    with os.fdopen(fd, "w") as archivo:
+        archivo.write(str(nueva))
+    os.replace(temporal, ruta)
+    return str(nueva)
+
+
+def version_datos():
+    return _leer(_ruta())
+
+
+def incrementar_version():
+    return _incrementar(_ruta())
+
+
+def fecha_version(version):
+    """Momento (UTC) en que se guardó ``version``; None para la inicial."""
+    nanosegundos = int(version)
+    if not nanosegundos:
+        return None
+    return datetime.fromtimestamp(nanosegundos / 1e9, tz=timezone.utc)
+
+
+# Versión aparte que solo sube cuando cambian instrumentos, para lo que
+# depende únicamente del catálogo (el índice de sugerencias) y no debe
+# rehacerse con cada calificación nueva.
+def version_instrumentos():
+    return _leer(_ruta_instrumentos())
+
+
+def incrementar_version_instrumentos():
+    return _incrementar(_ruta_instrumentos())
@@ -1,11 +1,34 @@
-from django.db.models import Count, Sum
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Max, Min, OuterRef, Q, Subquery, Sum
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.response import TemplateResponse
+from django.urls import reverse
 from django.contrib.auth import authenticate, login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.models import User
 from django.utils import timezone
 
-from .models import Instrumento, Calificacion
+from .busqueda import anotar_relevancia
+from .cache_vistas import vista_en_cache
+from .cargas import validar_calificacion
+from .filtros import (
+    PARAMETROS_INSTRUMENTOS,
+    PARAMETROS_CALIFICACIONES,
+    filtrar_instrumentos,
+    filtrar_calificaciones,
+)
+from .models import Instrumento, Calificacion, EstadisticaMercado
+from .paginacion import paginar, total_en_cache
+from .reportes import reporte_general
+from .versionado import fecha_version, version_datos
+
+
+# Orden de los listados; el último campo desempata y hace única la clave
+ORDEN_INSTRUMENTOS = [("codigo", False)]
+ORDEN_BUSQUEDA_INSTRUMENTOS = [("relevancia", False), ("codigo", False)]
+ORDEN_CALIFICACIONES = [("fecha", True), ("id", False)]
 
 
 # =========================================================
@@ -82,34 +105,53 @@ def crear_cuenta_view(request):
 # =========================================================
 #   DASHBOARD
 # =========================================================
+def _conteos_por_mercado():
+    """
+    Instrumentos y calificaciones por mercado, sumados desde
+    EstadisticaMercado. Se guardan en la caché por versión de los datos,
+    con una duración corta (NUAM_DASHBOARD_CACHE_SEGUNDOS).
+    """
+    clave = f"nuam:dashboard:{version_datos()}"
+    conteos = cache.get(clave)
+    if conteos is not None:
+        return conteos
+
+    conteos = {"instrumentos": {}, "calificaciones": {}}
+    filas = (
+        EstadisticaMercado.objects.order_by()
+        .values_list("modelo", "mercado").annotate(n=Sum("cantidad"))
+    )
+    for modelo, mercado, n in filas:
+        conteos[modelo.lower()][mercado] = n
+    conteos["calculado_en"] = timezone.localtime()
+
+    cache.set(clave, conteos, getattr(settings, "NUAM_DASHBOARD_CACHE_SEGUNDOS", 60))
+    return conteos
+
+
 @login_required
+@vista_en_cache
 def dashboard_view(request):
-    # Instrumentos por mercado
-    inst_chile = Instrumento.objects.filter(mercado="CL").count()
-    inst_peru = Instrumento.objects.filter(mercado="PE").count()
-    inst_colombia = Instrumento.objects.filter(mercado="CO").count()
-
-    # Calificaciones por mercado (vía instrumento)
-    cal_chile = Calificacion.objects.filter(instrumento__mercado="CL").count()
-    cal_peru = Calificacion.objects.filter(instrumento__mercado="PE").count()
-    cal_colombia = Calificacion.objects.filter(instrumento__mercado="CO").count()
+    conteos = _conteos_por_mercado()
+    instrumentos = conteos["instrumentos"]
+    calificaciones = conteos["calificaciones"]
 
     contexto = {
         "active_page": "dashboard",
-        "updated_at": timezone.localtime().strftime("%d-%m-%Y %H:%M"),
+        "updated_at": conteos["calculado_en"].strftime("%d-%m-%Y %H:%M"),
 
         # Instrumentos
-        "inst_chile": inst_chile,
-        "inst_peru": inst_peru,
-        "inst_colombia": inst_colombia,
-
-        # Calificaciones
-        "cal_chile": cal_chile,
-        "cal_peru": cal_peru,
-        "cal_colombia": cal_colombia,
+        "inst_chile": instrumentos.get("CL", 0),
+        "inst_peru": instrumentos.get("PE", 0),
+        "inst_colombia": instrumentos.get("CO", 0),
+
+        # Calificaciones (por mercado del instrumento)
+        "cal_chile": calificaciones.get("CL", 0),
+        "cal_peru": calificaciones.get("PE", 0),
+        "cal_colombia": calificaciones.get("CO", 0),
     }
 
-    return render(request, "nuapp/dashboard.html", contexto)
+    return TemplateResponse(request, "nuapp/dashboard.html", contexto)
 
 
 
@@ -119,35 +161,27 @@ def dashboard_view(request):
 #   INSTRUMENTOS (LISTADO)
 # =========================================================
 @login_required
+@vista_en_cache
 def instrumentos_view(request):
-    instrumentos = Instrumento.objects.all().order_by("codigo")
+    instrumentos = filtrar_instrumentos(request.GET)
 
+    # Con búsqueda, primero los mejores resultados
     q = request.GET.get("q", "")
-    tipo = request.GET.get("tipo", "")
-    mercado = request.GET.get("mercado", "")
-    estado = request.GET.get("estado", "")
-
     if q:
-        instrumentos = instrumentos.filter(
-            codigo__icontains=q
-        ) | instrumentos.filter(
-            nombre__icontains=q
+        pagina = paginar(
+            anotar_relevancia(instrumentos, q), ORDEN_BUSQUEDA_INSTRUMENTOS, request.GET
         )
-
-    if tipo:
-        instrumentos = instrumentos.filter(tipo=tipo)
-
-    if mercado:
-        instrumentos = instrumentos.filter(mercado=mercado)
-
-    if estado:
-        instrumentos = instrumentos.filter(estado=estado)
+    else:
+        pagina = paginar(instrumentos, ORDEN_INSTRUMENTOS, request.GET)
 
     contexto = {
         "active_page": "instrumentos",
-        "instrumentos": instrumentos,
+        "instrumentos": pagina,
+        "total": total_en_cache(
+            "instrumentos", instrumentos, request.GET, PARAMETROS_INSTRUMENTOS
+        ),
     }
-    return render(request, "nuapp/instrumentos.html", contexto)
+    return TemplateResponse(request, "nuapp/instrumentos.html", contexto)
 
 
 # =========================================================
@@ -171,12 +205,13 @@ def instrumento_form_view(request, instrumento_id=None):
             "fecha_vencimiento": request.POST.get("fecha_vencimiento") or None,
         }
 
-        if instrumento:
-            for campo, valor in data.items():
-                setattr(instrumento, campo, valor)
-            instrumento.save()
-        else:
-            Instrumento.objects.create(**data)
+        with transaction.atomic():
+            if instrumento:
+                for campo, valor in data.items():
+                    setattr(instrumento, campo, valor)
+                instrumento.save()
+            else:
+                Instrumento.objects.create(**data)
 
         return redirect("instrumentos")
 
@@ -193,16 +228,74 @@ def instrumento_form_view(request, instrumento_id=None):
 # =========================================================
 #   INSTRUMENTOS (VER DETALLE)
 # =========================================================
+def _resumen_calificaciones(instrumento_id):
+    """
+    Conteos por tipo y estado, suma y último monto y rango de fechas de
+    las calificaciones del instrumento, en una sola consulta agregada.
+    Se guarda en la caché por versión de los datos.
+    """
+    clave = f"nuam:resumen_instrumento:{instrumento_id}:{version_datos()}"
+    resumen = cache.get(clave)
+    if resumen is not None:
+        return resumen
+
+    conteos = {
+        f"{grupo}_{valor}": Count("calificaciones", filter=Q(**{f"calificaciones__{grupo}": valor}))
+        for grupo, opciones in (
+            ("tipo", Calificacion.TIPO_CHOICES),
+            ("estado", Calificacion.ESTADO_CHOICES),
+        )
+        for valor, _ in opciones
+    }
+    ultima = (
+        Calificacion.objects
+        .filter(instrumento=OuterRef("pk"))
+        .order_by("-fecha", "id")
+        .values("monto")[:1]
+    )
+    fila = (
+        Instrumento.objects
+        .filter(id=instrumento_id)
+        .values("id")
+        .annotate(
+            total=Count("calificaciones"),
+            suma_monto=Sum("calificaciones__monto"),
+            primera_fecha=Min("calificaciones__fecha"),
+            ultima_fecha=Max("calificaciones__fecha"),
+            ultimo_monto=Subquery(ultima),
+            **conteos,
+        )
+        .get()
+    )
+
+    resumen = {
+        **fila,
+        "por_tipo": [(e, fila[f"tipo_{v}"]) for v, e in Calificacion.TIPO_CHOICES],
+        "por_estado": [(e, fila[f"estado_{v}"]) for v, e in Calificacion.ESTADO_CHOICES],
+    }
+    cache.set(clave, resumen, None)
+    return resumen
+
+
 @login_required
+@vista_en_cache
 def instrumento_detalle_view(request, instrumento_id):
     instrumento = get_object_or_404(Instrumento, id=instrumento_id)
 
+    # Solo se leen las filas de la página, filtradas por tipo, estado y fechas
+    calificaciones = filtrar_calificaciones(
+        request.GET, Calificacion.objects.filter(instrumento=instrumento)
+    )
+
     contexto = {
         "active_page": "instrumentos",
         "instrumento": instrumento,
-        "calificaciones": instrumento.calificaciones.all(),
+        "resumen": _resumen_calificaciones(instrumento.id),
+        "calificaciones": paginar(calificaciones, ORDEN_CALIFICACIONES, request.GET),
+        "tipos": Calificacion.TIPO_CHOICES,
+        "estados": Calificacion.ESTADO_CHOICES,
     }
-    return render(request, "nuapp/instrumento_detalle.html", contexto)
+    return TemplateResponse(request, "nuapp/instrumento_detalle.html", contexto)
 
 
 # =========================================================
@@ -220,44 +313,23 @@ def instrumento_eliminar_view(request, instrumento_id):
 #   CALIFICACIONES (LISTADO + FILTROS)
 # =========================================================
 @login_required
+@vista_en_cache
 def calificaciones_view(request):
-    calificaciones = (
-        Calificacion.objects
-        .select_related("instrumento")
-        .order_by("-fecha")
+    calificaciones = filtrar_calificaciones(request.GET)
+    pagina = paginar(
+        calificaciones.select_related("instrumento"), ORDEN_CALIFICACIONES, request.GET
     )
 
-    codigo = request.GET.get("codigo", "")
-    tipo = request.GET.get("tipo", "")
-    estado = request.GET.get("estado", "")
-    fecha_desde = request.GET.get("fecha_desde", "")
-    fecha_hasta = request.GET.get("fecha_hasta", "")
-
-    # Código de calificación (CAL-12 o 12)
-    if codigo:
-        codigo = codigo.replace("CAL-", "")
-        if codigo.isdigit():
-            calificaciones = calificaciones.filter(id=codigo)
-
-    if tipo:
-        calificaciones = calificaciones.filter(tipo=tipo)
-
-    if estado:
-        calificaciones = calificaciones.filter(estado=estado)
-
-    if fecha_desde:
-        calificaciones = calificaciones.filter(fecha__gte=fecha_desde)
-
-    if fecha_hasta:
-        calificaciones = calificaciones.filter(fecha__lte=fecha_hasta)
-
     contexto = {
         "active_page": "calificaciones",
-        "calificaciones": calificaciones,
+        "calificaciones": pagina,
+        "total": total_en_cache(
+            "calificaciones", calificaciones, request.GET, PARAMETROS_CALIFICACIONES
+        ),
         "tipos": Calificacion.TIPO_CHOICES,
         "estados": Calificacion.ESTADO_CHOICES,
     }
-    return render(request, "nuapp/calificaciones.html", contexto)
+    return TemplateResponse(request, "nuapp/calificaciones.html", contexto)
 
 
 # =========================================================
@@ -266,48 +338,67 @@ def calificaciones_view(request):
 @login_required
 def calificacion_form_view(request, calificacion_id=None):
     calificacion = None
-    instrumentos = Instrumento.objects.all().order_by("codigo")
 
+    # El instrumento se elige con sugerencias_instrumentos_view; aquí solo
+    # se carga el de la calificación que se edita.
     if calificacion_id:
-        calificacion = get_object_or_404(Calificacion, id=calificacion_id)
+        calificacion = get_object_or_404(
+            Calificacion.objects.select_related("instrumento"), id=calificacion_id
+        )
 
+    error = None
     if request.method == "POST":
-        instrumento_id = request.POST.get("instrumento")
-        tipo = request.POST.get("tipo")
-        estado = request.POST.get("estado")
-        fecha = request.POST.get("fecha")
-        monto = request.POST.get("monto") or None
-
-        instrumento = get_object_or_404(Instrumento, id=instrumento_id)
+        instrumento = get_object_or_404(Instrumento, id=request.POST.get("instrumento"))
 
-        if calificacion:
-            calificacion.instrumento = instrumento
-            calificacion.tipo = tipo
-            calificacion.estado = estado
-            calificacion.fecha = fecha
-            calificacion.monto = monto
-            calificacion.save()
+        # Las mismas validaciones de la carga masiva: fecha y monto llegan
+        # como texto y se guardan (y pasan a las señales) ya convertidos.
+        datos, errores = validar_calificacion(
+            {campo: request.POST.get(campo) for campo in ("tipo", "estado", "fecha", "monto")}
+        )
+        if errores:
+            error = "; ".join(errores).capitalize() + "."
         else:
-            Calificacion.objects.create(
-                instrumento=instrumento,
-                tipo=tipo,
-                estado=estado,
-                fecha=fecha,
-                monto=monto
-            )
-
-        return redirect("calificaciones")
+            # Si una señal falla, la calificación tampoco queda guardada
+            with transaction.atomic():
+                if calificacion:
+                    calificacion.instrumento = instrumento
+                    for campo, valor in datos.items():
+                        setattr(calificacion, campo, valor)
+                    calificacion.save()
+                else:
+                    Calificacion.objects.create(instrumento=instrumento, **datos)
+
+            return redirect("calificaciones")
 
     contexto = {
         "active_page": "calificaciones",
         "calificacion": calificacion,
-        "instrumentos": instrumentos,
+        "error": error,
         "tipos": Calificacion.TIPO_CHOICES,
         "estados": Calificacion.ESTADO_CHOICES,
     }
     return render(request, "nuapp/calificacion_form.html", contexto)
 
 
+# =========================================================
+#   SUGERENCIAS DE INSTRUMENTOS (FORMULARIO DE CALIFICACIÓN)
+# =========================================================
+from django.http import JsonResponse
+
+from .sugerencias import sugerir_instrumentos
+
+
+@login_required
+def sugerencias_instrumentos_view(request):
+    """Instrumentos cuyo código o nombre empieza por ?q=."""
+    return JsonResponse({
+        "resultados": [
+            {"id": id_, "codigo": codigo, "nombre": nombre}
+            for id_, codigo, nombre in sugerir_instrumentos(request.GET.get("q", ""))
+        ],
+    })
+
+
 # =========================================================
 #   CALIFICACIONES (ELIMINAR)
 # =========================================================
@@ -322,12 +413,13 @@ def calificacion_eliminar_view(request, calificacion_id):
 
 
 # =========================================================
-#   CARGA MASIVA (ESTABLE - NO TOCAR)
+#   CARGA MASIVA (EN SEGUNDO PLANO)
 # =========================================================
-import io
-import csv
-from django.db import transaction
-from django.utils.dateparse import parse_date
+from django.http import FileResponse, Http404
+
+from .models import TrabajoCarga
+from .trabajos import encolar_trabajo
+
 
 @login_required
 def carga_masiva_view(request):
@@ -346,88 +438,73 @@ def carga_masiva_view(request):
             if not mercado:
                 contexto["error"] = "Selecciona un mercado para cargar instrumentos."
                 return render(request, "nuapp/carga_masiva.html", contexto)
-
-            ok, msg = cargar_instrumentos_csv(archivo, mercado)
         elif tipo == "CALIFICACIONES":
-            ok, msg = cargar_calificaciones_csv(archivo)
+            mercado = ""
         else:
             contexto["error"] = "Tipo de carga no reconocido."
             return render(request, "nuapp/carga_masiva.html", contexto)
 
-        if ok:
-            contexto["mensaje"] = msg
-        else:
-            contexto["error"] = msg
-
-    return render(request, "nuapp/carga_masiva.html", contexto)
-
-
-def _abrir_csv(file_obj):
-    try:
-        return io.TextIOWrapper(file_obj, encoding="utf-8-sig"), "utf-8-sig"
-    except UnicodeDecodeError:
-        file_obj.seek(0)
-        return io.TextIOWrapper(file_obj, encoding="latin-1"), "latin-1"
-
-
-def cargar_instrumentos_csv(archivo, mercado):
-    encabezados = ["codigo", "nombre", "tipo", "estado", "fecha_emision", "fecha_vencimiento"]
-    wrapper, _ = _abrir_csv(archivo)
-    reader = csv.DictReader(wrapper, delimiter=",")
-
-    if reader.fieldnames != encabezados:
-        return False, "Encabezados inválidos para instrumentos."
-
-    creados = 0
-    with transaction.atomic():
-        for row in reader:
-            codigo = (row["codigo"] or "").strip()
-            if not codigo:
-                continue
-
-            Instrumento.objects.update_or_create(
-                codigo=codigo,
-                defaults={
-                    "nombre": (row["nombre"] or "").strip(),
-                    "tipo": (row["tipo"] or "").strip(),
-                    "estado": (row["estado"] or "").strip(),
-                    "mercado": mercado,
-                    "fecha_emision": parse_date(row["fecha_emision"] or None),
-                    "fecha_vencimiento": parse_date(row["fecha_vencimiento"] or None),
-                },
-            )
-            creados += 1
-
-    return True, f"Instrumentos procesados correctamente: {creados}"
+        # Solo se guarda el archivo y se encola el trabajo; el
+        # procesamiento ocurre fuera de la petición.
+        trabajo = TrabajoCarga.objects.create(
+            tipo=tipo,
+            mercado=mercado,
+            archivo=archivo,
+            nombre_archivo=archivo.name,
+            usuario=request.user,
+            omitir_duplicados=request.POST.get("omitir_duplicados") == "on",
+            solo_validar=request.POST.get("solo_validar") == "on",
+        )
+        transaction.on_commit(lambda: encolar_trabajo(trabajo.id))
 
+        return redirect(f"{reverse('carga_masiva')}?trabajo={trabajo.id}")
 
-def cargar_calificaciones_csv(archivo):
-    encabezados = ["codigo_instrumento", "tipo", "estado", "fecha", "monto"]
-    wrapper, _ = _abrir_csv(archivo)
-    reader = csv.DictReader(wrapper, delimiter=",")
+    trabajo_id = request.GET.get("trabajo", "")
+    if trabajo_id.isdigit():
+        contexto["trabajo"] = TrabajoCarga.objects.filter(id=trabajo_id).first()
 
-    if reader.fieldnames != encabezados:
-        return False, "Encabezados inválidos para calificaciones."
+    return render(request, "nuapp/carga_masiva.html", contexto)
 
-    creadas = 0
-    with transaction.atomic():
-        for row in reader:
-            codigo_instr = (row["codigo_instrumento"] or "").strip()
-            if not codigo_instr:
-                continue
 
-            instrumento = Instrumento.objects.get(codigo=codigo_instr)
+@login_required
+def carga_masiva_estado_view(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoCarga, id=trabajo_id)
+    duracion = trabajo.duracion
+
+    return JsonResponse({
+        "id": trabajo.id,
+        "tipo": trabajo.tipo,
+        "archivo": trabajo.nombre_archivo,
+        "estado": trabajo.estado,
+        "estado_label": trabajo.get_estado_display(),
+        "terminado": trabajo.terminado,
+        "filas_procesadas": trabajo.filas_procesadas,
+        "filas_rechazadas": trabajo.filas_rechazadas,
+        "rechazos": trabajo.rechazos,
+        "mensaje": trabajo.mensaje,
+        "url_rechazos": (
+            reverse("carga_masiva_rechazos", args=[trabajo.id])
+            if trabajo.archivo_rechazos else None
+        ),
+        "creado_en": trabajo.creado_en.isoformat(),
+        "iniciado_en": trabajo.iniciado_en.isoformat() if trabajo.iniciado_en else None,
+        "finalizado_en": trabajo.finalizado_en.isoformat() if trabajo.finalizado_en else None,
+        "duracion_segundos": duracion.total_seconds() if duracion else None,
+    })
 
-            Calificacion.objects.create(
-                instrumento=instrumento,
-                tipo=(row["tipo"] or "").strip(),
-                estado=(row["estado"] or "").strip(),
-                fecha=parse_date(row["fecha"] or None),
-                monto=row["monto"] or None,
-            )
-            creadas += 1
 
-    return True, f"Calificaciones procesadas correctamente: {creadas}"
+@login_required
+def carga_masiva_rechazos_view(request, trabajo_id):
+    trabajo = get_object_or_404(TrabajoCarga, id=trabajo_id)
+    if not trabajo.archivo_rechazos:
+        raise Http404("La carga no tiene filas rechazadas.")
+
+    return FileResponse(
+        trabajo.archivo_rechazos.open("rb"),
+        as_attachment=True,
+        filename=f"rechazos_{trabajo.id}.csv",
+        content_type="text/csv",
+    )
 
 
 # =========================================================
@@ -449,375 +526,227 @@ def admin_usuarios_view(request):
 #   REPORTES (INSTRUMENTOS / CALIFICACIONES / POR PAÍS)
 # =========================================================
 @login_required
+@vista_en_cache
 def reportes_view(request):
-    # -------------------------
-    # Totales generales
-    # -------------------------
-    total_instrumentos = Instrumento.objects.count()
-    total_calificaciones = Calificacion.objects.count()
-
-    # -------------------------
-    # Reporte Instrumentos
-    # -------------------------
-    instrumentos_por_tipo = (
-        Instrumento.objects
-        .values("tipo")
-        .annotate(total=Count("id"))
-        .order_by("tipo")
-    )
-
-    instrumentos_por_estado = (
-        Instrumento.objects
-        .values("estado")
-        .annotate(total=Count("id"))
-        .order_by("estado")
-    )
-
-    instrumentos_por_mercado = (
-        Instrumento.objects
-        .values("mercado")
-        .annotate(total=Count("id"))
-        .order_by("mercado")
-    )
-
-    # -------------------------
-    # Reporte Calificaciones
-    # -------------------------
-    calificaciones_por_tipo = (
-        Calificacion.objects
-        .values("tipo")
-        .annotate(total=Count("id"))
-        .order_by("tipo")
-    )
-
-    calificaciones_por_estado = (
-        Calificacion.objects
-        .values("estado")
-        .annotate(total=Count("id"))
-        .order_by("estado")
-    )
-
-    monto_total_calificaciones = (
-        Calificacion.objects.aggregate(total=Sum("monto"))["total"] or 0
-    )
-
-    # -------------------------
-    # Reporte por País (Mercado)
-    # Instrumentos por mercado + Calificaciones activas por mercado
-    # + Suma montos por mercado (solo activas)
-    # -------------------------
-    # Base instrumentos por mercado
-    base = (
-        Instrumento.objects
-        .values("mercado")
-        .annotate(
-            instrumentos=Count("id"),
-            calificaciones_activas=Count(
-                "calificaciones",
-                filter=Calificacion.objects.filter(estado="ACTIVA").query.where
-            )
-        )
-    )
-
-    # ⚠️ El filtro anterior con .query.where puede variar según versión.
-    # Para hacerlo 100% compatible, lo reemplazaremos en el Paso 2 si da problemas.
-    # Por ahora, dejamos el reporte por mercado simple y estable:
-
-    paises = []
-    for codigo, nombre in Instrumento.MERCADO_CHOICES:
-        instrumentos_qs = Instrumento.objects.filter(mercado=codigo)
-        calif_activas_qs = Calificacion.objects.filter(instrumento__mercado=codigo, estado="ACTIVA")
-
-        paises.append({
-            "mercado": codigo,
-            "mercado_label": nombre,
-            "instrumentos": instrumentos_qs.count(),
-            "calificaciones_activas": calif_activas_qs.count(),
-            "monto_activo": calif_activas_qs.aggregate(total=Sum("monto"))["total"] or 0,
-        })
-
+    # Una sola consulta, a EstadisticaMercado (ver reportes.py)
     contexto = {
         "active_page": "reportes",
+        **reporte_general(),
+    }
+    return TemplateResponse(request, "nuapp/reportes.html", contexto)
 
-        "total_instrumentos": total_instrumentos,
-        "total_calificaciones": total_calificaciones,
 
-        "instrumentos_por_tipo": instrumentos_por_tipo,
-        "instrumentos_por_estado": instrumentos_por_estado,
-        "instrumentos_por_mercado": instrumentos_por_mercado,
+# =========================================================
+#   TENDENCIAS DE CALIFICACIONES
+# =========================================================
+from .tendencias import parametros_tendencia, tendencia, tendencia_interanual
 
-        "calificaciones_por_tipo": calificaciones_por_tipo,
-        "calificaciones_por_estado": calificaciones_por_estado,
-        "monto_total_calificaciones": monto_total_calificaciones,
 
-        "paises": paises,
+@login_required
+@vista_en_cache
+def tendencias_view(request):
+    """Serie mensual o diaria con el mismo periodo del año anterior al lado."""
+    contexto = {
+        "active_page": "reportes",
+        "mercados": Instrumento.MERCADO_CHOICES,
+        "tipos": Calificacion.TIPO_CHOICES,
+        "estados": Calificacion.ESTADO_CHOICES,
     }
-    return render(request, "nuapp/reportes.html", contexto)
+    try:
+        parametros = parametros_tendencia(request.GET)
+    except ValueError as e:
+        contexto["error"] = str(e)
+        parametros = parametros_tendencia({})
+
+    filas = tendencia_interanual(
+        parametros["desde"], parametros["hasta"], parametros["granularidad"],
+        filtros=parametros["filtros"],
+    )
+    contexto.update({
+        **parametros,
+        "filas": filas,
+        "total_cantidad": sum(f["cantidad"] for f in filas),
+        "total_monto": sum(f["monto"] for f in filas),
+    })
+    return TemplateResponse(request, "nuapp/tendencias.html", contexto)
 
 
 # =========================================================
-#   EXPORTAR CSV - INSTRUMENTOS
+#   EXPORTACIÓN CSV (STREAMING, CON CACHÉ POR VERSIÓN)
 # =========================================================
-import csv
-from django.http import HttpResponse
+from .cache_exportaciones import respuesta_exportacion
+from .exportaciones import (
+    ENCABEZADOS_INSTRUMENTOS,
+    ENCABEZADOS_CALIFICACIONES,
+    csv_en_bloques,
+    filas_instrumentos,
+    filas_calificaciones,
+)
+
 
 @login_required
 def exportar_instrumentos_csv(request):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="instrumentos.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        "Codigo", "Nombre", "Tipo", "Mercado",
-        "Estado", "Fecha Emision", "Fecha Vencimiento"
-    ])
-
-    instrumentos = Instrumento.objects.all().order_by("codigo")
-
-    for i in instrumentos:
-        writer.writerow([
-            i.codigo,
-            i.nombre,
-            i.get_tipo_display(),
-            i.get_mercado_display(),
-            i.get_estado_display(),
-            i.fecha_emision or "",
-            i.fecha_vencimiento or "",
-        ])
-
-    return response
+    filas = filas_instrumentos(filtrar_instrumentos(request.GET))
+    return respuesta_exportacion(
+        request,
+        "instrumentos.csv",
+        "text/csv",
+        csv_en_bloques(ENCABEZADOS_INSTRUMENTOS, filas),
+        PARAMETROS_INSTRUMENTOS,
+    )
 
 
-# =========================================================
-#   EXPORTAR CSV - CALIFICACIONES
-# =========================================================
 @login_required
 def exportar_calificaciones_csv(request):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="calificaciones.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        "Codigo Calificacion", "Codigo Instrumento",
-        "Tipo", "Estado", "Fecha", "Monto"
-    ])
-
-    calificaciones = (
-        Calificacion.objects
-        .select_related("instrumento")
-        .order_by("-fecha")
+    filas = filas_calificaciones(filtrar_calificaciones(request.GET))
+    return respuesta_exportacion(
+        request,
+        "calificaciones.csv",
+        "text/csv",
+        csv_en_bloques(ENCABEZADOS_CALIFICACIONES, filas),
+        PARAMETROS_CALIFICACIONES,
     )
 
-    for c in calificaciones:
-        writer.writerow([
-            f"CAL-{c.id}",
-            c.instrumento.codigo,
-            c.get_tipo_display(),
-            c.get_estado_display(),
-            c.fecha,
-            c.monto or "",
-        ])
-
-    return response
-
 
 # =========================================================
-#   EXPORTACIÓN CSV
+#   EXPORTACIÓN PDF (STREAMING, UNA PÁGINA POR BLOQUE)
 # =========================================================
-import csv
-from django.http import HttpResponse
-from django.contrib.auth.decorators import login_required
+from .exportaciones import COLUMNAS_PDF_INSTRUMENTOS, COLUMNAS_PDF_CALIFICACIONES
+from .pdf import tabla_pdf
 
-@login_required
-def exportar_instrumentos_csv(request):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="instrumentos.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        "Código",
-        "Nombre",
-        "Tipo",
-        "Mercado",
-        "Estado",
-        "Fecha Emisión",
-        "Fecha Vencimiento",
-    ])
-
-    instrumentos = Instrumento.objects.all().order_by("codigo")
-
-    for i in instrumentos:
-        writer.writerow([
-            i.codigo,
-            i.nombre,
-            i.get_tipo_display(),
-            i.get_mercado_display(),
-            i.estado,
-            i.fecha_emision or "",
-            i.fecha_vencimiento or "",
-        ])
-
-    return response
-
-# =========================================================
-#   EXPORTACIÓN DE INSTRUMENTOS
-# =========================================================
-import csv
-from django.http import HttpResponse
-from django.contrib.auth.decorators import login_required
 
-from .models import Instrumento
+def _subtitulo_pdf():
+    # El PDF queda en caché por versión de los datos: se fecha con el
+    # último cambio de los datos y no con la hora de cada descarga.
+    fecha = fecha_version(version_datos())
+    return f"Datos al {timezone.localtime(fecha):%d/%m/%Y %H:%M}" if fecha else ""
 
 
-# ---------------------------------------------------------
-# EXPORTAR INSTRUMENTOS - CSV
-# ---------------------------------------------------------
-@login_required
-def exportar_instrumentos_csv(request):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="instrumentos.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        "Código",
-        "Nombre",
-        "Tipo",
-        "Mercado",
-        "Estado",
-        "Fecha Emisión",
-        "Fecha Vencimiento",
-    ])
-
-    instrumentos = Instrumento.objects.all().order_by("codigo")
-
-    for i in instrumentos:
-        writer.writerow([
-            i.codigo,
-            i.nombre,
-            i.get_tipo_display(),
-            i.get_mercado_display(),
-            i.estado,
-            i.fecha_emision or "",
-            i.fecha_vencimiento or "",
-        ])
-
-    return response
-
-
-# ---------------------------------------------------------
-# EXPORTAR INSTRUMENTOS - PDF (PLACEHOLDER FUNCIONAL)
-# ---------------------------------------------------------
 @login_required
 def exportar_instrumentos_pdf(request):
-    """
-    Exportación PDF básica.
-    En el próximo paso la dejamos bonita (tabla, estilos, etc).
-    """
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="instrumentos.pdf"'
+    filas = filas_instrumentos(filtrar_instrumentos(request.GET))
+    return respuesta_exportacion(
+        request,
+        "instrumentos.pdf",
+        "application/pdf",
+        tabla_pdf("Instrumentos", COLUMNAS_PDF_INSTRUMENTOS, filas, _subtitulo_pdf()),
+        PARAMETROS_INSTRUMENTOS,
+    )
 
-    response.write("EXPORTACIÓN PDF DE INSTRUMENTOS\n\n")
 
-    instrumentos = Instrumento.objects.all().order_by("codigo")
+@login_required
+def exportar_calificaciones_pdf(request):
+    filas = filas_calificaciones(filtrar_calificaciones(request.GET))
+    return respuesta_exportacion(
+        request,
+        "calificaciones.pdf",
+        "application/pdf",
+        tabla_pdf("Calificaciones", COLUMNAS_PDF_CALIFICACIONES, filas, _subtitulo_pdf()),
+        PARAMETROS_CALIFICACIONES,
+    )
 
-    for i in instrumentos:
-        response.write(
-            f"{i.codigo} | {i.nombre} | "
-            f"{i.get_tipo_display()} | "
-            f"{i.get_mercado_display()} | "
-            f"{i.estado}\n"
-        )
 
-    return response
+# =========================================================
+#   EXPORTACIÓN ZIP POR MERCADO
+# =========================================================
+from .exportacion_mercados import zip_por_mercado
+
+
+@login_required
+def exportar_mercados_zip(request):
+    return respuesta_exportacion(
+        request,
+        "nuam_por_mercado.zip",
+        "application/zip",
+        zip_por_mercado(),
+        (),
+    )
 
 
 # =========================================================
-#   EXPORTACIÓN DE CALIFICACIONES
+#   API JSON (v1)
 # =========================================================
-import csv
-from django.http import HttpResponse
-from django.contrib.auth.decorators import login_required
+from .api import (
+    CAMPOS_INSTRUMENTOS,
+    CAMPOS_CALIFICACIONES,
+    VERSION_API,
+    codigos_pedidos,
+    pagina_json,
+)
 
-from .models import Calificacion
+
+def _respuesta_api(request, queryset, orden, campos):
+    try:
+        datos = pagina_json(request, queryset, orden, campos)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    return JsonResponse(datos, json_dumps_params={"separators": (",", ":")})
 
 
-# ---------------------------------------------------------
-# EXPORTAR CALIFICACIONES - CSV
-# ---------------------------------------------------------
-@login_required
-def exportar_calificaciones_csv(request):
-    response = HttpResponse(content_type="text/csv")
-    response["Content-Disposition"] = 'attachment; filename="calificaciones.csv"'
-
-    writer = csv.writer(response)
-    writer.writerow([
-        "Código",
-        "Instrumento",
-        "Tipo",
-        "Estado",
-        "Fecha",
-        "Monto",
-    ])
-
-    calificaciones = Calificacion.objects.select_related("instrumento").all().order_by("id")
-
-    for c in calificaciones:
-        writer.writerow([
-            f"CAL-{c.id}",
-            f"{c.instrumento.codigo} - {c.instrumento.nombre}",
-            c.get_tipo_display(),
-            c.estado,
-            c.fecha,
-            c.monto or "",
-        ])
-
-    return response
-
-
-# ---------------------------------------------------------
-# EXPORTAR CALIFICACIONES - PDF (PLACEHOLDER FUNCIONAL)
-# ---------------------------------------------------------
 @login_required
-def exportar_calificaciones_pdf(request):
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="calificaciones.pdf"'
+def api_instrumentos(request):
+    """Instrumentos con los filtros del listado y ?codigos= para buscar varios a la vez."""
+    instrumentos = filtrar_instrumentos(request.GET)
+    try:
+        codigos = codigos_pedidos(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    if codigos:
+        instrumentos = instrumentos.filter(codigo__in=codigos)
 
-    response.write("EXPORTACIÓN PDF DE CALIFICACIONES\n\n")
+    return _respuesta_api(request, instrumentos, ORDEN_INSTRUMENTOS, CAMPOS_INSTRUMENTOS)
 
-    calificaciones = Calificacion.objects.select_related("instrumento").all().order_by("id")
 
-    for c in calificaciones:
-        response.write(
-            f"CAL-{c.id} | "
-            f"{c.instrumento.codigo} - {c.instrumento.nombre} | "
-            f"{c.get_tipo_display()} | "
-            f"{c.estado} | "
-            f"{c.fecha} | "
-            f"{c.monto}\n"
-        )
+@login_required
+def api_calificaciones(request):
+    return _respuesta_api(
+        request,
+        filtrar_calificaciones(request.GET),
+        ORDEN_CALIFICACIONES,
+        CAMPOS_CALIFICACIONES,
+    )
 
-    return response
 
-# ---------------------------------------------------------
-# EXPORTAR CALIFICACIONES - PDF (PLACEHOLDER FUNCIONAL)
-# ---------------------------------------------------------
 @login_required
-def exportar_calificaciones_pdf(request):
-    response = HttpResponse(content_type="application/pdf")
-    response["Content-Disposition"] = 'attachment; filename="calificaciones.pdf"'
-
-    response.write("EXPORTACIÓN PDF DE CALIFICACIONES\n\n")
+def api_tendencias(request):
+    """
+    Serie de ?desde= a ?hasta= por ?granularidad=mes|dia, opcionalmente
+    separada ?por=mercado|tipo|estado y filtrada por esos mismos campos;
+    con ?interanual=1 cada periodo trae el del año anterior.
+    """
+    try:
+        parametros = parametros_tendencia(request.GET)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+    calcular = tendencia_interanual if request.GET.get("interanual") == "1" else tendencia
+    resultados = calcular(
+        parametros["desde"], parametros["hasta"], parametros["granularidad"],
+        por=parametros["por"], filtros=parametros["filtros"],
+    )
+    return JsonResponse(
+        {
+            "version": VERSION_API,
+            "desde": parametros["desde"],
+            "hasta": parametros["hasta"],
+            "granularidad": parametros["granularidad"].lower(),
+            "resultados": resultados,
+        },
+        json_dumps_params={"separators": (",", ":")},
+    )
 
-    calificaciones = Calificacion.objects.select_related("instrumento").all().order_by("id")
 
-    for c in calificaciones:
-        response.write(
-            f"CAL-{c.id} | "
-            f"{c.instrumento.codigo} | "
-            f"{c.get_tipo_display()} | "
-            f"{c.estado} | "
-            f"{c.fecha} | "
-            f"{c.monto or ''}\n"
-        )
+@login_required
+def api_calificaciones_instrumento(request, codigo):
+    instrumento_id = (
+        Instrumento.objects.filter(codigo=codigo).values_list("id", flat=True).first()
+    )
+    if instrumento_id is None:
+        return JsonResponse({"error": f"No existe el instrumento {codigo}."}, status=404)
 
-    return response
+    calificaciones = filtrar_calificaciones(
+        request.GET, Calificacion.objects.filter(instrumento_id=instrumento_id)
+    )
+    return _respuesta_api(
+        request, calificaciones, ORDEN_CALIFICACIONES, CAMPOS_CALIFICACIONES
+    )